@@ -0,0 +1,454 @@
+from datetime import timedelta
+import numpy as np
+import pandas as pd
+import polars as pl
+from sqlalchemy import case, func, select
+from models import Pageview, AnchorClick, UserAgent
+from useragent import parse_user_agent
+from columnar import fetch_frame, raw_datetime
+from sessions import session_key, legacy_session_join
+from partition import fetch_partitioned, range_sources
+from coldstore import cold_reader, session_series
+from profiling import stage
+import korea
+from utils import service_filter
+
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+# 차원별 집계 (total은 시간 단위, 나머지는 일 단위)
+DIMENSIONS = ["os", "browser", "country"]
+
+EVENT_COLUMNS = ["timestamp", "host", "session_id", "is_mobile", "is_pc", "os", "browser", "country", "city"]
+
+
+def load_pageviews(db, *filters, period=None):
+    # 집계에 필요한 컬럼만 컬럼 단위로 읽어 DataFrame으로 반환
+    # period=(시작일, 종료일)을 주면 기간과 겹치는 분리된 월 파일도 읽습니다.
+    stmt = (
+        select(
+            raw_datetime(Pageview.timestamp), Pageview.host, session_key(Pageview).label("session_id"), Pageview.is_mobile, Pageview.is_pc,
+            UserAgent.os_family.label("os"), UserAgent.browser_family.label("browser"),
+            Pageview.country, Pageview.city,
+            # User-Agent, 지역 컬럼 이관 전 데이터만 원본 문자열을 읽습니다.
+            case((Pageview.user_agent_id.is_(None), Pageview.user_agent)).label("user_agent"),
+            case((Pageview.country.is_(None), Pageview.user_location)).label("location"),
+        )
+        .outerjoin(UserAgent, Pageview.user_agent_id == UserAgent.id)
+        .outerjoin(*legacy_session_join(Pageview))
+        .where(*filters)
+    )
+    if period:
+        cold = cold_reader(db, "pageviews", filters, *period, _cold_pageviews)
+        df = fetch_partitioned(db, stmt, *period, datetime_columns=["timestamp"], cold=cold)
+    else:
+        df = fetch_frame(db, stmt, datetime_columns=["timestamp"])
+
+    legacy = df['user_agent'].notna()
+    if legacy.any():
+        with stage("ua"):
+            parsed = {ua: parse_user_agent(ua) for ua in df.loc[legacy, 'user_agent'].unique()}
+            df.loc[legacy, 'os'] = df.loc[legacy, 'user_agent'].map(lambda ua: parsed[ua].os.family)
+            df.loc[legacy, 'browser'] = df.loc[legacy, 'user_agent'].map(lambda ua: parsed[ua].browser.family)
+
+    legacy = df['location'].notna()
+    if legacy.any():
+        df.loc[legacy, 'country'] = df.loc[legacy, 'location'].str.split(', ').str[1]
+        df.loc[legacy, 'city'] = df.loc[legacy, 'location'].str.split(', ').str[0]
+    return df[EVENT_COLUMNS]
+
+
+def _cold_pageviews(scan):
+    # Parquet로 보관된 달: load_pageviews와 같은 컬럼 (이관 전 문자열은 내보낼 때 이미 변환)
+    columns = [name for name in EVENT_COLUMNS if name != "session_id"]
+    frame = scan.select(*columns, "session_pk", "session_id").with_columns(
+        pl.col("timestamp").dt.cast_time_unit("ns"), pl.col(pl.Categorical).cast(pl.String),
+    ).collect()
+    df = frame.select(columns).to_pandas()
+    df['session_id'] = session_series(frame)
+    return df.assign(user_agent=None, location=None)
+
+
+def _dimension_counts(rows, keys=()):
+    """행을 차원별 개수로 집계합니다. total은 시간 단위, 나머지 차원은 일 단위 bucket입니다."""
+    keys = list(keys)
+    frames = []
+
+    total = rows.groupby(['hour'] + keys).size().reset_index(name='count').rename(columns={'hour': 'bucket'})
+    frames.append(total.assign(dimension='total', value=''))
+
+    device = rows.groupby(['day'] + keys)[['is_pc', 'is_mobile']].sum().reset_index()
+    device = device.melt(id_vars=['day'] + keys, var_name='value', value_name='count')
+    device['value'] = device['value'].map({'is_pc': 'pc', 'is_mobile': 'mobile'})
+    frames.append(device.rename(columns={'day': 'bucket'}).assign(dimension='device'))
+
+    for dimension in DIMENSIONS:
+        counts = rows.groupby(['day'] + keys + [dimension]).size().reset_index(name='count')
+        frames.append(counts.rename(columns={'day': 'bucket', dimension: 'value'}).assign(dimension=dimension))
+
+    korea_rows = rows[rows['country'] == 'South Korea']
+    city = korea_rows.groupby(['day'] + keys + ['city']).size().reset_index(name='count')
+    frames.append(city.rename(columns={'day': 'bucket', 'city': 'value'}).assign(dimension='city'))
+
+    result = pd.concat(frames, ignore_index=True)
+    result['count'] = result['count'].astype(int)
+    return result[result['count'] > 0]
+
+
+def _with_buckets(df):
+    return df.assign(hour=df['timestamp'].dt.floor('h'), day=df['timestamp'].dt.floor('D'))
+
+
+def aggregate_events(df):
+    """원본 이벤트를 pageview_rollups 형태(bucket, host, metric, dimension, value, count)로 집계합니다.
+    기간별로 더할 수 있는 pageviews만 집계합니다. (접속자수는 기간 전체의 고유 세션 수라 날짜별 값을 더할 수 없음)"""
+    columns = ['bucket', 'host', 'metric', 'dimension', 'value', 'count']
+    if df.empty:
+        return pd.DataFrame(columns=columns)
+
+    return _dimension_counts(_with_buckets(df), ['host']).assign(metric='pageviews')[columns]
+
+
+def bucket_labels(dates, interval):
+    # 날짜별 num 키 (daily: YYYYMMDD, weekly: 월요일-일요일, monthly: YYYYMM)
+    dates = pd.DatetimeIndex(dates)
+    if interval == "weekly":
+        monday = dates - pd.to_timedelta(dates.weekday, unit='D')
+        return monday.strftime('%Y%m%d') + '-' + (monday + pd.Timedelta(days=6)).strftime('%Y%m%d')
+    if interval == "monthly":
+        return dates.strftime('%Y%m')
+    return dates.strftime('%Y%m%d')
+
+
+# 지표별 원본 행 처리: (집계 대상 행 선택, num 집계 방식)
+METRICS = {
+    "pageviews": (lambda df: df, 'count'),
+    "sessions": (lambda df: df.drop_duplicates(subset=['session_id']), 'nunique'),
+}
+
+
+def pageview_report(df, start_date, end_date, interval, metric="pageviews"):
+    """원본 pageview 행(load_pageviews 결과)으로 /analytics/pageviews 응답을 만듭니다.
+    pageviews는 접속횟수, sessions는 접속자수(세션 기준)입니다."""
+    if df.empty:
+        return build_report(pd.DataFrame(columns=['bucket', 'dimension', 'value', 'count']), start_date, end_date, interval)
+
+    select_rows, agg = METRICS[metric]
+    all_dates = pd.date_range(start=start_date, end=end_date, freq='D')
+    labels = bucket_labels(all_dates, interval).unique()
+
+    num = df.groupby(bucket_labels(df['timestamp'].dt.floor('D'), interval))['session_id'].agg(agg)
+    num = num.reindex(labels, fill_value=0)
+    total = len(df) if agg == 'count' else len(df['session_id'].unique())
+
+    frame = _dimension_counts(_with_buckets(select_rows(df)))
+    return build_report(frame, start_date, end_date, interval, num=num, total=total)
+
+
+def build_report(frame, start_date, end_date, interval, num=None, total=None):
+    """pageview_rollups 형태의 집계(하나의 metric)로 /analytics/pageviews 응답을 만듭니다.
+    num(구간별 값), total을 주지 않으면 total 차원의 합으로 계산합니다."""
+    processed_data = {
+        "total_pageviews": {},
+        "num": {},
+        "pageviews_by_device":{},
+        "pageviews_by_os":{},
+        "pageviews_by_location": {},
+        "pageviews_by_browser": {},
+        "daily_time":{},
+        f"is_{interval}_week":{}
+    }
+
+    all_dates = pd.date_range(start=start_date, end=end_date, freq='D')
+    hourly = frame[frame['dimension'] == 'total']
+
+    if hourly.empty:
+        processed_data['total_pageviews'] = 0
+        num = pd.Series(0, index=all_dates.strftime('%Y%m%d'))
+    else:
+        if num is None:
+            daily = hourly.groupby(hourly['bucket'].dt.floor('D'))['count'].sum().reindex(all_dates, fill_value=0)
+            num = daily.groupby(bucket_labels(all_dates, interval), sort=False).sum()
+        processed_data['total_pageviews'] = int(hourly['count'].sum()) if total is None else total
+
+        def breakdown(dimension):
+            counts = frame[frame['dimension'] == dimension].groupby('value')['count'].sum()
+            return {key: int(count) for key, count in counts.sort_values(ascending=False, kind='stable').items()}
+
+        device = breakdown('device')
+
+        # 요일별 날짜 수, 요일 x 시간 행렬
+        weekday_days = pd.Series(all_dates.strftime('%A')).value_counts()
+        matrix = pd.crosstab(
+            hourly['bucket'].dt.strftime('%A'), hourly['bucket'].dt.hour, values=hourly['count'], aggfunc='sum',
+        ).reindex(columns=range(24)).fillna(0).astype(int)
+        hours = matrix.sum(axis=0)
+        weeks = matrix.sum(axis=1)
+
+        week = {}
+        for name in WEEKDAYS:
+            days = weekday_days.get(name, 0)
+            week[name] = round(weeks.get(name, 0) / days, 2) if days else 0.0
+
+        result = {}
+        for name, counts in matrix.iterrows():
+            result[name] = {hour: int(count) / weekday_days[name] if count else 0 for hour, count in counts.items()}
+
+        city = frame[frame['dimension'] == 'city'].groupby('value')['count'].sum().sort_values(ascending=False, kind='stable')
+        city_region = city.index.map(lambda name: korea.region_by_city.get(name, 'Unknown'))
+        regions = pd.Series(city_region).value_counts().sort_values(ascending=False).to_dict()
+        regions_unknown = {'count': {name: int(count) for name, count in city[city_region == 'Unknown'].items()}}
+
+        processed_data['pageviews_by_device'] = {'pc': device.get('pc', 0), 'mobile': device.get('mobile', 0)}
+        processed_data['pageviews_by_os'] = breakdown('os')
+        processed_data['pageviews_by_location']['country'] = breakdown('country')
+        processed_data['pageviews_by_location']['city'] = regions
+        processed_data['pageviews_by_location']['city']['Unknown'] = regions_unknown
+        processed_data['pageviews_by_browser'] = breakdown('browser')
+        processed_data['daily_time'] = {hour: round(int(count) / len(all_dates), 2) for hour, count in hours.items()}
+        processed_data[f'is_{interval}_week'] = week
+        processed_data[f'is_{interval}_week_time'] = result
+
+    processed_data['num'] = format_num(num)
+
+    return processed_data
+
+
+def format_num(num):
+    # 구간별 값 + min, max, avg
+    result = {date: int(count) for date, count in num.items()}
+    result['min'] = int(num.min())
+    result['max'] = int(num.max())
+    result['avg'] = int(num.mean())
+    return result
+
+
+def service_case(names):
+    # 처음으로 해당하는 서비스 이름 (utils.SERVICE_HOSTS에 host가 있으면 host, 없으면 URL 포함 여부)
+    return case(*[(service_filter(Pageview.url, Pageview.host, [name]), name) for name in names])
+
+
+def service_usercounts(db, names, start_date, end_date, interval):
+    """서비스별 접속자수(total_pageviews)와 구간별 접속자수(daily_data)를 한 번의 그룹 집계로 계산합니다.
+    /analytics/pageviews/usercount?url=서비스 응답의 total_pageviews, num과 같은 값입니다."""
+    service = service_case(names).label("service")
+    bucket = {
+        "daily": func.date(Pageview.timestamp),
+        "weekly": func.date(Pageview.timestamp, 'weekday 0', '-6 days'),
+        "monthly": func.strftime('%Y-%m-01', Pageview.timestamp),
+    }[interval].label("bucket")
+    filters = [
+        service_filter(Pageview.url, Pageview.host, names),
+        Pageview.timestamp >= start_date,
+        Pageview.timestamp <= end_date.replace(hour=23, minute=59, second=59),
+    ]
+
+    session = session_key(Pageview)
+
+    with range_sources(db, start_date, end_date) as sources:
+        if len(sources) == 1:
+            per_bucket = fetch_frame(
+                sources[0],
+                select(service, bucket, func.count(session.distinct()).label("sessions"))
+                .outerjoin(*legacy_session_join(Pageview))
+                .where(*filters)
+                .group_by(service, bucket),
+                datetime_columns=["bucket"],
+            )
+            totals = dict(sources[0].execute(
+                select(service, func.count(session.distinct()))
+                .outerjoin(*legacy_session_join(Pageview))
+                .where(*filters)
+                .group_by(service)
+            ).all())
+        else:
+            # 여러 달 파일에 걸친 세션은 중복 제거 후 집계
+            sessions = distinct_sessions(sources, [service, bucket], filters, datetime_columns=["bucket"])
+            per_bucket = sessions.groupby(['service', 'bucket'])['session_id'].nunique().reset_index(name='sessions')
+            totals = sessions.groupby('service')['session_id'].nunique().to_dict()
+
+    all_dates = pd.date_range(start=start_date, end=end_date, freq='D')
+    labels = bucket_labels(all_dates, interval).unique()
+
+    result = {}
+    for name in names:
+        rows = per_bucket[per_bucket['service'] == name]
+        if rows.empty:
+            num = pd.Series(0, index=all_dates.strftime('%Y%m%d'))
+        else:
+            num = rows.groupby(bucket_labels(rows['bucket'], interval))['sessions'].sum().reindex(labels, fill_value=0)
+        result[name] = {
+            'total_pageviews': int(totals.get(name, 0)),
+            'daily_data': format_num(num),
+        }
+    return result
+
+
+def distinct_sessions(sources, columns, filters, datetime_columns=()):
+    """여러 데이터 소스(range_sources)에서 (columns..., session_id) 조합을 중복 없이 읽어 합칩니다."""
+    stmt = (
+        select(*columns, session_key(Pageview).label("session_id"))
+        .outerjoin(*legacy_session_join(Pageview))
+        .where(*filters)
+        .distinct()
+    )
+    frames = [fetch_frame(source, stmt, datetime_columns=datetime_columns) for source in sources]
+    return pd.concat(frames, ignore_index=True).drop_duplicates()
+
+
+def active_user_counts(db, today, *filters):
+    """오늘 기준 dau, wau(7일), mau(31일) 세션 수"""
+    windows = [today, today - timedelta(days=6), today - timedelta(days=30)]
+    with range_sources(db, windows[-1], today) as sources:
+        if len(sources) == 1:
+            return [
+                sources[0].query(func.count(session_key(Pageview).distinct()))
+                .select_from(Pageview)
+                .outerjoin(*legacy_session_join(Pageview))
+                .filter(*filters, Pageview.timestamp >= start, Pageview.timestamp < today + timedelta(days=1))
+                .scalar()
+                for start in windows
+            ]
+        day = func.date(Pageview.timestamp).label("day")
+        sessions = distinct_sessions(sources, [day], [
+            *filters, Pageview.timestamp >= windows[-1], Pageview.timestamp < today + timedelta(days=1),
+        ])
+    return [sessions.loc[sessions['day'] >= start.strftime('%Y-%m-%d'), 'session_id'].nunique() for start in windows]
+
+
+def service_active_users(db, names, today):
+    """서비스별 오늘 기준 dau, wau(7일), mau(31일) 세션 수를 한 번의 그룹 집계로 계산합니다.
+    최근 31일 동안 접속이 없는 서비스는 제외합니다."""
+    service = service_case(names).label("service")
+    week_start = today - timedelta(days=6)
+    month_start = today - timedelta(days=30)
+    session = session_key(Pageview)
+    filters = [
+        service_filter(Pageview.url, Pageview.host, names),
+        Pageview.timestamp >= month_start,
+        Pageview.timestamp < today + timedelta(days=1),
+    ]
+
+    with range_sources(db, month_start, today) as sources:
+        if len(sources) == 1:
+            rows = sources[0].execute(
+                select(
+                    service,
+                    func.count(case((Pageview.timestamp >= today, session)).distinct()),
+                    func.count(case((Pageview.timestamp >= week_start, session)).distinct()),
+                    func.count(session.distinct()),
+                )
+                .outerjoin(*legacy_session_join(Pageview))
+                .where(*filters)
+                .group_by(service)
+            ).all()
+        else:
+            day = func.date(Pageview.timestamp).label("day")
+            sessions = distinct_sessions(sources, [service, day], filters)
+            rows = []
+            for name, group in sessions.groupby('service'):
+                rows.append((
+                    name,
+                    group.loc[group['day'] >= today.strftime('%Y-%m-%d'), 'session_id'].nunique(),
+                    group.loc[group['day'] >= week_start.strftime('%Y-%m-%d'), 'session_id'].nunique(),
+                    group['session_id'].nunique(),
+                ))
+    return {name: {'dau': dau, 'wau': wau, 'mau': mau} for name, dau, wau, mau in rows if mau}
+
+
+def load_anchor_click_counts(db, *filters, period=None):
+    # (날짜, 도착 URL, OS, 브라우저) 단위로 SQL에서 미리 집계 (period는 load_pageviews와 같음)
+    day = func.date(AnchorClick.timestamp).label("day")
+    legacy_user_agent = case((AnchorClick.user_agent_id.is_(None), AnchorClick.user_agent)).label("user_agent")
+    stmt = (
+        select(
+            day, AnchorClick.target_url,
+            UserAgent.os_family.label("os"), UserAgent.browser_family.label("browser"), legacy_user_agent,
+            func.count().label("clicks"),
+            func.sum(AnchorClick.is_mobile).label("mobile"),
+            func.sum(AnchorClick.is_pc).label("pc"),
+        )
+        .outerjoin(UserAgent, AnchorClick.user_agent_id == UserAgent.id)
+        .where(*filters)
+        .group_by(day, AnchorClick.target_url, UserAgent.os_family, UserAgent.browser_family, legacy_user_agent)
+    )
+    if period:
+        cold = cold_reader(db, "anchor_clicks", filters, *period, _cold_anchor_click_counts)
+        df = fetch_partitioned(db, stmt, *period, datetime_columns=["day"], cold=cold)
+    else:
+        df = fetch_frame(db, stmt, datetime_columns=["day"])
+
+    legacy = df['user_agent'].notna()
+    if legacy.any():
+        with stage("ua"):
+            parsed = {ua: parse_user_agent(ua) for ua in df.loc[legacy, 'user_agent'].unique()}
+            df.loc[legacy, 'os'] = df.loc[legacy, 'user_agent'].map(lambda ua: parsed[ua].os.family)
+            df.loc[legacy, 'browser'] = df.loc[legacy, 'user_agent'].map(lambda ua: parsed[ua].browser.family)
+    return df.drop(columns=['user_agent'])
+
+
+def _cold_anchor_click_counts(scan):
+    # Parquet로 보관된 달: load_anchor_click_counts와 같은 그룹 집계
+    keys = ["day", "target_url", "os", "browser"]
+    return (
+        scan.with_columns(pl.col("timestamp").dt.truncate("1d").dt.cast_time_unit("ns").alias("day"))
+        .group_by(keys)
+        .agg(clicks=pl.len(), mobile=pl.col("is_mobile").sum(), pc=pl.col("is_pc").sum())
+        .with_columns(pl.col(pl.Categorical).cast(pl.String))
+        .sort(keys)
+        .collect()
+        .to_pandas()
+        .assign(user_agent=None)
+    )
+
+
+def click_buckets(start_date, end_date, interval):
+    # 구간 시작일과 응답 키 목록
+    starts, keys = [], []
+    current_date = start_date
+    while current_date <= end_date:
+        if interval == "daily":
+            next_date = current_date + timedelta(days=1)
+            keys.append(current_date.strftime("%Y%m%d"))
+        elif interval == "weekly":
+            next_date = current_date + timedelta(days=7)
+            keys.append(f"{current_date.strftime('%Y%m%d')}-{(next_date - timedelta(days=1)).strftime('%Y%m%d')}")
+        elif interval == "monthly":
+            next_date = (current_date.replace(day=28) + timedelta(days=4)).replace(day=1)
+            keys.append(current_date.strftime("%Y%m"))
+        starts.append(current_date)
+        current_date = next_date
+    return starts, keys
+
+
+def anchor_click_report(counts, start_date, end_date, interval):
+    """load_anchor_click_counts 결과로 /analytics/anchor-clicks 응답을 만듭니다."""
+    starts, keys = click_buckets(start_date, end_date, interval)
+    data = {
+        key: {
+            "clicks_by_target_url": {},
+            "clicks_by_device": {"mobile": 0, "pc": 0},
+            "clicks_by_os": {},
+            "clicks_by_browser": {},
+        } for key in keys
+    }
+
+    if not counts.empty:
+        position = np.searchsorted(np.array(starts, dtype='datetime64[ns]'), counts['day'].values, side='right') - 1
+        counts = counts.assign(key=np.array(keys, dtype=object)[position])
+
+        def grouped(column):
+            return counts.groupby(['key', column], sort=False)['clicks'].sum()
+
+        for (key, target), clicks in grouped('target_url').items():
+            data[key]["clicks_by_target_url"][target] = int(clicks)
+        for (key, os_family), clicks in grouped('os').items():
+            data[key]["clicks_by_os"][os_family] = int(clicks)
+        for (key, browser_family), clicks in grouped('browser').items():
+            data[key]["clicks_by_browser"][browser_family] = int(clicks)
+        for key, row in counts.groupby('key', sort=False)[['mobile', 'pc']].sum().iterrows():
+            data[key]["clicks_by_device"] = {"mobile": int(row['mobile']), "pc": int(row['pc'])}
+
+    return {
+        "total_clicks": int(counts['clicks'].sum()) if not counts.empty else 0,
+        "data": data,
+    }
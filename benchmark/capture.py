@@ -0,0 +1,89 @@
+"""한 버전의 코드(tree)로 analytics 엔드포인트 응답을 저장합니다. (benchmark.equivalence가 버전마다 별도 프로세스로 실행)
+
+    python -m benchmark.capture --tree . --db /tmp/work/analytics.db --out responses.json URL...
+
+tree의 모듈(main 등)을 import 하므로 이 모듈은 저장소 모듈을 import 하지 않습니다.
+"""
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import sys
+from datetime import datetime
+from benchmark import geoip
+
+# DB 파일과 함께 복사할 디렉터리 (분리된 월 파일, Parquet)
+DATA_DIRS = ["partitions", "parquet"]
+
+
+def prepare_workspace(db_path, directory):
+    """DB(실행 중인 DB도 일관된 사본)와 월 파일, Parquet 디렉터리를 directory로 복사하고 사본 경로를 반환합니다.
+    서버 시작 시 컬럼 추가 등으로 DB가 바뀌므로 버전마다 따로 복사해서 사용합니다.
+    사본 이름은 analytics.db입니다. (ANALYTICS_DB 설정이 없는 이전 버전은 ./analytics.db를 엽니다)"""
+    os.makedirs(directory, exist_ok=True)
+    target = os.path.join(directory, "analytics.db")
+    source = sqlite3.connect(db_path)
+    destination = sqlite3.connect(target)
+    try:
+        source.backup(destination)
+    finally:
+        destination.close()
+        source.close()
+    for name in DATA_DIRS:
+        path = os.path.join(os.path.dirname(os.path.abspath(db_path)), name)
+        if os.path.isdir(path):
+            shutil.copytree(path, os.path.join(directory, name))
+    return target
+
+
+def last_day(db_path):
+    # 데이터의 마지막 날짜 (기간 기준일 기본값)
+    connection = sqlite3.connect(db_path)
+    try:
+        value = connection.execute("SELECT max(timestamp) FROM pageviews").fetchone()[0]
+    finally:
+        connection.close()
+    return datetime.strptime(value[:10], "%Y-%m-%d") if value else datetime.now()
+
+
+def capture(tree, db_path, urls):
+    """tree의 main.app으로 urls를 요청해 {url: {"status", "body"}}를 반환합니다."""
+    sys.path.insert(0, os.path.abspath(tree))
+    os.environ["ANALYTICS_DB"] = os.path.abspath(db_path)
+    os.environ.setdefault("AGGREGATION_WORKERS", "0")  # 집계 프로세스 없이 (다른 버전의 코드를 spawn으로 다시 import 하지 않도록)
+    os.chdir(os.path.dirname(os.path.abspath(db_path)))
+    geoip.install()
+
+    import main
+    from fastapi.testclient import TestClient
+
+    # 서버 오류도 응답(500)으로 저장합니다. (이전 버전에서 외부 API를 호출하는 엔드포인트 등)
+    responses = {}
+    with TestClient(main.app, raise_server_exceptions=False) as client:
+        for url in urls:
+            response = client.get(url)
+            try:
+                body = response.json()
+            except ValueError:
+                body = response.text
+            responses[url] = {"status": response.status_code, "body": body}
+    return responses
+
+
+def main():
+    parser = argparse.ArgumentParser(description="엔드포인트 응답 저장")
+    parser.add_argument("--tree", required=True, help="코드 디렉터리 (main.py 위치)")
+    parser.add_argument("--db", required=True, help="사용할 DB 사본 (prepare_workspace)")
+    parser.add_argument("--out", required=True, help="응답을 저장할 JSON 파일")
+    parser.add_argument("urls", nargs="+")
+    args = parser.parse_args()
+
+    out = os.path.abspath(args.out)
+    responses = capture(args.tree, args.db, args.urls)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(responses, f, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
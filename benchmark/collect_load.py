@@ -0,0 +1,177 @@
+"""collect API 처리량 측정
+
+동시 클라이언트(--concurrency)가 합성 방문자(benchmark.scenarios)의 이벤트를 보내고 요청 처리량, 응답 시간, 저장된 이벤트 수를 측정합니다.
+기본은 앱을 같은 프로세스에서 ASGI로 호출하고(HTTP 파싱 제외), --url을 주면 실행 중인 서버로 보냅니다.
+
+    python -m benchmark.collect_load --scenario mixed --concurrency 32 --seconds 10
+    python -m benchmark.collect_load --scenario batch --db bench/analytics.db
+    python -m benchmark.collect_load --url http://127.0.0.1:8000 --scenario pageview
+"""
+import argparse
+import asyncio
+import os
+import sqlite3
+import tempfile
+import time
+from benchmark import geoip
+from benchmark.scenarios import Population
+
+SCENARIOS = ["pageview", "anchor", "sql", "batch", "mixed"]
+BOT_USER_AGENTS = [
+    "Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)",
+    "Mozilla/5.0 (compatible; Yeti/1.1; +http://naver.me/spd)",
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) HeadlessChrome/120.0.0.0 Safari/537.36",
+]
+EVENT_TABLES = ["pageviews", "anchor_clicks", "wenivsql_data"]
+
+
+class Visitor:
+    """한 방문 세션의 요청 만들기"""
+
+    def __init__(self, population, bot_ratio):
+        rng = population.random
+        ip_address, user_agent = population.visitor()
+        if rng.random() < bot_ratio:
+            user_agent = rng.choice(BOT_USER_AGENTS)
+        self.population = population
+        self.host = population.host()
+        self.headers = {"User-Agent": user_agent, "X-Forwarded-For": ip_address, "Session-Id": population.session_id()}
+        self.url = population.url(self.host)
+
+    def pageview(self):
+        self.url = self.population.url(self.host)
+        return "/collect/pageview", {"url": self.url}, 1
+
+    def anchor(self):
+        return "/collect/anchor-click", {"source_url": self.url, "target_url": self.population.target_url(self.host), "type": "link"}, 1
+
+    def sql(self):
+        return "/collect/sql", {"contents": self.population.sql_query()}, 1
+
+    def batch(self):
+        # 페이지 이동마다 pageview 1개 + anchor-click 0~2개 (testcode/index.html의 전송 단위)
+        now = int(time.time() * 1000)
+        events = []
+        for _ in range(self.population.random.randint(1, 3)):
+            self.url = self.population.url(self.host)
+            events.append({"event": "pageview", "url": self.url, "ts": now - 3000})
+            if self.population.random.random() < 0.3:
+                events.append({"event": "anchor-click", "source_url": self.url, "target_url": self.population.target_url(self.host), "type": "link", "ts": now - 1000})
+        return "/collect/batch", {"session_id": self.headers["Session-Id"], "sent_at": now, "events": events}, len(events)
+
+
+def next_request(visitor, scenario):
+    if scenario != "mixed":
+        return getattr(visitor, scenario)()
+    # 실제 트래픽 비율: pageview 위주, anchor-click은 pageview의 약 30%, sql은 가끔
+    point = visitor.population.random.random()
+    if point < 0.7:
+        return visitor.pageview()
+    if point < 0.93:
+        return visitor.anchor()
+    return visitor.sql()
+
+
+async def worker(client, population, scenario, bot_ratio, deadline, budget, latencies, counters):
+    visitor = Visitor(population, bot_ratio)
+    while time.perf_counter() < deadline and counters["requests"] < budget:
+        # 평균 5번 요청마다 새 방문 세션
+        if population.random.random() < 0.2:
+            visitor = Visitor(population, bot_ratio)
+        path, body, events = next_request(visitor, scenario)
+        counters["requests"] += 1
+        started = time.perf_counter()
+        try:
+            response = await client.post(path, json=body, headers=visitor.headers)
+            ok = response.status_code == 200
+        except Exception:
+            ok = False
+        latencies.append((time.perf_counter() - started) * 1000)
+        counters["events" if ok else "errors"] += events if ok else 1
+
+
+async def load(client, scenario, concurrency, seconds, requests, bot_ratio, seed):
+    population = Population(seed)
+    latencies, counters = [], {"requests": 0, "events": 0, "errors": 0}
+    started = time.perf_counter()
+    deadline = started + seconds
+    await asyncio.gather(*[
+        worker(client, population, scenario, bot_ratio, deadline, requests, latencies, counters)
+        for _ in range(concurrency)
+    ])
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": counters["requests"],
+        "errors": counters["errors"],
+        "requests_per_sec": round(counters["requests"] / elapsed),
+        "sent_events_per_sec": round(counters["events"] / elapsed),
+        "p50_ms": round(latencies[len(latencies) // 2], 2) if latencies else None,
+        "p95_ms": round(latencies[int(len(latencies) * 0.95)], 2) if latencies else None,
+        "p99_ms": round(latencies[int(len(latencies) * 0.99)], 2) if latencies else None,
+    }
+
+
+def count_rows(db_path):
+    connection = sqlite3.connect(db_path)
+    try:
+        return {table: connection.execute(f"SELECT count(*) FROM {table}").fetchone()[0] for table in EVENT_TABLES}
+    finally:
+        connection.close()
+
+
+async def run_in_process(db_path, args):
+    # DB 경로는 저장소 모듈을 import 하기 전에 정해야 합니다.
+    os.environ["ANALYTICS_DB"] = os.path.abspath(db_path)
+    geoip.install()
+    import httpx
+    import main
+
+    await main.app.router.startup()
+    before = count_rows(db_path)
+    try:
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            result = await load(client, args.scenario, args.concurrency, args.seconds, args.requests, args.bot_ratio, args.seed)
+    finally:
+        # 종료 시 큐에 남은 이벤트를 모두 저장합니다.
+        await main.app.router.shutdown()
+    after = count_rows(db_path)
+    result["stored"] = {table: after[table] - before[table] for table in EVENT_TABLES}
+    result["ingest"] = main.ingest_buffer.stats()
+    result["bot_filter"] = main.bot_filter.stats()["rejected_by_reason"]
+    return result
+
+
+async def run_remote(url, args):
+    import httpx
+
+    async with httpx.AsyncClient(base_url=url, limits=httpx.Limits(max_connections=args.concurrency)) as client:
+        return await load(client, args.scenario, args.concurrency, args.seconds, args.requests, args.bot_ratio, args.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="collect API 처리량")
+    parser.add_argument("--scenario", default="mixed", choices=SCENARIOS)
+    parser.add_argument("--concurrency", type=int, default=32, help="동시 클라이언트 수")
+    parser.add_argument("--seconds", type=float, default=10, help="최대 측정 시간(초)")
+    parser.add_argument("--requests", type=int, default=10 ** 9, help="최대 요청 수")
+    parser.add_argument("--bot-ratio", type=float, default=0.05, help="봇 User-Agent 방문 비율 (수집 제외 대상)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--db", help="이벤트를 저장할 DB (기본: 임시 DB)")
+    parser.add_argument("--url", help="실행 중인 서버 주소 (주면 같은 프로세스에서 실행하지 않음)")
+    args = parser.parse_args()
+
+    if args.url:
+        result = asyncio.run(run_remote(args.url, args))
+    elif args.db:
+        result = asyncio.run(run_in_process(args.db, args))
+    else:
+        with tempfile.TemporaryDirectory() as directory:
+            result = asyncio.run(run_in_process(os.path.join(directory, "analytics.db"), args))
+    for key, value in result.items():
+        print(f"{key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""대시보드 조회가 동시에 실행될 때의 collect 저장 처리량 측정
+
+기존 설정(rollback journal, 연결 풀 공유)과 storage.py 설정(WAL, 쓰기/읽기 연결 분리)을 비교합니다.
+
+    python -m benchmark.concurrent_ingest [--rows 200000] [--readers 4] [--seconds 10]
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, insert
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+from models import Base, Pageview
+from analytics import load_pageviews
+from ingest import IngestBuffer
+from storage import create_engines
+
+HOSTS = ["books.weniv.co.kr", "world.weniv.co.kr", "sql.weniv.co.kr", "notebook.weniv.co.kr"]
+USER_AGENTS = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36",
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.0 Mobile/15E148 Safari/604.1",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.0 Safari/605.1.15",
+]
+
+
+def make_pageview(timestamp):
+    host = random.choice(HOSTS)
+    path = f"/{random.randint(1, 50)}"
+    return {
+        "timestamp": timestamp,
+        "url": f"https://{host}{path}",
+        "host": host,
+        "path": path,
+        "session_id": f"s{random.randint(1, 5000)}",
+        "user_agent": random.choice(USER_AGENTS),
+        "country": "South Korea",
+        "city": "Seoul",
+        "is_mobile": random.randint(0, 1),
+        "is_pc": random.randint(0, 1),
+    }
+
+
+def seed(engine, rows, days=30):
+    now = datetime.now()
+    with engine.begin() as conn:
+        for start in range(0, rows, 10000):
+            conn.execute(insert(Pageview), [
+                make_pageview(now - timedelta(seconds=random.randint(0, days * 86400)))
+                for _ in range(min(10000, rows - start))
+            ])
+
+
+def run(writer, reader, readers, seconds, days=30):
+    WriteSession = sessionmaker(autocommit=False, autoflush=False, bind=writer)
+    ReadSession = sessionmaker(autocommit=False, autoflush=False, bind=reader)
+    stop = threading.Event()
+    query_ms = []
+    query_errors = [0]
+
+    def dashboard():
+        # 최근 days일 pageview 조회를 반복 (대시보드 요청)
+        while not stop.is_set():
+            start = datetime.now() - timedelta(days=days)
+            started = time.perf_counter()
+            db = ReadSession()
+            try:
+                load_pageviews(db, Pageview.timestamp >= start)
+                query_ms.append((time.perf_counter() - started) * 1000)
+            except OperationalError:
+                query_errors[0] += 1
+            finally:
+                db.close()
+
+    async def collect(buffer):
+        # 요청 처리 속도 그대로 이벤트를 넣고, seconds초 동안 저장된 수를 셉니다.
+        await buffer.start()
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            await buffer.put(Pageview(**make_pageview(datetime.now())))
+            if buffer.enqueued_events % 100 == 0:
+                await asyncio.sleep(0)
+        await buffer.stop()
+
+    threads = [threading.Thread(target=dashboard) for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    buffer = IngestBuffer(WriteSession)
+    started = time.perf_counter()
+    asyncio.run(collect(buffer))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    stats = buffer.stats()
+    query_ms.sort()
+    return {
+        "events_per_sec": round(stats["flushed_events"] / elapsed),
+        "failed_events": stats["failed_events"],
+        "max_flush_ms": stats["max_flush_ms"],
+        "queries": len(query_ms),
+        "query_p50_ms": round(query_ms[len(query_ms) // 2], 1) if query_ms else None,
+        "query_p95_ms": round(query_ms[int(len(query_ms) * 0.95)], 1) if query_ms else None,
+        "query_errors": query_errors[0],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="동시 조회 중 collect 저장 처리량")
+    parser.add_argument("--rows", type=int, default=200000, help="미리 넣어 둘 pageview 수")
+    parser.add_argument("--readers", type=int, default=4, help="동시에 조회하는 스레드 수")
+    parser.add_argument("--seconds", type=float, default=10, help="측정 시간(초)")
+    args = parser.parse_args()
+
+    for name in ("rollback", "wal"):
+        with tempfile.TemporaryDirectory() as directory:
+            url = f"sqlite:///{os.path.join(directory, 'analytics.db')}"
+            if name == "wal":
+                writer, reader = create_engines(url, wal=True, read_pool_size=args.readers)
+            else:
+                # 기존 main.py 설정: 기본 journal, 읽기/쓰기가 같은 엔진 사용
+                writer = reader = create_engine(url, connect_args={"check_same_thread": False})
+            Base.metadata.create_all(bind=writer)
+            random.seed(0)
+            seed(writer, args.rows)
+            result = run(writer, reader, args.readers, args.seconds)
+            writer.dispose()
+            reader.dispose()
+        print(name, result)
+
+
+if __name__ == "__main__":
+    main()
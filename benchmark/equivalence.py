@@ -0,0 +1,121 @@
+"""두 버전의 코드가 같은 데이터로 같은 응답을 주는지 확인합니다. (최적화 전후 비교)
+
+버전마다 DB 사본을 만들고 별도 프로세스(benchmark.capture)에서 엔드포인트를 요청한 뒤 응답을 비교합니다.
+--baseline은 디렉터리 또는 git ref(커밋, 브랜치)이며, git ref는 git archive로 꺼내서 사용합니다.
+
+    python -m benchmark.equivalence --db bench/analytics.db --baseline HEAD~1
+    python -m benchmark.equivalence --db bench/analytics.db --baseline ../weniv_analytics_old --endpoints pageviews,anchor_clicks
+"""
+import argparse
+import json
+import math
+import os
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+from datetime import datetime
+from benchmark.capture import last_day, prepare_workspace
+from benchmark.scenarios import ENDPOINTS, WINDOWS, endpoint_urls
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def export_ref(ref, directory):
+    # git ref의 파일을 directory에 꺼냅니다.
+    archive = os.path.join(directory, "tree.tar")
+    subprocess.run(["git", "-C", ROOT, "archive", "--format=tar", "-o", archive, ref], check=True)
+    tree = os.path.join(directory, "tree")
+    with tarfile.open(archive) as tar:
+        tar.extractall(tree)
+    return tree
+
+
+def run_capture(tree, db_path, urls, directory):
+    """tree의 코드로 응답을 저장하고 읽어옵니다. (DB 사본은 directory에)"""
+    workspace = prepare_workspace(db_path, directory)
+    out = os.path.join(directory, "responses.json")
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join([ROOT, os.environ.get("PYTHONPATH", "")]).rstrip(os.pathsep)}
+    started = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "-m", "benchmark.capture", "--tree", tree, "--db", workspace, "--out", out, *urls],
+        cwd=directory, env=env, check=True,
+    )
+    with open(out, encoding="utf-8") as f:
+        return json.load(f), time.perf_counter() - started
+
+
+def difference(expected, actual, path="$", ordered=False, rel_tol=1e-9):
+    """처음으로 다른 위치와 값 (같으면 None). 숫자는 rel_tol 안에서 같은 값으로 봅니다.
+    ordered=True이면 객체 키 순서(정렬된 breakdown 등)도 비교합니다."""
+    if isinstance(expected, bool) or isinstance(actual, bool):
+        return None if expected is actual else f"{path}: {expected!r} != {actual!r}"
+    if isinstance(expected, (int, float)) and isinstance(actual, (int, float)):
+        if math.isclose(expected, actual, rel_tol=rel_tol, abs_tol=rel_tol):
+            return None
+        return f"{path}: {expected!r} != {actual!r}"
+    if type(expected) is not type(actual):
+        return f"{path}: {type(expected).__name__} != {type(actual).__name__}"
+    if isinstance(expected, dict):
+        if ordered and list(expected) != list(actual):
+            return f"{path}: 키 순서 {list(expected)[:5]}... != {list(actual)[:5]}..."
+        if expected.keys() != actual.keys():
+            missing, extra = expected.keys() - actual.keys(), actual.keys() - expected.keys()
+            return f"{path}: 없는 키 {sorted(missing)[:5]}, 추가된 키 {sorted(extra)[:5]}"
+        for key in expected:
+            found = difference(expected[key], actual[key], f"{path}.{key}", ordered, rel_tol)
+            if found:
+                return found
+        return None
+    if isinstance(expected, list):
+        if len(expected) != len(actual):
+            return f"{path}: 길이 {len(expected)} != {len(actual)}"
+        for i, (a, b) in enumerate(zip(expected, actual)):
+            found = difference(a, b, f"{path}[{i}]", ordered, rel_tol)
+            if found:
+                return found
+        return None
+    return None if expected == actual else f"{path}: {expected!r} != {actual!r}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="두 버전의 엔드포인트 응답 비교")
+    parser.add_argument("--db", required=True, help="비교에 사용할 DB (버전마다 사본을 만듭니다)")
+    parser.add_argument("--baseline", required=True, help="기준 버전: 디렉터리 또는 git ref")
+    parser.add_argument("--candidate", default=ROOT, help="비교할 버전 디렉터리 (기본: 현재 작업 트리)")
+    parser.add_argument("--endpoints", help=f"쉼표로 구분 (기본: 전체) {', '.join(ENDPOINTS)}")
+    parser.add_argument("--windows", default=",".join(map(str, WINDOWS)), help="기간(일), 쉼표로 구분")
+    parser.add_argument("--interval", default="daily", choices=["daily", "weekly", "monthly"])
+    parser.add_argument("--end", help="기간 마지막 날짜 YYYYMMDD (기본: 데이터의 마지막 날짜)")
+    parser.add_argument("--ordered", action="store_true", help="객체 키 순서도 비교")
+    parser.add_argument("--rel-tol", type=float, default=1e-9, help="숫자 비교 허용 오차 (상대)")
+    args = parser.parse_args()
+
+    end = datetime.strptime(args.end, "%Y%m%d") if args.end else last_day(args.db)
+    names = args.endpoints.split(",") if args.endpoints else None
+    windows = [int(days) for days in args.windows.split(",")]
+    cases = endpoint_urls(end, windows, names, args.interval)
+    urls = [url for _, _, url in cases]
+
+    with tempfile.TemporaryDirectory() as directory:
+        baseline = args.baseline if os.path.isdir(args.baseline) else export_ref(args.baseline, directory)
+        expected, baseline_seconds = run_capture(baseline, args.db, urls, os.path.join(directory, "baseline"))
+        actual, candidate_seconds = run_capture(args.candidate, args.db, urls, os.path.join(directory, "candidate"))
+
+    failures = 0
+    for name, days, url in cases:
+        a, b = expected[url], actual[url]
+        if a["status"] != b["status"]:
+            found = f"status {a['status']} != {b['status']}"
+        else:
+            found = difference(a["body"], b["body"], ordered=args.ordered, rel_tol=args.rel_tol)
+        failures += found is not None
+        print(f"{'DIFF' if found else 'ok':4}  {name:20} {days or '-':>4}  {found or ''}")
+
+    print(f"{len(cases) - failures}/{len(cases)} 일치 (baseline {baseline_seconds:.1f}s, candidate {candidate_seconds:.1f}s)")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""GeoLite2-City.mmdb 없이 실행하기 위한 GeoIP 대체 reader
+
+IP 해시로 지역을 정하므로 같은 IP는 항상 같은 지역입니다. 사설 IP는 실제 DB처럼 AddressNotFoundError를 냅니다.
+저장소 모듈(utils 등)을 import 하기 전에 install()을 호출해야 합니다.
+"""
+import hashlib
+import types
+import geoip2.database
+import geoip2.errors
+
+# (city, country, 비중): GeoLite2가 돌려주는 이름 표기, city가 없는 응답도 포함
+LOCATIONS = [
+    ("Seoul", "South Korea", 30), ("Gangnam-gu", "South Korea", 6), ("Seocho-gu", "South Korea", 3),
+    ("Songpa-gu", "South Korea", 3), ("Mapo-gu", "South Korea", 2), ("Guro-gu", "South Korea", 2),
+    ("Incheon", "South Korea", 5), ("Suwon", "South Korea", 4), ("Seongnam-si", "South Korea", 4),
+    ("Goyang-si", "South Korea", 3), ("Yongin-si", "South Korea", 3), ("Busan", "South Korea", 5),
+    ("Haeundae-gu", "South Korea", 1), ("Daegu", "South Korea", 3), ("Daejeon", "South Korea", 3),
+    ("Gwangju", "South Korea", 2), ("Ulsan", "South Korea", 1), ("Cheongju-si", "South Korea", 1),
+    ("Jeonju", "South Korea", 1), ("Jeju City", "South Korea", 1), ("Jung-gu", "South Korea", 2),
+    (None, "South Korea", 6),
+    ("Tokyo", "Japan", 2), ("Los Angeles", "United States", 1), ("Ashburn", "United States", 1),
+    ("Singapore", "Singapore", 1), ("Hanoi", "Vietnam", 1), (None, "Canada", 1),
+]
+PRIVATE_PREFIXES = ("10.", "127.", "192.168.", "172.16.")
+
+_TOTAL = sum(weight for *_, weight in LOCATIONS)
+
+
+class StubReader:
+    """geoip2.database.Reader 대체 (city()만 지원)"""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def city(self, ip_address):
+        if ip_address is None or ip_address.startswith(PRIVATE_PREFIXES):
+            raise geoip2.errors.AddressNotFoundError(f"The address {ip_address} is not in the database.")
+        point = int(hashlib.md5(ip_address.encode()).hexdigest()[:8], 16) % _TOTAL
+        for city, country, weight in LOCATIONS:
+            if point < weight:
+                return types.SimpleNamespace(
+                    city=types.SimpleNamespace(name=city), country=types.SimpleNamespace(name=country),
+                )
+            point -= weight
+
+    def close(self):
+        pass
+
+
+def install():
+    # utils.py의 `from geoip2.database import Reader`보다 먼저 호출해야 합니다.
+    geoip2.database.Reader = StubReader
@@ -0,0 +1,107 @@
+"""analytics 엔드포인트 응답 시간 측정 (7/30/90/365일 기간)
+
+요청마다 응답 캐시를 비우고(--warm이면 캐시 적중 시간) 같은 요청을 --repeat번 보내서 p50, p95를 구합니다.
+Server-Timing 헤더의 단계별 시간(db, fetch, frame, aggregate, json 등)은 중앙값을 표시합니다.
+
+    python -m benchmark.latency --db bench/analytics.db
+    python -m benchmark.latency --db bench/analytics.db --endpoints pageviews,anchor_clicks --windows 30,365 --json before.json
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+from datetime import datetime
+from benchmark import geoip
+from benchmark.capture import last_day
+from benchmark.scenarios import ENDPOINTS, WINDOWS, endpoint_urls
+
+
+def parse_server_timing(header):
+    # "db;dur=1.2, fetch;dur=3.4, cache;desc=miss" -> {"db": 1.2, "fetch": 3.4}
+    stages = {}
+    for entry in (header or "").split(","):
+        name, *params = [part.strip() for part in entry.split(";")]
+        for param in params:
+            if param.startswith("dur="):
+                stages[name] = float(param[4:])
+    return stages
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def measure(client, url, repeat, warm, clear_cache):
+    durations, timings, status = [], [], None
+    if warm:
+        client.get(url)
+    for _ in range(repeat):
+        if not warm:
+            clear_cache()
+        started = time.perf_counter()
+        response = client.get(url)
+        durations.append((time.perf_counter() - started) * 1000)
+        timings.append(parse_server_timing(response.headers.get("server-timing")))
+        status = response.status_code
+    stages = {
+        name: round(statistics.median(timing.get(name, 0.0) for timing in timings), 1)
+        for name in dict.fromkeys(name for timing in timings for name in timing) if name != "total"
+    }
+    return {
+        "status": status,
+        "p50_ms": round(percentile(durations, 0.5), 1),
+        "p95_ms": round(percentile(durations, 0.95), 1),
+        "max_ms": round(max(durations), 1),
+        "stages_ms": stages,
+    }
+
+
+def run(db_path, cases, repeat, warm):
+    # DB 경로는 저장소 모듈을 import 하기 전에 정해야 합니다.
+    os.environ["ANALYTICS_DB"] = os.path.abspath(db_path)
+    os.chdir(os.path.dirname(os.path.abspath(db_path)))  # 분리된 월 파일, Parquet 상대 경로
+    geoip.install()
+
+    import main
+    from cache import response_cache
+    from fastapi.testclient import TestClient
+
+    results = []
+    with TestClient(main.app) as client:
+        # 집계 프로세스 시작, 연결 풀 준비 시간은 빼고 측정합니다.
+        client.get(cases[0][2])
+        for name, days, url in cases:
+            result = measure(client, url, repeat, warm, response_cache.clear)
+            results.append({"endpoint": name, "days": days, "url": url, **result})
+            stages = " ".join(f"{stage}={ms}" for stage, ms in result["stages_ms"].items())
+            print(f"{name:20} {days or '-':>4}  {result['status']}  p50 {result['p50_ms']:8.1f}  p95 {result['p95_ms']:8.1f}  max {result['max_ms']:8.1f}  {stages}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="analytics 엔드포인트 응답 시간")
+    parser.add_argument("--db", required=True, help="측정할 DB (benchmark.synthetic으로 생성)")
+    parser.add_argument("--endpoints", help=f"쉼표로 구분 (기본: 전체) {', '.join(ENDPOINTS)}")
+    parser.add_argument("--windows", default=",".join(map(str, WINDOWS)), help="기간(일), 쉼표로 구분")
+    parser.add_argument("--interval", default="daily", choices=["daily", "weekly", "monthly"])
+    parser.add_argument("--end", help="기간 마지막 날짜 YYYYMMDD (기본: 데이터의 마지막 날짜)")
+    parser.add_argument("--repeat", type=int, default=5, help="요청 반복 횟수")
+    parser.add_argument("--warm", action="store_true", help="응답 캐시를 비우지 않음 (캐시 적중 시간)")
+    parser.add_argument("--json", help="결과를 저장할 JSON 파일")
+    args = parser.parse_args()
+
+    end = datetime.strptime(args.end, "%Y%m%d") if args.end else last_day(args.db)
+    names = args.endpoints.split(",") if args.endpoints else None
+    cases = endpoint_urls(end, [int(days) for days in args.windows.split(",")], names, args.interval)
+    out = os.path.abspath(args.json) if args.json else None
+
+    results = run(args.db, cases, args.repeat, args.warm)
+    if out:
+        with open(out, "w", encoding="utf-8") as f:
+            json.dump({"end": f"{end:%Y%m%d}", "repeat": args.repeat, "warm": args.warm, "results": results}, f, ensure_ascii=False, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""벤치마크 공통 시나리오: 방문자, URL 분포와 측정할 analytics 엔드포인트
+
+저장소 모듈을 import 하지 않으므로 DB 경로(ANALYTICS_DB)를 정하기 전에도, 다른 버전의 코드와 비교할 때도 사용할 수 있습니다.
+"""
+import itertools
+import random
+from datetime import timedelta
+from urllib.parse import quote
+
+# (host, 세션 비중)
+SERVICES = [
+    ("books.weniv.co.kr", 55),
+    ("sql.weniv.co.kr", 15),
+    ("world.weniv.co.kr", 12),
+    ("weniv.link", 10),
+    ("notebook.weniv.co.kr", 8),
+]
+BOOKS = ["python", "sql", "javascript", "html-css", "github", "basecamp-html-css", "basecamp-javascript",
+         "basecamp-network", "basecamp-sql", "wenivworld", "wenivworld-teacher", "figma-serenade"]
+KEYWORDS = ["파이썬", "리스트", "딕셔너리", "for문", "flexbox", "grid", "async", "join", "group by", "git rebase", "클로저", "sql"]
+EXTERNAL_TARGETS = ["https://github.com/weniv", "https://www.youtube.com/@weniv", "https://www.inflearn.com/", "https://discord.gg/weniv"]
+REFERERS = [(None, 45), ("https://www.google.com/", 25), ("https://search.naver.com/", 15), ("https://www.youtube.com/", 5), ("internal", 10)]
+SQL_QUERIES = [
+    "SELECT * FROM users LIMIT 10",
+    "SELECT name, count(*) FROM orders GROUP BY name",
+    "SELECT * FROM products WHERE price > 1000 ORDER BY price DESC",
+    "SELECT a.id, b.title FROM authors a JOIN books b ON a.id = b.author_id",
+]
+
+# (User-Agent 형식, 비중): {v}는 브라우저 버전
+USER_AGENTS = [
+    ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{v}.0.0.0 Safari/537.36", 38),
+    ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{v}.0.0.0 Safari/537.36 Edg/{v}.0.0.0", 6),
+    ("Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{v}.0.0.0 Safari/537.36", 12),
+    ("Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.{m} Safari/605.1.15", 6),
+    ("Mozilla/5.0 (iPhone; CPU iPhone OS 17_{m} like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.{m} Mobile/15E148 Safari/604.1", 15),
+    ("Mozilla/5.0 (Linux; Android 14; SM-S918N) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{v}.0.0.0 Mobile Safari/537.36", 8),
+    ("Mozilla/5.0 (Linux; Android 14; SM-S918N) AppleWebKit/537.36 (KHTML, like Gecko) SamsungBrowser/24.0 Chrome/{v}.0.0.0 Mobile Safari/537.36", 5),
+    ("Mozilla/5.0 (iPad; CPU OS 17_{m} like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.{m} Mobile/15E148 Safari/604.1", 3),
+    ("Mozilla/5.0 (X11; Linux x86_64; rv:{v}.0) Gecko/20100101 Firefox/{v}.0", 3),
+    ("Mozilla/5.0 (Linux; Android 13; SM-S901N) AppleWebKit/537.36 (KHTML, like Gecko) Version/4.0 Chrome/{v}.0.0.0 Mobile Safari/537.36 KAKAOTALK 10.4.5", 4),
+]
+
+# sql 이벤트는 sql.weniv 세션에서만 생기므로 전체 pageview 대비 비율을 맞추기 위한 배수
+SQL_SESSION_FACTOR = sum(weight for _, weight in SERVICES) / dict(SERVICES)["sql.weniv.co.kr"]
+
+# 시간대별(KST 0~23시) 방문 비중, 요일별(월~일) 비중
+HOUR_WEIGHTS = [2, 1, 1, 1, 1, 1, 2, 3, 5, 7, 8, 8, 7, 8, 9, 9, 8, 7, 6, 7, 8, 8, 6, 4]
+WEEKDAY_WEIGHTS = [1.0, 1.0, 1.0, 0.95, 0.85, 0.6, 0.7]
+
+
+def _weighted(items):
+    # random.choices에 넘길 (값 목록, 누적 비중) - 호출마다 누적 비중을 다시 계산하지 않도록
+    items = list(items)
+    values = [item for item, _ in items]
+    return values, list(itertools.accumulate(weight for _, weight in items))
+
+
+class Population:
+    """방문자(IP, User-Agent)와 URL 분포 (seed가 같으면 같은 데이터를 만듭니다)"""
+
+    def __init__(self, seed: int = 0, visitors: int = 200000, returning: float = 0.6):
+        self.random = random.Random(seed)
+        self.visitors = visitors
+        self.returning = returning
+        self.known = []  # 재방문자 (ip, user_agent)
+        self.hosts, self.host_weights = _weighted(SERVICES)
+        self.user_agents, self.user_agent_weights = _weighted(USER_AGENTS)
+        self.referers, self.referer_weights = _weighted(REFERERS)
+        # 교안, 챕터 인기는 Zipf 분포
+        self.books, self.book_weights = _weighted((book, 1 / (rank + 1)) for rank, book in enumerate(BOOKS))
+        self.chapters, self.chapter_weights = _weighted((rank + 1, 1 / (rank + 1) ** 1.2) for rank in range(40))
+        self.hours, self.hour_weights = _weighted(enumerate(HOUR_WEIGHTS))
+
+    def user_agent(self):
+        template = self.random.choices(self.user_agents, cum_weights=self.user_agent_weights)[0]
+        return template.format(v=self.random.randint(116, 126), m=self.random.randint(0, 5))
+
+    def ip_address(self):
+        if self.random.random() < 0.02:
+            return f"10.{self.random.randint(0, 255)}.{self.random.randint(0, 255)}.{self.random.randint(1, 254)}"
+        return f"{self.random.randint(1, 223)}.{self.random.randint(0, 255)}.{self.random.randint(0, 255)}.{self.random.randint(1, 254)}"
+
+    def visitor(self):
+        # 재방문자는 같은 IP, User-Agent로 다시 방문합니다.
+        if self.known and self.random.random() < self.returning:
+            return self.random.choice(self.known)
+        visitor = (self.ip_address(), self.user_agent())
+        if len(self.known) < self.visitors:
+            self.known.append(visitor)
+        else:
+            self.known[self.random.randrange(self.visitors)] = visitor
+        return visitor
+
+    def session_id(self):
+        return f"{self.random.getrandbits(128):032x}"
+
+    def host(self):
+        return self.random.choices(self.hosts, cum_weights=self.host_weights)[0]
+
+    def url(self, host):
+        chapter = self.random.choices(self.chapters, cum_weights=self.chapter_weights)[0]
+        if host == "books.weniv.co.kr":
+            if self.random.random() < 0.04:
+                return f"https://{host}/search?keyword={quote(self.random.choice(KEYWORDS))}"
+            book = self.random.choices(self.books, cum_weights=self.book_weights)[0]
+            return f"https://{host}/{book}/chapter{chapter}"
+        if host == "weniv.link":
+            return f"https://{host}/{self.random.choice(['', 'event', 'notice', 'lecture'])}"
+        if host == "sql.weniv.co.kr":
+            return f"https://{host}/{self.random.choice(['', 'editor', f'lesson/{chapter}'])}"
+        if host == "world.weniv.co.kr":
+            return f"https://{host}/{self.random.choice(['', 'play', f'lesson/{chapter}'])}"
+        return f"https://{host}/notebook/{chapter}"
+
+    def referer(self, previous_url):
+        referer = self.random.choices(self.referers, cum_weights=self.referer_weights)[0]
+        return previous_url if referer == "internal" else referer
+
+    def target_url(self, source_host):
+        if self.random.random() < 0.3:
+            return self.random.choice(EXTERNAL_TARGETS)
+        host = source_host if self.random.random() < 0.6 else self.host()
+        return self.url(host)
+
+    def sql_query(self):
+        return self.random.choice(SQL_QUERIES)
+
+
+# 측정할 analytics 엔드포인트: {start}, {end}(YYYYMMDD)가 없는 엔드포인트는 기간과 관계없이 한 번만 측정합니다.
+ENDPOINTS = {
+    "pageviews": "/analytics/pageviews?url=books.weniv&date_start={start}&date_end={end}&interval={interval}",
+    "pageviews_host": "/analytics/pageviews?host=books.weniv.co.kr&date_start={start}&date_end={end}&interval={interval}",
+    "pageviews_path": "/analytics/pageviews?host=books.weniv.co.kr&path=/python&date_start={start}&date_end={end}&interval={interval}",
+    "usercount": "/analytics/pageviews/usercount?url=books.weniv&date_start={start}&date_end={end}&interval={interval}",
+    "usercount_approx": "/analytics/pageviews/usercount?host=books.weniv.co.kr&approx=true&date_start={start}&date_end={end}&interval={interval}",
+    "usercount_weniv": "/analytics/pageviews/usercount/weniv?date_start={start}&date_end={end}&interval={interval}",
+    "active_users": "/analytics/pageviews/active_users?url=books.weniv",
+    "active_users_series": "/analytics/pageviews/active_users/series?host=books.weniv.co.kr&date_start={start}&date_end={end}",
+    "top5": "/analytics/pageviews/top5?interval=monthly",
+    "anchor_clicks": "/analytics/anchor-clicks?source_url=books.weniv&date_start={start}&date_end={end}&interval={interval}",
+    "wenivbooks_url": "/analytics/wenivbooks/url?date_start={start}&date_end={end}",
+    "wenivbooks_tech": "/analytics/wenivbooks/tech?date_start={start}&date_end={end}",
+    "wenivbooks_keyword": "/analytics/wenivbooks/keyword?date_start={start}&date_end={end}",
+}
+WINDOWS = [7, 30, 90, 365]
+
+
+def endpoint_urls(end, windows=WINDOWS, names=None, interval="daily"):
+    """(엔드포인트 이름, 기간(일), URL) 목록: 기간은 end(datetime)에서 끝나는 windows일"""
+    urls = []
+    for name, template in ENDPOINTS.items():
+        if names and name not in names:
+            continue
+        if "{start}" not in template:
+            urls.append((name, None, template))
+            continue
+        for days in windows:
+            start = end - timedelta(days=days - 1)
+            urls.append((name, days, template.format(start=f"{start:%Y%m%d}", end=f"{end:%Y%m%d}", interval=interval)))
+    return urls
@@ -0,0 +1,178 @@
+"""벤치마크용 analytics.db 합성 데이터 생성
+
+위니브 서비스 5곳의 방문 세션을 날짜(요일, 증가 추세), 시간대 분포에 따라 만들고
+세션마다 pageview, anchor-click, sql 이벤트를 collect API가 저장하던 형태(문자열 컬럼)로 넣습니다.
+그 뒤 migrate.py 이관과 rollup 재집계를 실행해 운영 DB와 같은 상태로 만듭니다. (--legacy: 이관 전 상태로 둠)
+
+    python -m benchmark.synthetic bench/analytics.db --pageviews 1000000 --days 365
+"""
+import argparse
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from benchmark import geoip
+from benchmark.scenarios import Population, SQL_SESSION_FACTOR, WEEKDAY_WEIGHTS
+
+geoip.install()
+
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+from models import Base  # noqa: E402
+from storage import create_engines  # noqa: E402
+from useragent import parse_user_agent  # noqa: E402
+from utils import KST, lookup_location  # noqa: E402
+
+def daily_weights(start, days, growth: float = 0.5):
+    # 요일별 비중 x 증가 추세 (마지막 날이 첫날보다 growth만큼 많음)
+    return [
+        WEEKDAY_WEIGHTS[(start + timedelta(days=i)).weekday()] * (1 + growth * i / max(days - 1, 1))
+        for i in range(days)
+    ]
+
+
+def generate_session(population, day, anchor_ratio, sql_ratio):
+    """세션 하나의 (pageviews, anchor_clicks, wenivsql_data) 행 목록"""
+    rng = population.random
+    ip_address, user_agent = population.visitor()
+    session_id = population.session_id()
+    host = population.host()
+    hour = rng.choices(population.hours, cum_weights=population.hour_weights)[0]
+    timestamp = day + timedelta(hours=hour, seconds=rng.randint(0, 3599))
+
+    pageviews, clicks, queries = [], [], []
+    previous_url = None
+    for _ in range(min(int(rng.expovariate(1 / 3)) + 1, 40)):  # 세션당 pageview 수 (평균 약 3.5)
+        url = population.url(host if rng.random() < 0.85 else population.host())
+        pageviews.append((timestamp, url, population.referer(previous_url), ip_address, session_id, user_agent))
+        if rng.random() < anchor_ratio:
+            clicks.append((timestamp + timedelta(seconds=rng.randint(5, 120)), url, population.target_url(host), ip_address, session_id, user_agent))
+        if host == "sql.weniv.co.kr" and rng.random() < sql_ratio * SQL_SESSION_FACTOR:
+            queries.append((timestamp + timedelta(seconds=rng.randint(5, 120)), population.sql_query(), ip_address, session_id, user_agent))
+        previous_url = url
+        timestamp += timedelta(seconds=int(rng.expovariate(1 / 90)) + 1)
+    return pageviews, clicks, queries
+
+
+class _Writer:
+    """collect API가 저장하던 형태로 행을 넣습니다. (User-Agent, 지역은 요청 시점처럼 파싱, GeoIP 조회)"""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.devices = {}  # User-Agent 문자열 -> (is_mobile, is_pc)
+        self.counts = {"pageviews": 0, "anchor_clicks": 0, "wenivsql_data": 0}
+
+    @staticmethod
+    def _format(timestamp):
+        return timestamp.strftime("%Y-%m-%d %H:%M:%S.%f")
+
+    def _device(self, user_agent_string):
+        device = self.devices.get(user_agent_string)
+        if device is None:
+            user_agent = parse_user_agent(user_agent_string)
+            device = self.devices[user_agent_string] = (int(user_agent.is_mobile), int(user_agent.is_pc))
+        return device
+
+    def write(self, pageviews, clicks, queries):
+        self.connection.executemany(
+            "INSERT INTO pageviews (timestamp, url, referer_url, ip_address, session_id, user_location, user_agent, is_mobile, is_pc) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [(self._format(ts), url, referer, ip, sid, lookup_location(ip).user_location, ua, *self._device(ua))
+             for ts, url, referer, ip, sid, ua in pageviews],
+        )
+        self.connection.executemany(
+            "INSERT INTO anchor_clicks (timestamp, source_url, target_url, ip_address, session_id, user_agent, is_mobile, is_pc, type) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'link')",
+            [(self._format(ts), source, target, ip, sid, ua, *self._device(ua)) for ts, source, target, ip, sid, ua in clicks],
+        )
+        self.connection.executemany(
+            "INSERT INTO wenivsql_data (timestamp, contents, ip_address, session_id, user_agent, is_mobile, is_pc) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(self._format(ts), contents, ip, sid, ua, *self._device(ua)) for ts, contents, ip, sid, ua in queries],
+        )
+        self.counts["pageviews"] += len(pageviews)
+        self.counts["anchor_clicks"] += len(clicks)
+        self.counts["wenivsql_data"] += len(queries)
+
+
+def generate(path, pageviews: int, days: int, end=None, anchor_ratio: float = 0.3, sql_ratio: float = 0.05, seed: int = 0):
+    """기간(end까지 days일) 동안 약 pageviews개의 pageview가 되도록 세션을 만들어 저장합니다. (행 id는 시간 순서)"""
+    end = end or datetime.now(KST).replace(tzinfo=None)
+    start = (end - timedelta(days=days - 1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    population = Population(seed)
+    weights = daily_weights(start, days)
+    sessions_per_weight = pageviews / 3.5 / sum(weights)  # 세션당 pageview 평균 약 3.5
+
+    connection = sqlite3.connect(path)
+    connection.execute("PRAGMA synchronous = OFF")
+    writer = _Writer(connection)
+    carry = ([], [], [])  # 자정을 넘긴 세션의 다음 날 이벤트
+    started = time.perf_counter()
+    for i, weight in enumerate(weights):
+        day = start + timedelta(days=i)
+        next_day = day + timedelta(days=1)
+        rows = carry
+        for _ in range(round(sessions_per_weight * weight)):
+            for bucket, new in zip(rows, generate_session(population, day, anchor_ratio, sql_ratio)):
+                bucket.extend(new)
+        today = tuple(sorted((row for row in bucket if row[0] < next_day), key=lambda row: row[0]) for bucket in rows)
+        carry = tuple([row for row in bucket if row[0] >= next_day] for bucket in rows)
+        writer.write(*today)
+        connection.commit()
+        if (i + 1) % 30 == 0 or i + 1 == days:
+            print(f"{day:%Y-%m-%d}: {writer.counts} ({time.perf_counter() - started:.0f}s)")
+    writer.write(*carry)
+    connection.commit()
+    connection.close()
+    return writer.counts
+
+
+def migrate(path):
+    # 운영 DB와 같은 상태로: README의 이관 순서대로 실행한 뒤 pageview 집계를 다시 만듭니다.
+    from migrate import add_missing_columns, MIGRATIONS
+    from rollup import compact
+
+    writer, reader = create_engines(f"sqlite:///{path}")
+    try:
+        add_missing_columns(writer)
+        for name in ("user_agents", "locations", "urls", "sketches", "bitmaps", "sessions"):
+            started = time.perf_counter()
+            MIGRATIONS[name](writer)
+            print(f"migrate {name}: {time.perf_counter() - started:.0f}s")
+        # 새로 만든 DB에는 집계가 없으므로 compact가 전체 기간을 집계합니다. (읽기도 이 DB로)
+        days = compact(sessionmaker(bind=writer), read_session_factory=sessionmaker(bind=reader))
+        print(f"rollups: {days} days")
+    finally:
+        writer.dispose()
+        reader.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="벤치마크용 analytics.db 생성")
+    parser.add_argument("path", help="만들 DB 파일 (이미 있으면 실패)")
+    parser.add_argument("--pageviews", type=int, default=1000000, help="pageview 수 (대략)")
+    parser.add_argument("--days", type=int, default=365, help="기간(일)")
+    parser.add_argument("--end", help="마지막 날짜 YYYYMMDD (기본: 오늘)")
+    parser.add_argument("--anchor-ratio", type=float, default=0.3, help="pageview당 anchor-click 비율")
+    parser.add_argument("--sql-ratio", type=float, default=0.05, help="pageview당 sql 실행 비율 (sql.weniv 세션에서 발생)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--legacy", action="store_true", help="이관(migrate.py)과 재집계를 하지 않음")
+    args = parser.parse_args()
+
+    if os.path.exists(args.path):
+        parser.error(f"{args.path}: 이미 있는 파일입니다.")
+    os.makedirs(os.path.dirname(os.path.abspath(args.path)), exist_ok=True)
+    end = datetime.strptime(args.end, "%Y%m%d") if args.end else None
+
+    writer, reader = create_engines(f"sqlite:///{args.path}")
+    Base.metadata.create_all(bind=writer)
+    writer.dispose()
+    reader.dispose()
+
+    counts = generate(args.path, args.pageviews, args.days, end, args.anchor_ratio, args.sql_ratio, args.seed)
+    print(counts)
+    if not args.legacy:
+        migrate(args.path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+import struct
+from datetime import timedelta
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert
+from models import Pageview, SessionBitmap
+
+ARRAY_LIMIT = 4096  # 이보다 많은 값을 가진 컨테이너는 비트셋(8KB)으로 저장
+_ARRAY, _BITSET = 0, 1
+
+
+def _to_bitset(values):
+    bits = np.zeros(1 << 16, dtype=bool)
+    bits[values] = True
+    return np.packbits(bits)
+
+
+def _union(a, b):
+    # 컨테이너: 정렬된 uint16 배열(값이 적을 때) 또는 packbits 비트셋
+    if a.dtype == np.uint16 and b.dtype == np.uint16:
+        merged = np.union1d(a, b).astype(np.uint16)
+        return merged if len(merged) <= ARRAY_LIMIT else _to_bitset(merged)
+    a = a if a.dtype == np.uint8 else _to_bitset(a)
+    b = b if b.dtype == np.uint8 else _to_bitset(b)
+    return a | b
+
+
+def _cardinality(container):
+    if container.dtype == np.uint16:
+        return len(container)
+    return int(np.unpackbits(container).sum())
+
+
+class RoaringBitmap:
+    """정수(32비트) 집합. 상위 16비트별 컨테이너에 하위 16비트를 배열 또는 비트셋으로 저장합니다. (roaring bitmap 방식)"""
+
+    def __init__(self, containers=None):
+        self.containers = containers or {}
+
+    @classmethod
+    def from_values(cls, values):
+        values = np.unique(np.asarray(list(values), dtype=np.uint32))
+        highs = values >> 16
+        containers = {}
+        for high in np.unique(highs):
+            low = (values[highs == high] & 0xFFFF).astype(np.uint16)
+            containers[int(high)] = low if len(low) <= ARRAY_LIMIT else _to_bitset(low)
+        return cls(containers)
+
+    def __or__(self, other):
+        containers = dict(self.containers)
+        for high, container in other.containers.items():
+            containers[high] = _union(containers[high], container) if high in containers else container
+        return RoaringBitmap(containers)
+
+    def __len__(self):
+        return sum(_cardinality(container) for container in self.containers.values())
+
+    def to_bytes(self):
+        # [컨테이너 수] + ([상위 16비트, 종류, 길이] + 값) * n
+        parts = [struct.pack("<I", len(self.containers))]
+        for high in sorted(self.containers):
+            container = self.containers[high]
+            kind = _ARRAY if container.dtype == np.uint16 else _BITSET
+            parts.append(struct.pack("<HBI", high, kind, len(container)))
+            parts.append(container.astype("<u2" if kind == _ARRAY else np.uint8).tobytes())
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data):
+        (count,), offset = struct.unpack_from("<I", data), 4
+        containers = {}
+        for _ in range(count):
+            high, kind, length = struct.unpack_from("<HBI", data, offset)
+            offset += 7
+            if kind == _ARRAY:
+                containers[high] = np.frombuffer(data, dtype="<u2", count=length, offset=offset).astype(np.uint16)
+                offset += length * 2
+            else:
+                containers[high] = np.frombuffer(data, dtype=np.uint8, count=length, offset=offset).copy()
+                offset += length
+        return cls(containers)
+
+
+def _day(timestamp):
+    return timestamp.replace(tzinfo=None, hour=0, minute=0, second=0, microsecond=0)
+
+
+class SessionBitmaps:
+    """host별, 날짜별 세션(sessions.id) 비트맵(session_bitmaps 테이블) 관리"""
+
+    def merge(self, db, bitmaps):
+        # {(host, day): RoaringBitmap}을 저장된 비트맵과 합쳐 저장합니다. (호출한 쪽에서 commit)
+        if not bitmaps:
+            return
+        hosts = {host for host, _ in bitmaps}
+        days = {day for _, day in bitmaps}
+        stored = db.execute(
+            select(SessionBitmap.host, SessionBitmap.day, SessionBitmap.bitmap)
+            .where(SessionBitmap.host.in_(hosts), SessionBitmap.day.in_(days))
+        ).all()
+        for host, day, data in stored:
+            if (host, day) in bitmaps:
+                bitmaps[(host, day)] = bitmaps[(host, day)] | RoaringBitmap.from_bytes(data)
+
+        rows = [{"host": host, "day": day, "bitmap": bitmap.to_bytes()} for (host, day), bitmap in bitmaps.items()]
+        for i in range(0, len(rows), 500):
+            stmt = insert(SessionBitmap).values(rows[i:i + 500])
+            db.execute(stmt.on_conflict_do_update(
+                index_elements=["host", "day"], set_={"bitmap": stmt.excluded.bitmap},
+            ))
+
+    def update(self, db, batch):
+        # ingest 훅: 배치의 pageview 세션을 host, 날짜별 비트맵에 추가합니다.
+        # session_dimension.assign 훅 다음에 실행되어야 합니다. (session_pk 사용)
+        values = {}
+        for row in batch:
+            if isinstance(row, Pageview) and row.host and row.session_pk is not None:
+                values.setdefault((row.host, _day(row.timestamp)), []).append(row.session_pk)
+        self.merge(db, {key: RoaringBitmap.from_values(ids) for key, ids in values.items()})
+
+    def load(self, db, hosts, start_date, end_date):
+        # 기간 내 날짜별 비트맵 (여러 host는 날짜별로 합칩니다)
+        rows = db.execute(
+            select(SessionBitmap.day, SessionBitmap.bitmap).where(
+                SessionBitmap.host.in_(hosts),
+                SessionBitmap.day >= _day(start_date),
+                SessionBitmap.day <= _day(end_date),
+            )
+        ).all()
+        days = {}
+        for day, data in rows:
+            bitmap = RoaringBitmap.from_bytes(data)
+            days[day] = days[day] | bitmap if day in days else bitmap
+        return days
+
+
+session_bitmaps = SessionBitmaps()
+
+
+def active_user_series(db, hosts, start_date, end_date):
+    """날짜별 dau, wau(최근 7일), mau(최근 30일)와 stickiness(dau / mau)를 정확히 계산합니다."""
+    days = session_bitmaps.load(db, hosts, start_date - timedelta(days=29), end_date)
+    empty = RoaringBitmap()
+    all_dates = pd.date_range(start=start_date, end=end_date, freq='D')
+
+    series = {"dau": {}, "wau": {}, "mau": {}, "stickiness": {}}
+    for date in all_dates:
+        date = date.to_pydatetime()
+        key = date.strftime("%Y%m%d")
+        week, month = empty, empty
+        for offset in range(30):
+            bitmap = days.get(date - timedelta(days=offset))
+            if bitmap is None:
+                continue
+            month = month | bitmap
+            if offset < 7:
+                week = week | bitmap
+        dau, mau = len(days.get(date, empty)), len(month)
+        series["dau"][key] = dau
+        series["wau"][key] = len(week)
+        series["mau"][key] = mau
+        series["stickiness"][key] = round(dau / mau, 4) if mau else 0.0
+    return series
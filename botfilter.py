@@ -0,0 +1,75 @@
+import os
+import re
+import threading
+from collections import Counter
+from functools import lru_cache
+from utils import lru_stats
+
+# 수집 제외 패턴 (환경 변수로 조정 가능, 쉼표로 구분, 대소문자 구분 없음)
+# "문자열"은 포함 여부, "이름=정규식"은 정규식으로 검사합니다.
+BOT_UA_PATTERNS = os.getenv("BOT_UA_PATTERNS", r"bot,yeti,headlesschrome,webpagetest=PTST/\d+(?:\.\d+)?$")
+BOT_URL_PATTERNS = os.getenv("BOT_URL_PATTERNS", "127.0.0.1,localhost")
+BOT_CACHE_SIZE = int(os.getenv("BOT_CACHE_SIZE", "16384"))  # User-Agent별 판정 캐시 크기
+
+
+def compile_patterns(patterns):
+    """패턴 목록을 이름 있는 그룹으로 묶은 정규식 하나로 컴파일합니다. ({그룹 이름: 제외 사유})"""
+    groups, reasons = [], {}
+    for i, entry in enumerate(p.strip() for p in patterns.split(",")):
+        if not entry:
+            continue
+        name, sep, regex = entry.partition("=")
+        if not sep:
+            name, regex = entry, re.escape(entry)
+        groups.append(f"(?P<p{i}>{regex})")
+        reasons[f"p{i}"] = name
+    if not groups:
+        return None, reasons
+    return re.compile("|".join(groups), re.IGNORECASE), reasons
+
+
+class BotFilter:
+    """collect 요청을 User-Agent 파싱, GeoIP 조회 전에 걸러내는 필터 (User-Agent별 판정 캐시, 제외 사유별 개수)"""
+
+    def __init__(self, ua_patterns: str = BOT_UA_PATTERNS, url_patterns: str = BOT_URL_PATTERNS, cache_size: int = BOT_CACHE_SIZE):
+        self.ua_regex, self.ua_reasons = compile_patterns(ua_patterns)
+        self.url_regex, self.url_reasons = compile_patterns(url_patterns)
+        self._ua_verdict = lru_cache(maxsize=cache_size)(self._match_user_agent)
+        self.lock = threading.Lock()
+
+        # 카운터
+        self.checked = 0
+        self.rejected = Counter()
+
+    def _match_user_agent(self, user_agent_string):
+        if self.ua_regex is None:
+            return None
+        match = self.ua_regex.search(user_agent_string)
+        return f"ua:{self.ua_reasons[match.lastgroup]}" if match else None
+
+    def check(self, user_agent_string, url=None):
+        """제외할 요청이면 사유(ua:bot, url:localhost 등), 아니면 None"""
+        if not user_agent_string:
+            reason = "ua:missing"
+        else:
+            reason = self._ua_verdict(user_agent_string)
+            if reason is None and url and self.url_regex is not None:
+                match = self.url_regex.search(url)
+                reason = f"url:{self.url_reasons[match.lastgroup]}" if match else None
+
+        with self.lock:
+            self.checked += 1
+            if reason is not None:
+                self.rejected[reason] += 1
+        return reason
+
+    def stats(self):
+        return {
+            "checked": self.checked,
+            "rejected": sum(self.rejected.values()),
+            "rejected_by_reason": dict(self.rejected),
+            "cache": lru_stats(self._ua_verdict),
+        }
+
+
+bot_filter = BotFilter()
@@ -0,0 +1,150 @@
+import asyncio
+import functools
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from utils import get_date_range
+from profiling import handler_done, profiled_call, profiling, stage
+
+# 응답 캐시 설정 (환경 변수로 조정 가능)
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(64 * 1024 * 1024)))  # 최대 메모리(바이트, JSON 크기 기준)
+CACHE_TODAY_TTL = float(os.getenv("CACHE_TODAY_TTL", "60"))  # 오늘이 포함된 조회(초)
+CACHE_HISTORY_TTL = float(os.getenv("CACHE_HISTORY_TTL", str(24 * 60 * 60)))  # 집계가 끝난 날짜(rollup watermark 이전)에 끝나는 조회(초)
+
+_MISSING = object()
+
+
+class ResponseCache:
+    """엔드포인트 + 파라미터를 키로 하는 LRU 응답 캐시 (메모리 크기 제한, 항목별 TTL)"""
+
+    def __init__(self, max_bytes: int = CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> (만료 시각, 크기, 값)
+        self.bytes = 0
+        self.lock = threading.Lock()
+        self.history_end = None  # 이 날짜 이전은 집계가 끝나 더 바뀌지 않음 (rollup watermark, 모르면 None)
+
+        # 카운터
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return _MISSING
+            expires, size, value = entry
+            if expires < time.monotonic():
+                del self.entries[key]
+                self.bytes -= size
+                self.expirations += 1
+                self.misses += 1
+                return _MISSING
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl: float):
+        size = len(json.dumps(value, default=str))
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old[1]
+            self.entries[key] = (time.monotonic() + ttl, size, value)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, evicted_size, _) = self.entries.popitem(last=False)
+                self.bytes -= evicted_size
+                self.evictions += 1
+
+    def set_history_end(self, watermark):
+        # rollup 집계기가 watermark를 옮길 때마다 호출합니다.
+        self.history_end = watermark
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "entries": len(self.entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+response_cache = ResponseCache()
+
+
+def cache_key(endpoint, params):
+    # 값이 없는 파라미터는 빼고, 이름순으로 정렬해서 같은 조회는 같은 키가 되도록 합니다.
+    normalized = []
+    for name, value in sorted(params.items()):
+        if value is None or value == "" or not isinstance(value, (str, int, float, bool)):
+            continue
+        if name in ("host", "source_host"):
+            value = value.lower()
+        normalized.append((name, value))
+    return (endpoint, tuple(normalized))
+
+
+def cache_ttl(params):
+    # 집계가 끝난 날짜(rollup watermark 이전)에 끝나는 기간은 더 이상 바뀌지 않으므로 오래 보관합니다.
+    # 어제라도 집계 전이면 배치 저장 대기, 늦게 도착한 이벤트로 바뀔 수 있으므로 짧게 보관합니다.
+    history_end = response_cache.history_end
+    if history_end is None:
+        return CACHE_TODAY_TTL
+    try:
+        _, end_date = get_date_range(params["date_start"], params["date_end"], params.get("interval", "daily"))
+    except (KeyError, TypeError, ValueError):
+        return CACHE_TODAY_TTL
+    if end_date < history_end:
+        return CACHE_HISTORY_TTL
+    return CACHE_TODAY_TTL
+
+
+def cached(func):
+    """analytics GET 핸들러 응답 캐시 데코레이터 (동기/비동기 핸들러 모두 지원)
+    ?profile=1 요청은 캐시를 읽지 않고 핸들러를 실행합니다."""
+    endpoint = func.__name__
+
+    if asyncio.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def wrapper(**kwargs):
+            key = cache_key(endpoint, kwargs)
+            value = _MISSING if profiling() else response_cache.get(key)
+            if value is _MISSING:
+                value = await func(**kwargs)
+                with stage("cache_set"):
+                    response_cache.set(key, value, cache_ttl(kwargs))
+                handler_done("miss")
+            else:
+                handler_done("hit")
+            return value
+    else:
+        @functools.wraps(func)
+        def wrapper(**kwargs):
+            key = cache_key(endpoint, kwargs)
+            value = _MISSING if profiling() else response_cache.get(key)
+            if value is _MISSING:
+                value = profiled_call(func, **kwargs)
+                with stage("cache_set"):
+                    response_cache.set(key, value, cache_ttl(kwargs))
+                handler_done("miss")
+            else:
+                handler_done("hit")
+            return value
+    return wrapper
@@ -0,0 +1,251 @@
+"""분리된 달의 Parquet 보관
+
+partition.py로 분리한 월 파일의 pageviews, anchor_clicks를 집계에 필요한 컬럼만 Parquet로 내보냅니다.
+url, host, User-Agent(os, browser), 지역 컬럼은 dictionary 인코딩(Categorical)으로 저장합니다.
+load_pageviews, load_anchor_click_counts는 Parquet가 있는 달을 월 파일 대신 polars로 읽습니다. (lazy scan + 조건 pushdown)
+
+    python coldstore.py export YYYYMM    # partitions/analytics-YYYYMM.db -> parquet/YYYYMM/*.parquet
+    python coldstore.py export --all     # Parquet가 없는 분리된 달 모두
+"""
+import argparse
+import operator
+import os
+import re
+from datetime import date, datetime
+import pandas as pd
+import polars as pl
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.elements import BinaryExpression, BindParameter, BooleanClauseList, Grouping
+from sqlalchemy.sql.schema import Column
+from models import Base, Pageview, AnchorClick, UserAgent, EventPartition
+from columnar import fetch_frame, raw_datetime
+from partition import months_between, partition_engine
+from sessions import LegacySession, legacy_session_join
+from storage import writer_engine, WriteSession
+from useragent import parse_user_agent
+
+PARQUET_DIR = os.getenv("PARQUET_DIR", "./parquet")  # Parquet 보관 위치
+PARQUET_COMPRESSION = os.getenv("PARQUET_COMPRESSION", "zstd")
+PARQUET_ROW_GROUP_SIZE = int(os.getenv("PARQUET_ROW_GROUP_SIZE", "100000"))  # row group 통계로 기간 밖 행을 건너뜁니다.
+
+# 테이블별 dictionary 인코딩 컬럼
+CATEGORICAL_COLUMNS = {
+    "pageviews": ["url", "host", "path", "os", "browser", "country", "city"],
+    "anchor_clicks": ["source_url", "source_host", "source_path", "target_url", "os", "browser"],
+}
+
+_COMPARISONS = {
+    operators.eq: operator.eq, operators.ne: operator.ne,
+    operators.lt: operator.lt, operators.le: operator.le,
+    operators.gt: operator.gt, operators.ge: operator.ge,
+}
+
+
+def _like(column, pattern):
+    # SQLite LIKE: %, _ 와일드카드, 대소문자 구분 없음
+    regex = "".join(".*" if c == "%" else "." if c == "_" else re.escape(c) for c in pattern)
+    return column.str.contains(f"(?is)^{regex}$")
+
+
+def _value(value):
+    # SQLite에는 시간대 없이 저장되므로 naive datetime으로 비교합니다.
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=None)
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day)
+    return value
+
+
+def to_polars(clause, table):
+    """SQLAlchemy 조건(url_filters, 기간 조건 등)을 polars 식으로 바꿉니다.
+    바꿀 수 없는 조건이면 NotImplementedError (호출한 쪽은 월 파일을 SQL로 읽습니다)"""
+    if isinstance(clause, Grouping):
+        return to_polars(clause.element, table)
+    if isinstance(clause, BooleanClauseList):
+        parts = [to_polars(part, table) for part in clause.clauses]
+        combine = operator.and_ if clause.operator is operators.and_ else operator.or_
+        result = parts[0]
+        for part in parts[1:]:
+            result = combine(result, part)
+        return result
+    if isinstance(clause, BinaryExpression) and isinstance(clause.left, Column) and clause.left.table.name == table \
+            and isinstance(clause.right, BindParameter):
+        value = clause.right.value
+        column = pl.col(clause.left.name)
+        if clause.operator in _COMPARISONS:
+            if isinstance(value, str):
+                column = column.cast(pl.String)
+            return _COMPARISONS[clause.operator](column, _value(value))
+        if clause.operator is operators.like_op:
+            return _like(column.cast(pl.String), value)
+        if clause.operator is operators.not_like_op:
+            return ~_like(column.cast(pl.String), value)
+        if clause.operator is operators.in_op:
+            values = [_value(v) for v in value]
+            if values and all(isinstance(v, str) for v in values):
+                column = column.cast(pl.String)
+            return column.is_in(values)
+    raise NotImplementedError(f"Parquet 조건으로 바꿀 수 없습니다: {clause}")
+
+
+def parquet_path(directory, table):
+    return os.path.join(directory, f"{table}.parquet")
+
+
+def parquet_partitions(db, start_date, end_date):
+    # 조회 기간과 겹치고 Parquet로 내보낸 분리된 달 {YYYYMM: 디렉터리}
+    rows = db.query(EventPartition.month, EventPartition.parquet).filter(
+        EventPartition.status == "detached",
+        EventPartition.parquet.is_not(None),
+        EventPartition.month.in_(months_between(start_date, end_date)),
+    ).all()
+    return dict(rows)
+
+
+def cold_reader(db, table, filters, start_date, end_date, build):
+    """fetch_partitioned의 cold 인자: Parquet가 있는 달은 scan_parquet에 조건을 걸고 build(LazyFrame)로 읽습니다.
+    조건을 polars로 바꿀 수 없으면 None (모든 달을 월 파일로 읽습니다)"""
+    directories = parquet_partitions(db, start_date, end_date)
+    if not directories:
+        return None
+    try:
+        predicates = [to_polars(clause, table) for clause in filters]
+    except NotImplementedError:
+        return None
+
+    def read(month):
+        if month not in directories:
+            return None
+        frame = pl.scan_parquet(parquet_path(directories[month], table))
+        if predicates:
+            frame = frame.filter(*predicates)
+        return build(frame)
+    return read
+
+
+def _session_columns(model):
+    # session_key(model)과 같은 값을 정수(session_pk)와 문자열(session_id, 등록되지 않은 세션) 컬럼으로 나눕니다.
+    session_pk = func.coalesce(model.session_pk, LegacySession.id)
+    return session_pk.label("session_pk"), case((session_pk.is_(None), model.session_id)).label("session_id")
+
+
+def session_series(frame):
+    """Parquet의 session_pk, session_id를 session_key와 같은 값의 pandas 컬럼으로 합칩니다."""
+    if frame["session_id"].null_count() == frame.height:
+        return frame["session_pk"].to_pandas()
+    return pd.Series(
+        [pk if pk is not None else s for pk, s in zip(frame["session_pk"].to_list(), frame["session_id"].to_list())],
+        dtype=object,
+    )
+
+
+def _resolve_legacy(frame):
+    # 이관 전 행의 User-Agent 문자열과 지역 문자열을 os, browser, country, city로 채웁니다.
+    legacy = frame.filter(pl.col("user_agent").is_not_null())["user_agent"].unique().to_list()
+    if legacy:
+        parsed = {ua: parse_user_agent(ua) for ua in legacy}
+        frame = frame.with_columns(
+            pl.col("os").fill_null(pl.col("user_agent").replace_strict({ua: p.os.family for ua, p in parsed.items()}, default=None)),
+            pl.col("browser").fill_null(pl.col("user_agent").replace_strict({ua: p.browser.family for ua, p in parsed.items()}, default=None)),
+        )
+    if "location" in frame.columns:
+        parts = pl.col("location").str.split(", ")
+        frame = frame.with_columns(
+            pl.when(pl.col("location").is_not_null()).then(parts.list.get(1, null_on_oob=True)).otherwise(pl.col("country")).alias("country"),
+            pl.when(pl.col("location").is_not_null()).then(parts.list.get(0, null_on_oob=True)).otherwise(pl.col("city")).alias("city"),
+        ).drop("location")
+    return frame.drop("user_agent")
+
+
+def _export_statements():
+    legacy_user_agent = lambda model: case((model.user_agent_id.is_(None), model.user_agent)).label("user_agent")
+    pageviews = (
+        select(
+            raw_datetime(Pageview.timestamp), Pageview.id, Pageview.url, Pageview.host, Pageview.path,
+            *_session_columns(Pageview), Pageview.is_mobile, Pageview.is_pc,
+            UserAgent.os_family.label("os"), UserAgent.browser_family.label("browser"), legacy_user_agent(Pageview),
+            Pageview.country, Pageview.city, case((Pageview.country.is_(None), Pageview.user_location)).label("location"),
+        )
+        .outerjoin(UserAgent, Pageview.user_agent_id == UserAgent.id)
+        .outerjoin(*legacy_session_join(Pageview))
+    )
+    anchor_clicks = (
+        select(
+            raw_datetime(AnchorClick.timestamp), AnchorClick.id,
+            AnchorClick.source_url, AnchorClick.source_host, AnchorClick.source_path, AnchorClick.target_url,
+            *_session_columns(AnchorClick), AnchorClick.is_mobile, AnchorClick.is_pc,
+            UserAgent.os_family.label("os"), UserAgent.browser_family.label("browser"), legacy_user_agent(AnchorClick),
+        )
+        .outerjoin(UserAgent, AnchorClick.user_agent_id == UserAgent.id)
+        .outerjoin(*legacy_session_join(AnchorClick))
+    )
+    return {"pageviews": pageviews, "anchor_clicks": anchor_clicks}
+
+
+def export_month(month, engine=writer_engine):
+    """분리된 달의 월 파일을 Parquet로 내보내고 event_partitions에 기록합니다. 내보낸 행 수를 반환합니다."""
+    db = WriteSession(bind=engine)
+    try:
+        partition = db.get(EventPartition, month)
+        if partition is None or partition.status != "detached":
+            raise ValueError(f"{month}: 분리된 달이 아닙니다. (partition.py detach 먼저 실행)")
+        source = sessionmaker(bind=partition_engine(partition.path))()
+        directory = os.path.join(PARQUET_DIR, month)
+        os.makedirs(directory, exist_ok=True)
+
+        rows = 0
+        try:
+            for table, stmt in _export_statements().items():
+                frame = fetch_frame(source, stmt, datetime_columns=["timestamp"], engine="polars")
+                frame = _resolve_legacy(frame.with_columns(
+                    pl.col(["os", "browser", "user_agent"]).cast(pl.String),
+                    *[pl.col(name).cast(pl.String) for name in ("country", "city", "location") if name in frame.columns],
+                ))
+                # 기간 조건이 row group 통계로 걸러지도록 시간순으로 저장합니다.
+                frame = frame.sort("timestamp", "id").drop("id").with_columns(
+                    pl.col("timestamp").cast(pl.Datetime("us")),
+                    pl.col("session_pk").cast(pl.Int64),
+                    pl.col("session_id").cast(pl.String),
+                    pl.col(["is_mobile", "is_pc"]).cast(pl.Int64),
+                    pl.col(CATEGORICAL_COLUMNS[table]).cast(pl.String).cast(pl.Categorical),
+                )
+                path = parquet_path(directory, table)
+                frame.write_parquet(
+                    path + ".tmp", compression=PARQUET_COMPRESSION, statistics=True, row_group_size=PARQUET_ROW_GROUP_SIZE,
+                )
+                os.replace(path + ".tmp", path)
+                rows += frame.height
+        finally:
+            source.close()
+
+        partition.parquet = directory
+        db.commit()
+        return rows
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="분리된 달의 Parquet 보관")
+    parser.add_argument("command", choices=["export"])
+    parser.add_argument("month", nargs="?", help="YYYYMM")
+    parser.add_argument("--all", action="store_true", help="Parquet가 없는 분리된 달 모두")
+    args = parser.parse_args()
+
+    from migrate import add_missing_columns  # migrate -> hll -> analytics -> coldstore 순환 import 방지
+
+    Base.metadata.create_all(bind=writer_engine)
+    add_missing_columns(writer_engine)
+
+    if args.all:
+        db = WriteSession()
+        months = [row[0] for row in db.query(EventPartition.month).filter(
+            EventPartition.status == "detached", EventPartition.parquet.is_(None),
+        ).order_by(EventPartition.month)]
+        db.close()
+    else:
+        months = [args.month]
+    for month in months:
+        print(month, export_month(month), "rows")
@@ -0,0 +1,57 @@
+import os
+import pandas as pd
+import polars as pl
+from sqlalchemy import String, type_coerce
+from profiling import stage
+
+COLUMNAR_BATCH_SIZE = int(os.getenv("COLUMNAR_BATCH_SIZE", "10000"))  # 커서에서 한 번에 읽을 행 수 (행 객체는 이만큼만 메모리에 유지)
+
+
+def raw_datetime(column):
+    # DateTime 컬럼을 행마다 datetime 객체로 바꾸지 않고 문자열 그대로 읽습니다. (frame에서 한 번에 변환)
+    return type_coerce(column, String).label(column.key)
+
+
+def fetch_frame(db, stmt, datetime_columns=(), engine: str = "pandas", batch_size: int = COLUMNAR_BATCH_SIZE):
+    """select 결과를 ORM 객체나 행별 dict 없이 컬럼 단위로 DataFrame(pandas/polars)에 담습니다.
+    datetime_columns는 raw_datetime으로 읽은 컬럼 이름 목록입니다."""
+    # 단계: db(SQL 실행), fetch(커서에서 행 읽기), frame(DataFrame 구성)
+    # 커서에서 읽은 행 묶음마다 바로 DataFrame으로 바꾸고 날짜 문자열도 변환해서, 원본 행과 문자열이 쌓이지 않게 합니다.
+    chunks = []
+    with stage("fetch"):
+        result = db.execute(stmt.execution_options(yield_per=batch_size))
+        columns = list(result.keys())
+
+        for rows in result.partitions():
+            with stage("frame"):
+                chunks.append(_chunk(rows, columns, datetime_columns, engine))
+            del rows
+
+    with stage("frame"):
+        if engine == "polars":
+            # 묶음을 복사하지 않고 이어 붙입니다.
+            return pl.concat(chunks, how="vertical_relaxed", rechunk=False) if chunks else pl.DataFrame(schema=columns)
+        if not chunks:
+            return pd.DataFrame(columns=columns)
+        if len(chunks) == 1:
+            return chunks[0]
+        # 문자열 컬럼은 객체 참조만 복사되므로 문자열 자체는 한 벌만 유지됩니다.
+        frame = pd.concat(chunks, ignore_index=True, copy=False)
+        chunks.clear()
+        return frame
+
+
+def _chunk(rows, columns, datetime_columns, engine):
+    # 행 묶음 -> DataFrame (행을 컬럼별 튜플로 옮겨 담지 않고 바로 구성)
+    if engine == "polars":
+        frame = pl.DataFrame(rows, schema=columns, orient="row", infer_schema_length=None, strict=False)
+        if datetime_columns:
+            frame = frame.with_columns([
+                pl.col(name).cast(pl.String).str.to_datetime(time_unit="us", strict=False) for name in datetime_columns
+            ])
+        return frame
+
+    frame = pd.DataFrame.from_records(rows, columns=columns, coerce_float=False)
+    for name in datetime_columns:
+        frame[name] = pd.to_datetime(frame[name], format="ISO8601")
+    return frame
@@ -0,0 +1,145 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from utils import logger
+from metrics import aggregation_seconds, current_route
+from profiling import add_stage, profiled_call, profiling
+
+# 대시보드 집계 실행 설정 (환경 변수로 조정 가능)
+AGGREGATION_WORKERS = int(os.getenv("AGGREGATION_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))  # 집계 프로세스 수
+AGGREGATION_QUEUE = int(os.getenv("AGGREGATION_QUEUE", "32"))  # 실행 중 + 대기 중인 최대 집계 수 (넘으면 순서대로 기다림)
+AGGREGATION_MIN_ROWS = int(os.getenv("AGGREGATION_MIN_ROWS", "20000"))  # 이보다 작은 frame은 전송 비용이 더 크므로 스레드에서 집계
+
+STAGES = ["load", "queue", "transfer", "aggregate"]
+
+
+def _timed(func, args, kwargs):
+    # 집계 프로세스에서 실행: (결과, 집계 시간)
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+def _warm_up():
+    # 집계 함수 모듈(pandas, analytics)을 미리 import 해둡니다.
+    import analytics  # noqa: F401
+    return os.getpid()
+
+
+class AggregationPool:
+    """DB 읽기(load)는 스레드에서, pandas 집계(aggregate)는 프로세스 풀에서 실행해 이벤트 루프를 막지 않습니다.
+    단계별(load, queue, transfer, aggregate) 소요 시간을 집계합니다."""
+
+    def __init__(self, workers: int = AGGREGATION_WORKERS, max_pending: int = AGGREGATION_QUEUE, min_rows: int = AGGREGATION_MIN_ROWS):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.min_rows = min_rows
+        self.executor = None
+        self._semaphore = None
+        self.lock = threading.Lock()
+
+        # 카운터
+        self.tasks = 0
+        self.inline = 0
+        self.pending = 0
+        self.failures = 0
+        self.stage_count = {stage: 0 for stage in STAGES}
+        self.stage_total = {stage: 0.0 for stage in STAGES}
+        self.stage_max = {stage: 0.0 for stage in STAGES}
+
+    def start(self):
+        # spawn: ingest, SQL 워커 스레드가 있는 프로세스를 fork하지 않습니다.
+        if self.executor is None and self.workers > 0:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+            for _ in range(self.workers):
+                self.executor.submit(_warm_up)
+
+    def stop(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    def record(self, stage, seconds):
+        with self.lock:
+            self.stage_count[stage] += 1
+            self.stage_total[stage] += seconds
+            self.stage_max[stage] = max(self.stage_max[stage], seconds)
+        aggregation_seconds.observe(seconds, current_route(), stage)
+        if stage != "load":
+            # load 안의 단계(db, fetch, frame 등)는 조회 함수에서 따로 기록합니다.
+            add_stage(stage, seconds)
+
+    @contextmanager
+    def measure(self, stage):
+        # 풀 밖에서 실행하는 집계(핸들러 안의 pandas 처리 등)의 시간 기록
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - started)
+
+    async def load(self, func, *args, **kwargs):
+        """DB 읽기를 스레드에서 실행합니다."""
+        started = time.perf_counter()
+        try:
+            return await asyncio.to_thread(profiled_call, func, *args, **kwargs)
+        finally:
+            self.record("load", time.perf_counter() - started)
+
+    async def aggregate(self, func, frame, *args, **kwargs):
+        """func(frame, *args, **kwargs)를 프로세스 풀에서 실행합니다. (func는 모듈 최상위 함수)
+        작은 frame이나 프로세스 풀이 없으면 스레드에서 실행합니다. (?profile=1 요청도 프로파일링을 위해 스레드에서 실행)"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_pending)
+        self.tasks += 1
+        self.pending += 1
+        started = time.perf_counter()
+        try:
+            async with self._semaphore:
+                queued = time.perf_counter()
+                self.record("queue", queued - started)
+                if self.executor is None or len(frame) < self.min_rows or profiling():
+                    self.inline += 1
+                    result, seconds = await asyncio.to_thread(profiled_call, _timed, func, (frame, *args), kwargs)
+                else:
+                    try:
+                        future = self.executor.submit(_timed, func, (frame, *args), kwargs)
+                        result, seconds = await asyncio.wrap_future(future)
+                    except BrokenProcessPool as e:
+                        # 집계 프로세스가 비정상 종료되면 풀을 다시 만들고 이번 요청은 스레드에서 집계합니다.
+                        logger.log(logging.DEBUG, f"Error: {e}")
+                        self.failures += 1
+                        self.stop()
+                        self.start()
+                        result, seconds = await asyncio.to_thread(_timed, func, (frame, *args), kwargs)
+                self.record("aggregate", seconds)
+                self.record("transfer", max(time.perf_counter() - queued - seconds, 0.0))
+                return result
+        finally:
+            self.pending -= 1
+
+    def stats(self):
+        return {
+            "workers": self.workers if self.executor is not None else 0,
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "tasks": self.tasks,
+            "inline": self.inline,
+            "failures": self.failures,
+            "stages": {
+                stage: {
+                    "count": self.stage_count[stage],
+                    "avg_ms": round(self.stage_total[stage] / self.stage_count[stage] * 1000, 2) if self.stage_count[stage] else 0,
+                    "max_ms": round(self.stage_max[stage] * 1000, 2),
+                } for stage in STAGES
+            },
+        }
+
+
+aggregation_pool = AggregationPool()
@@ -0,0 +1,165 @@
+import hashlib
+import math
+import os
+import zlib
+from datetime import timedelta
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert
+from models import Pageview, SessionSketch
+from analytics import bucket_labels, format_num
+
+# HyperLogLog 정밀도 (레지스터 2^p개, 상대 표준 오차 1.04/sqrt(2^p))
+HLL_PRECISION = int(os.getenv("HLL_PRECISION", "12"))
+
+
+def _hash64(value):
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+
+class HyperLogLog:
+    """session_id 고유 개수 추정용 HyperLogLog 스케치"""
+
+    def __init__(self, precision: int = HLL_PRECISION, registers=None):
+        self.precision = precision
+        self.m = 1 << precision
+        self.registers = bytearray(self.m) if registers is None else bytearray(registers)
+
+    def add(self, value):
+        h = _hash64(value)
+        index = h >> (64 - self.precision)
+        rest = h & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def update(self, values):
+        for value in values:
+            self.add(value)
+        return self
+
+    def merge(self, other):
+        merged = np.maximum(np.frombuffer(self.registers, dtype=np.uint8), np.frombuffer(other.registers, dtype=np.uint8))
+        self.registers = bytearray(merged.tobytes())
+        return self
+
+    def count(self):
+        registers = np.frombuffer(self.registers, dtype=np.uint8)
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        estimate = alpha * self.m * self.m / np.sum(np.ldexp(1.0, -registers.astype(np.int32)))
+        zeros = int(np.count_nonzero(registers == 0))
+        if estimate <= 2.5 * self.m and zeros:
+            # 작은 값 보정 (linear counting)
+            estimate = self.m * math.log(self.m / zeros)
+        return int(round(estimate))
+
+    @property
+    def error_bound(self):
+        return round(1.04 / math.sqrt(self.m), 4)
+
+    def to_bytes(self):
+        return zlib.compress(bytes(self.registers), 1)
+
+    @classmethod
+    def from_bytes(cls, data, precision: int = HLL_PRECISION):
+        return cls(precision, zlib.decompress(data))
+
+
+def _day(timestamp):
+    return timestamp.replace(tzinfo=None, hour=0, minute=0, second=0, microsecond=0)
+
+
+class SessionSketches:
+    """host별, 날짜별 session_id HyperLogLog 스케치(session_sketches 테이블) 관리"""
+
+    def __init__(self, precision: int = HLL_PRECISION):
+        self.precision = precision
+
+    def merge(self, db, sketches):
+        # {(host, day): HyperLogLog}를 저장된 스케치와 합쳐 저장합니다. (호출한 쪽에서 commit)
+        if not sketches:
+            return
+        hosts = {host for host, _ in sketches}
+        days = {day for _, day in sketches}
+        stored = db.execute(
+            select(SessionSketch.host, SessionSketch.day, SessionSketch.registers)
+            .where(SessionSketch.host.in_(hosts), SessionSketch.day.in_(days))
+        ).all()
+        for host, day, registers in stored:
+            if (host, day) in sketches:
+                sketches[(host, day)].merge(HyperLogLog.from_bytes(registers, self.precision))
+
+        rows = [{"host": host, "day": day, "registers": sketch.to_bytes()} for (host, day), sketch in sketches.items()]
+        for i in range(0, len(rows), 500):
+            stmt = insert(SessionSketch).values(rows[i:i + 500])
+            db.execute(stmt.on_conflict_do_update(
+                index_elements=["host", "day"], set_={"registers": stmt.excluded.registers},
+            ))
+
+    def update(self, db, batch):
+        # ingest 훅: 배치의 pageview 세션을 host, 날짜별 스케치에 추가합니다.
+        # session_id 문자열을 사용하므로 session_dimension.assign 훅보다 먼저 실행되어야 합니다.
+        sketches = {}
+        for row in batch:
+            if isinstance(row, Pageview) and row.host and row.session_id:
+                key = (row.host, _day(row.timestamp))
+                if key not in sketches:
+                    sketches[key] = HyperLogLog(self.precision)
+                sketches[key].add(row.session_id)
+        self.merge(db, sketches)
+
+    def load(self, db, hosts, start_date, end_date):
+        # 기간 내 날짜별 스케치 (여러 host는 날짜별로 합칩니다)
+        rows = db.execute(
+            select(SessionSketch.day, SessionSketch.registers).where(
+                SessionSketch.host.in_(hosts),
+                SessionSketch.day >= _day(start_date),
+                SessionSketch.day <= _day(end_date),
+            )
+        ).all()
+        days = {}
+        for day, registers in rows:
+            sketch = HyperLogLog.from_bytes(registers, self.precision)
+            days[day] = days[day].merge(sketch) if day in days else sketch
+        return days
+
+    def union(self, days, start_date, end_date):
+        sketch = HyperLogLog(self.precision)
+        for day, day_sketch in days.items():
+            if _day(start_date) <= day <= _day(end_date):
+                sketch.merge(day_sketch)
+        return sketch
+
+
+session_sketches = SessionSketches()
+
+
+def approx_usercount(db, hosts, start_date, end_date, interval):
+    """날짜별 스케치를 합쳐서 구간별 접속자수(세션 수)를 추정합니다."""
+    days = session_sketches.load(db, hosts, start_date, end_date)
+    all_dates = pd.date_range(start=start_date, end=end_date, freq='D')
+    labels = bucket_labels(all_dates, interval)
+
+    buckets = {label: HyperLogLog(session_sketches.precision) for label in labels.unique()}
+    for date, label in zip(all_dates, labels):
+        sketch = days.get(date.to_pydatetime())
+        if sketch is not None:
+            buckets[label].merge(sketch)
+    num = pd.Series({label: sketch.count() for label, sketch in buckets.items()}, dtype=int)
+
+    total = session_sketches.union(days, start_date, end_date)
+    return {
+        "total_pageviews": total.count(),
+        "num": format_num(num),
+        "error_bound": total.error_bound,
+    }
+
+
+def approx_active_users(db, hosts, today):
+    """오늘 기준 dau, wau(7일), mau(31일)를 스케치로 추정합니다."""
+    days = session_sketches.load(db, hosts, today - timedelta(days=30), today)
+    dau = session_sketches.union(days, today, today)
+    wau = session_sketches.union(days, today - timedelta(days=6), today)
+    mau = session_sketches.union(days, today - timedelta(days=30), today)
+    return dau.count(), wau.count(), mau.count(), mau.error_bound
@@ -0,0 +1,192 @@
+import asyncio
+import logging
+import os
+import time
+from sqlalchemy import inspect
+from sqlalchemy.exc import OperationalError, TimeoutError
+from utils import logger
+from metrics import db_commit_seconds
+
+# 배치 저장 설정 (환경 변수로 조정 가능)
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "500"))  # 한 번에 저장할 최대 이벤트 수
+INGEST_FLUSH_INTERVAL = float(os.getenv("INGEST_FLUSH_INTERVAL", "1.0"))  # 최대 대기 시간(초)
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "10000"))  # 큐 최대 길이
+INGEST_RETRIES = int(os.getenv("INGEST_RETRIES", "3"))  # 일시적인 오류(잠금, 디스크 I/O)로 실패한 배치를 다시 저장하는 횟수
+INGEST_RETRY_DELAY = float(os.getenv("INGEST_RETRY_DELAY", "0.5"))  # 첫 재시도 전 대기 시간(초), 재시도마다 2배
+
+# 다시 시도하면 성공할 수 있는 오류 (그 밖의 오류는 배치 안의 특정 이벤트 때문으로 보고 배치를 나눕니다)
+_TRANSIENT_ERRORS = (OperationalError, TimeoutError)
+
+_STOP = object()
+
+
+def _column_values(row):
+    # 값이 지정된 컬럼만 (지정하지 않은 컬럼은 저장 시 기본값 사용)
+    return {attr.key: row.__dict__[attr.key] for attr in inspect(row).mapper.column_attrs if attr.key in row.__dict__}
+
+
+def _restore(row, values):
+    for attr in inspect(row).mapper.column_attrs:
+        if attr.key in values:
+            setattr(row, attr.key, values[attr.key])
+        else:
+            row.__dict__.pop(attr.key, None)
+
+
+class IngestBuffer:
+    """collect 요청으로 들어온 이벤트(Pageview, AnchorClick, WenivSql)를 큐에 모았다가
+    개수 또는 시간 기준을 넘으면 하나의 트랜잭션으로 한꺼번에 저장합니다."""
+
+    def __init__(
+            self,
+            session_factory,
+            batch_size: int = INGEST_BATCH_SIZE,
+            flush_interval: float = INGEST_FLUSH_INTERVAL,
+            queue_size: int = INGEST_QUEUE_SIZE,
+            retries: int = INGEST_RETRIES,
+            retry_delay: float = INGEST_RETRY_DELAY,
+    ):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue_size = queue_size
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.queue = None
+        self._task = None
+        self.hooks = []  # 저장 직전에 배치를 가공하는 함수 목록: hook(db, batch)
+        self.rollback_hooks = []  # 저장이 실패했을 때 호출할 함수 목록 (실패한 트랜잭션에서 만든 id 캐시 비우기 등)
+
+        # 카운터
+        self.enqueued_events = 0
+        self.enqueued_by_table = {}
+        self.flushed_events = 0
+        self.failed_events = 0
+        self.flush_count = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self.total_flush_ms = 0.0
+
+    async def start(self):
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        # 남아 있는 이벤트를 모두 저장한 뒤 종료
+        if self._task is None:
+            return
+        await self.queue.put(_STOP)
+        await self._task
+        self._task = None
+
+    async def put(self, row):
+        # 큐가 가득 찬 경우 자리가 날 때까지 대기 (backpressure)
+        await self.queue.put(row)
+        self.enqueued_events += 1
+        table = row.__tablename__
+        self.enqueued_by_table[table] = self.enqueued_by_table.get(table, 0) + 1
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self.queue.get()
+            if item is _STOP:
+                break
+
+            batch = [item]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            await self._flush(batch)
+
+        # 종료 신호 이후에 들어온 이벤트까지 저장
+        rest = []
+        while not self.queue.empty():
+            item = self.queue.get_nowait()
+            if item is not _STOP:
+                rest.append(item)
+        if rest:
+            await self._flush(rest)
+
+    async def _flush(self, batch):
+        started = time.perf_counter()
+        written, dropped, error = await asyncio.to_thread(self._write_all, batch)
+        self.flushed_events += written
+        self.failed_events += dropped
+        if dropped:
+            logger.log(logging.WARNING, f"Error: 이벤트 {len(batch)}개 중 {dropped}개를 저장하지 못해 버렸습니다: {error}")
+        elapsed = (time.perf_counter() - started) * 1000
+
+        self.flush_count += 1
+        self.last_flush_ms = elapsed
+        self.max_flush_ms = max(self.max_flush_ms, elapsed)
+        self.total_flush_ms += elapsed
+
+    def _write_all(self, batch):
+        # 잠금, 디스크 I/O 같은 일시적인 오류면 배치 전체를 retries번까지 간격을 늘려 가며 다시 저장하고, 그래도 실패하면 버립니다.
+        # 그 밖의 오류(IntegrityError 등)는 특정 이벤트 때문이므로 배치를 반으로 나눠 저장할 수 없는 이벤트만 버립니다.
+        # 반환값: (저장한 이벤트 수, 버린 이벤트 수, 마지막 오류)
+        for attempt in range(self.retries + 1):
+            try:
+                self._write(batch)
+                return len(batch), 0, None
+            except _TRANSIENT_ERRORS as e:
+                if attempt == self.retries:
+                    return 0, len(batch), e
+                logger.log(logging.DEBUG, f"Error: {e}")
+                time.sleep(self.retry_delay * 2 ** attempt)
+            except Exception as e:
+                if len(batch) == 1:
+                    return 0, 1, e
+                logger.log(logging.DEBUG, f"Error: {e}")
+                break
+        middle = len(batch) // 2
+        first, second = self._write_all(batch[:middle]), self._write_all(batch[middle:])
+        return first[0] + second[0], first[1] + second[1], second[2] or first[2]
+
+    def _write(self, batch):
+        # 실패하면 훅과 flush가 바꾼 컬럼 값을 되돌려서 다시 저장할 수 있게 합니다.
+        snapshots = [(row, _column_values(row)) for row in batch]
+        db = self.session_factory()
+        try:
+            for hook in self.hooks:
+                hook(db, batch)
+            db.add_all(batch)
+            with db_commit_seconds.time():
+                db.commit()
+        except Exception:
+            db.rollback()
+            db.expunge_all()
+            for row, values in snapshots:
+                _restore(row, values)
+            for hook in self.rollback_hooks:
+                hook()
+            raise
+        finally:
+            db.close()
+
+    def stats(self):
+        return {
+            "queue_depth": self.queue.qsize() if self.queue else 0,
+            "queue_size": self.queue_size,
+            "enqueued_events": self.enqueued_events,
+            "enqueued_by_table": dict(self.enqueued_by_table),
+            "flushed_events": self.flushed_events,
+            "failed_events": self.failed_events,
+            "flush_count": self.flush_count,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+            "max_flush_ms": round(self.max_flush_ms, 2),
+            "avg_flush_ms": round(self.total_flush_ms / self.flush_count, 2) if self.flush_count else 0,
+        }
@@ -171,4 +171,12 @@ location_dict = {
     '경남': gn,
     '제주': jeju,
     'Unknown': unknown
-}
\ No newline at end of file
+}
+# 도시 -> 지역 역색인 (find_location 선형 탐색 대체)
+region_by_city = {}
+for region, cities in location_dict.items():
+    for city in cities:
+        region_by_city.setdefault(city, region)
+
+def find_region(city):
+    return region_by_city.get(city, 'Unknown')
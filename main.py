@@ -1,25 +1,38 @@
-from fastapi import FastAPI, Request, Depends, Header # , Cookie, HTTPException
+from fastapi import FastAPI, Request, Depends, Header, HTTPException # , Cookie
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
-from models import Pageview, AnchorClick, WenivSql, PageviewData, AnchorClickData, WenivSqlData, Base
-from sqlalchemy import create_engine, func, text
-from sqlalchemy.orm import sessionmaker
-from user_agents import parse
+from fastapi.responses import StreamingResponse, PlainTextResponse
+from models import Pageview, AnchorClick, WenivSql, PageviewData, AnchorClickData, WenivSqlData, BatchData, Base
+from sqlalchemy import func
 from datetime import datetime, timedelta
 from typing import Optional
-from utils import generate_session_id, get_date_range, KST, reader, logger
-import requests
+from utils import generate_session_id, get_date_range, KST, get_reader, get_client_ip, lookup_location, lru_stats, split_url, url_filters, service_filter, logger
+from ingest import IngestBuffer
+from useragent import parse_user_agent, ua_cache_stats, ua_dimension
+from botfilter import bot_filter
+from migrate import add_missing_columns
+from analytics import build_report, load_pageviews, pageview_report, load_anchor_click_counts, anchor_click_report, service_usercounts, service_active_users, active_user_counts
+from rollup import load_rollups, run_compactor, ROLLUP_GRACE
+from remote import get_openai_client, remote_slot, close_http_client
+from cache import cached, response_cache
+from hll import session_sketches, approx_usercount, approx_active_users
+from bitmap import session_bitmaps, active_user_series
+from sessions import session_dimension
+from partition import range_sources
+from storage import writer_engine, WriteSession, ReadSession, run_checkpointer
+from compute import aggregation_pool
+from sqlresults import sql_results, run_result_cleaner, EXPORT_FORMATS, SQL_PAGE_SIZE
+from sqlpool import run_query, cancel_on_disconnect
+from metrics import registry, MetricsMiddleware
+from profiling import ServerTimingMiddleware, stage
 from urllib.parse import unquote
 import pandas as pd
-import httpx
 import asyncio
-from openai import OpenAI
 import re
 import json
 from dotenv import load_dotenv
 import os
 import polars as pl
-import korea
+import logging
 
 app = FastAPI()
 
@@ -31,14 +44,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# SQLite3 데이터베이스 설정
-SQLALCHEMY_DATABASE_URL = "sqlite:///./analytics.db"
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# 라우트별 요청 처리 시간 (/metrics)
+app.add_middleware(MetricsMiddleware)
+
+# 단계별 처리 시간 (Server-Timing 헤더, ?profile=1)
+app.add_middleware(ServerTimingMiddleware)
+
+# SQLite3 데이터베이스 설정 (WAL 모드, 쓰기 연결 1개 + 읽기 전용 연결 풀)
+engine = writer_engine
+SessionLocal = ReadSession
 
-# 데이터베이스 종속성
+# 데이터베이스 종속성 (조회 전용)
 def get_db():
     db = SessionLocal()
     try:
@@ -46,401 +62,216 @@ def get_db():
     finally:
         db.close()
 
+# 위니브 서비스 목록 (URL에 포함된 이름, host는 utils.SERVICE_HOSTS)
+SERVICE_LIST = [
+    'books.weniv',
+    'weniv.link',
+    'world.weniv',
+    'sql.weniv',
+    'notebook.weniv'
+]
+
+# /collect/batch 제한 (sendBeacon 본문은 보통 64KB 이하)
+COLLECT_BATCH_MAX_BYTES = int(os.getenv("COLLECT_BATCH_MAX_BYTES", str(64 * 1024)))
+COLLECT_BATCH_MAX_EVENTS = int(os.getenv("COLLECT_BATCH_MAX_EVENTS", "100"))
+# 이벤트 시각 보정 최대값: 집계(rollup)가 늦은 이벤트를 기다리는 시간(ROLLUP_GRACE)을 넘을 수 없습니다.
+COLLECT_BATCH_MAX_DELAY = min(timedelta(seconds=float(os.getenv("COLLECT_BATCH_MAX_DELAY", str(ROLLUP_GRACE.total_seconds())))), ROLLUP_GRACE)
+
+# GeoIP 데이터베이스 로드 (파일이 없으면 시작 시점에 실패)
+get_reader()
+
 # 데이터베이스 테이블 생성
 Base.metadata.create_all(bind=engine)
+add_missing_columns(engine)
+
+# collect 이벤트 배치 저장
+ingest_buffer = IngestBuffer(WriteSession)
+ingest_buffer.hooks.append(ua_dimension.assign)
+ingest_buffer.hooks.append(session_sketches.update)  # session_id 문자열 사용
+ingest_buffer.hooks.append(session_dimension.assign)  # session_id -> session_pk
+ingest_buffer.hooks.append(session_bitmaps.update)  # session_pk 사용
+ingest_buffer.rollback_hooks.append(ua_dimension.clear)
+ingest_buffer.rollback_hooks.append(session_dimension.clear)
+
+@app.on_event("startup")
+async def start_ingest_buffer():
+    await ingest_buffer.start()
+
+@app.on_event("shutdown")
+async def stop_ingest_buffer():
+    await ingest_buffer.stop()
+
+# pageview 시간 단위 집계
+@app.on_event("startup")
+async def start_rollup_compactor():
+    app.state.rollup_task = asyncio.create_task(run_compactor(WriteSession, on_watermark=response_cache.set_history_end))
+
+@app.on_event("shutdown")
+async def stop_rollup_compactor():
+    app.state.rollup_task.cancel()
+
+# WAL 체크포인트
+@app.on_event("startup")
+async def start_checkpointer():
+    app.state.checkpoint_task = asyncio.create_task(run_checkpointer())
+
+@app.on_event("shutdown")
+async def stop_checkpointer():
+    app.state.checkpoint_task.cancel()
+
+# 대시보드 집계 프로세스 풀
+@app.on_event("startup")
+async def start_aggregation_pool():
+    aggregation_pool.start()
+
+@app.on_event("shutdown")
+async def stop_aggregation_pool():
+    aggregation_pool.stop()
+
+# 만료된 /analytics/sql 결과 파일 정리
+@app.on_event("startup")
+async def start_result_cleaner():
+    app.state.result_cleaner_task = asyncio.create_task(run_result_cleaner())
+
+@app.on_event("shutdown")
+async def stop_result_cleaner():
+    app.state.result_cleaner_task.cancel()
+
+@app.on_event("shutdown")
+async def stop_http_client():
+    await close_http_client()
 
 @app.post("/collect/pageview")
 async def collect_pageview(
-        request: Request, data: PageviewData, db: SessionLocal = Depends(get_db)
+        request: Request, data: PageviewData
         ,user_agent: str = Header(None),session_id: str = Header(None), referer: str = Header(None)
 ):
     try:
-        # User Agent 정보 파싱
-        user_agent_string = request.headers.get("User-Agent")
-        user_agent = parse(user_agent_string)
-
-        # IP 주소로 지역 정보 파싱
-        client_ip = request.headers.get("X-Forwarded-For")
-        if client_ip:
-            client_ip = client_ip.split(",")[0].strip()
-        else:
-            client_ip = request.client.host if request.client else None
-        try:
-            response = reader.city(client_ip)
-            user_location = f"{response.city.name}, {response.country.name}"
-        except:
-            user_location = "Unknown"
-
         # 세션 ID가 없는 경우 새로 생성
         if session_id is None:
             session_id = generate_session_id()
 
+        # 봇, 테스트 요청은 User-Agent 파싱, GeoIP 조회 전에 제외
+        user_agent_string = request.headers.get("User-Agent")
+        if bot_filter.check(user_agent_string, data.url):
+            return {"status": "success", "message": "Pageview data collected successfully", "session_id":session_id, "referer_url":referer}
+
+        # User Agent 정보 파싱
+        user_agent = parse_user_agent(user_agent_string)
+
+        # IP 주소로 지역 정보 파싱
+        client_ip = get_client_ip(request)
+        location = lookup_location(client_ip)
+
         # 데이터베이스에 정보 저장
+        host, path, query = split_url(data.url)
         pageview = Pageview(
+            timestamp=datetime.now(KST),
             url=data.url,
+            host=host,
+            path=path,
+            query=query,
             referer_url = referer,
             ip_address = client_ip,
             session_id = session_id,
-            user_location=user_location,
+            user_location=location.user_location,
+            country=location.country,
+            city=location.city,
+            region=location.region,
             user_agent=user_agent_string,
             is_mobile=int(user_agent.is_mobile),
             is_pc=int(user_agent.is_pc),
         )
 
-        if ('127.0.0.1' not in data.url) and ('localhost' not in data.url) and ('webpagetest' not in user_agent.browser[0]) and ('bot' not in user_agent_string.lower()) and ('yeti' not in user_agent_string.lower()) and ('headlesschrome' not in user_agent_string.lower()):
-            db.add(pageview)
-            db.commit()
+        await ingest_buffer.put(pageview)
 
     except Exception as e:
         logger.log(logging.DEBUG, f"Error: {e}")
 
     return {"status": "success", "message": "Pageview data collected successfully", "session_id":session_id, "referer_url":referer}
 
+async def pageview_analytics(db, metric, date_start, date_end, url, host, path, interval):
+    # DB 읽기는 스레드에서, 집계는 프로세스 풀에서 실행합니다.
+    start_date, end_date = get_date_range(date_start, date_end, interval)
+
+    # host 단위 접속횟수는 집계 테이블로 응답 (접속자수는 기간 전체의 고유 세션 수라 원본으로 계산)
+    if metric == "pageviews" and host and not path and not url:
+        frame = await aggregation_pool.load(load_rollups, db, [host.lower()], start_date, end_date)
+        return await aggregation_pool.aggregate(build_report, frame, start_date, end_date, interval)
+
+    pageviews_df = await aggregation_pool.load(
+        load_pageviews,
+        db,
+        *url_filters(Pageview.url, Pageview.host, Pageview.path, url, host, path),
+        Pageview.timestamp >= start_date,
+        Pageview.timestamp <= end_date.replace(hour=23, minute=59, second=59),
+        period=(start_date, end_date),
+    )
+    return await aggregation_pool.aggregate(pageview_report, pageviews_df, start_date, end_date, interval, metric)
+
 @app.get("/analytics/pageviews") # 접속횟수, 날짜 필터링
-async def get_pageviews_usercount(
-        url: str,
+@cached
+async def get_pageviews(
         date_start: str,
         date_end: str,
+        url: str = "",
+        host: Optional[str] = None,
+        path: Optional[str] = None,
         interval: str = "daily",
         db: SessionLocal = Depends(get_db),
 ):
-    start_date, end_date = get_date_range(date_start, date_end, interval)
-
-    pageviews = (
-        db.query(Pageview)
-        .filter(
-            Pageview.url.like(f"%{url}%"),
-            Pageview.timestamp >= start_date,
-            Pageview.timestamp <= end_date.replace(hour=23, minute=59, second=59),
-        )
-        .all()
-    )
-
-    processed_data = {
-        "total_pageviews": {},
-        "num": {},
-        "pageviews_by_device":{},
-        "pageviews_by_os":{},
-        "pageviews_by_location": {},
-        "pageviews_by_browser": {},
-        "daily_time":{},
-        f"is_{interval}_week":{}
-    }
-
-    all_dates = pd.date_range(start=start_date, end=end_date, freq='D')
-    all_dates_df = pd.DataFrame(all_dates, columns=['date'])    
-    all_dates_df['date'] = all_dates_df['date'].dt.strftime('%Y%m%d')
-
-    if pageviews:
-        pageviews_df = pd.DataFrame(
-            [
-                {
-                    "timestamp": p.timestamp, 
-                    "session_id": p.session_id,
-                    "is_mobile":p.is_mobile,
-                    "is_pc":p.is_pc,
-                    "os": parse(p.user_agent).os.family,
-                    "location":p.user_location,
-                    "browser": parse(p.user_agent).browser.family,
-                } for p in pageviews],
-        )
-
-        processed_data['total_pageviews'] = len(pageviews_df['timestamp'])
-        pageviews_df['date']=pageviews_df['timestamp'].dt.strftime('%Y%m%d')
-        merged_df = all_dates_df.merge(pageviews_df, on='date', how='left')
-
-        if interval == "daily": 
-            pageviews = merged_df.groupby('date').agg(session_count=('session_id', 'count')).reset_index()
-        elif interval == "weekly" or interval == "monthly":
-            merged_df['date'] = pd.to_datetime(merged_df['date'])
-            merged_df = merged_df.set_index('date')
-            if interval == "weekly":
-                pageviews = merged_df.resample('W').agg(session_count=('session_id', 'count')).reset_index()
-                pageviews['date'] = (pageviews['date'] + pd.DateOffset(days=-6)).dt.strftime('%Y%m%d') + '-' + pageviews['date'].dt.strftime('%Y%m%d')
-            elif interval == "monthly":
-                pageviews = merged_df.resample('M').agg(session_count=('session_id', 'count')).reset_index()
-                pageviews['date'] = pageviews['date'].dt.strftime('%Y%m') 
-        
-        pc = pageviews_df[['is_pc']].sum()
-        mobile = pageviews_df[['is_mobile']].sum()
-
-        os = pageviews_df['os'].value_counts().sort_values(ascending=False).to_dict()
-        browser = pageviews_df['browser'].value_counts().sort_values(ascending=False).to_dict()
-
-        t = pd.Series(0,index=list(range(0,24)))
-        w = pd.Series(0,index=["Monday","Tuesday","Wednesday","Thursday","Friday","Saturday","Sunday"])
- 
-        pageviews_df['time'] = pageviews_df['timestamp'].dt.hour
-        pageviews_df['weekday'] = pageviews_df['timestamp'].dt.strftime("%A")
-        
-        times = pageviews_df['time'].value_counts().sort_index()
-        weeks = pageviews_df['weekday'].value_counts().sort_index()
-
-        weekday = pd.to_datetime(all_dates_df['date']).dt.strftime("%A").value_counts().sort_index().replace(0, 1)
-
-        co_time = pd.concat([t, times]).to_dict()
-        co_week = pd.concat([w, weeks])
-        co_weekday = pd.concat([w, weekday])
-        co_week = (co_week/co_weekday).fillna(0)
-        co_week = round(co_week,2)
-
-        co_week_time = pageviews_df.groupby(['weekday','time'])['timestamp'].count().reset_index()
-        result = {}
-
-        num=co_weekday.fillna(1).to_dict()
-        for name, group in co_week_time.groupby('weekday'):
-            if name not in result:
-                result[name] = {}
-            for hour in range(24):
-                hour_data = group[group['time'] == hour]
-                if not hour_data.empty:
-                    result[name][hour] = int(hour_data['timestamp'].values[0])/num[name]
-                else:
-                    result[name][hour] = 0
-
-        pageviews_df['country'] = pageviews_df['location'].str.split(', ').str[1]
-        country = pageviews_df['country'].value_counts().sort_values(ascending=False).to_dict()
-
-        korea_df=pageviews_df[pageviews_df['country']=='South Korea']
-        korea_df['city'] = korea_df['location'].str.split(', ').str[0]
-        city = korea_df['city'].value_counts().reset_index()
-        
-        def find_location(city):
-            for key, value in korea.location_dict.items():
-                if city in value:
-                    return key
-            return 'Unknown'
-
-        city['region'] = city['city'].apply(find_location)
-        regions = city['region'].value_counts().sort_values(ascending=False).to_dict()
-        regions_unknown = city[city['region']=='Unknown'][['city','count']].set_index('city').to_dict()
-
-        processed_data['pageviews_by_device'] = {'pc':int(pc),'mobile':int(mobile)}
-        processed_data['pageviews_by_os'] = {os: count for os, count in os.items()}
-        processed_data['pageviews_by_location']['country'] = country
-        processed_data['pageviews_by_location']['city'] = regions
-        processed_data['pageviews_by_location']['city']['Unknown'] = regions_unknown
-        processed_data['pageviews_by_browser'] = {browser: count for browser, count in browser.items()}
-        processed_data['daily_time'] = {time: round(count/int(len(all_dates)),2) for time, count in co_time.items()}
-        processed_data[f'is_{interval}_week'] = co_week.to_dict()
-        processed_data[f'is_{interval}_week_time'] = result
-    else:
-        processed_data['total_pageviews'] = 0
-        pageviews = all_dates_df.copy()
-        pageviews['session_count'] = 0
-    
-    processed_data['num'] = {row['date']: row['session_count'] for _, row in pageviews.iterrows()}
-    processed_data['num']['min'] = int(pageviews['session_count'].min())
-    processed_data['num']['max'] = int(pageviews['session_count'].max())
-    processed_data['num']['avg'] = int(pageviews['session_count'].mean())
-
-    return processed_data
+    return await pageview_analytics(db, "pageviews", date_start, date_end, url, host, path, interval)
 
 @app.get("/analytics/pageviews/usercount") # 접속자수, 날짜 필터링
+@cached
 async def get_pageviews_usercount(
-        url: str,
         date_start: str,
         date_end: str,
+        url: str = "",
+        host: Optional[str] = None,
+        path: Optional[str] = None,
         interval: str = "daily",
+        approx: bool = False,
         db: SessionLocal = Depends(get_db),
 ):
-    start_date, end_date = get_date_range(date_start, date_end, interval)
-
-    pageviews = (
-        db.query(Pageview)
-        .filter(
-            Pageview.url.like(f"%{url}%"),
-            Pageview.timestamp >= start_date,
-            Pageview.timestamp <= end_date.replace(hour=23, minute=59, second=59),
-        )
-        .all()
-    )
-
-    processed_data = {
-        "total_pageviews": {},
-        "num": {},
-        "pageviews_by_device":{},
-        "pageviews_by_os":{},
-        "pageviews_by_location": {},
-        "pageviews_by_browser": {},
-        "daily_time":{},
-        f"is_{interval}_week":{}
-    }
-
-    all_dates = pd.date_range(start=start_date, end=end_date, freq='D')
-    all_dates_df = pd.DataFrame(all_dates, columns=['date'])    
-    all_dates_df['date'] = all_dates_df['date'].dt.strftime('%Y%m%d')
-
-    if pageviews:
-        pageviews_df = pd.DataFrame(
-            [
-                {
-                    "timestamp": p.timestamp, 
-                    "session_id": p.session_id,
-                    "is_mobile":p.is_mobile,
-                    "is_pc":p.is_pc,
-                    "os": parse(p.user_agent).os.family,
-                    "location":p.user_location,
-                    "browser": parse(p.user_agent).browser.family,
-                } for p in pageviews],
-        )
-
-        processed_data['total_pageviews'] = len(pageviews_df["session_id"].unique())
-        pageviews_df['date']=pageviews_df['timestamp'].dt.strftime('%Y%m%d')
-        merged_df = all_dates_df.merge(pageviews_df, on='date', how='left')
-
-        if interval == "daily": 
-            pageviews = merged_df.groupby('date').agg(session_count=('session_id', 'nunique')).reset_index()
-        elif interval == "weekly" or interval == "monthly":
-            merged_df['date'] = pd.to_datetime(merged_df['date'])
-            merged_df = merged_df.set_index('date')
-            if interval == "weekly":
-                pageviews = merged_df.resample('W').agg(session_count=('session_id', 'nunique')).reset_index()
-                pageviews['date'] = (pageviews['date'] + pd.DateOffset(days=-6)).dt.strftime('%Y%m%d') + '-' + pageviews['date'].dt.strftime('%Y%m%d')
-            elif interval == "monthly":
-                pageviews = merged_df.resample('M').agg(session_count=('session_id', 'nunique')).reset_index()
-                pageviews['date'] = pageviews['date'].dt.strftime('%Y%m') 
-        
-        session_df = pageviews_df.drop_duplicates(subset=['session_id'])
-        pc = session_df[['is_pc']].sum()
-        mobile = session_df[['is_mobile']].sum()
-
-        os = session_df['os'].value_counts().sort_values(ascending=False).to_dict()
-        browser = session_df['browser'].value_counts().sort_values(ascending=False).to_dict()
-
-        t = pd.Series(0,index=list(range(0,24)))
-        w = pd.Series(0,index=["Monday","Tuesday","Wednesday","Thursday","Friday","Saturday","Sunday"])
- 
-        session_df['time'] = session_df['timestamp'].dt.hour
-        session_df['weekday'] = session_df['timestamp'].dt.strftime("%A")
-        
-        times = session_df['time'].value_counts().sort_index()
-        weeks = session_df['weekday'].value_counts().sort_index()
-
-        weekday = pd.to_datetime(all_dates_df['date']).dt.strftime("%A").value_counts().sort_index().replace(0, 1)
-
-        co_time = pd.concat([t, times]).to_dict()
-        co_week = pd.concat([w, weeks])
-        co_weekday = pd.concat([w, weekday])
-        co_week = (co_week/co_weekday).fillna(0)
-        co_week = round(co_week,2)
-        co_week_time = session_df.groupby(['weekday','time'])['timestamp'].count().reset_index()
-        result = {}
-
-        num=co_weekday.fillna(1).to_dict()
-        for name, group in co_week_time.groupby('weekday'):
-            if name not in result:
-                result[name] = {}
-            for hour in range(24):
-                hour_data = group[group['time'] == hour]
-                if not hour_data.empty:
-                    result[name][hour] = int(hour_data['timestamp'].values[0])/num[name]
-                else:
-                    result[name][hour] = 0
-            
-        session_df['country'] = session_df['location'].str.split(', ').str[1]
-        country = session_df['country'].value_counts().sort_values(ascending=False).to_dict()
-
-        korea_df=session_df[session_df['country']=='South Korea']
-        korea_df['city'] = korea_df['location'].str.split(', ').str[0]
-        city = korea_df['city'].value_counts().reset_index()
-        
-        def find_location(city):
-            for key, value in korea.location_dict.items():
-                if city in value:
-                    return key
-            return 'Unknown'
-
-        city['region'] = city['city'].apply(find_location)
-        regions = city['region'].value_counts().sort_values(ascending=False).to_dict()
-        regions_unknown = city[city['region']=='Unknown'][['city','count']].set_index('city').to_dict()
-
-        processed_data['pageviews_by_device'] = {'pc':int(pc),'mobile':int(mobile)}
-        processed_data['pageviews_by_os'] = {os: count for os, count in os.items()}
-        processed_data['pageviews_by_location']['country'] = country
-        processed_data['pageviews_by_location']['city'] = regions
-        processed_data['pageviews_by_location']['city']['Unknown'] = regions_unknown
-        processed_data['pageviews_by_browser'] = {browser: count for browser, count in browser.items()}
-        processed_data['daily_time'] = {time: round(count/int(len(all_dates)),2) for time, count in co_time.items()}
-        processed_data[f'is_{interval}_week'] = co_week.to_dict()
-        processed_data[f'is_{interval}_week_time'] = result
-    else:
-        processed_data['total_pageviews'] = 0
-        pageviews = all_dates_df.copy()
-        pageviews['session_count'] = 0
-    
-    processed_data['num'] = {row['date']: row['session_count'] for _, row in pageviews.iterrows()}
-    processed_data['num']['min'] = int(pageviews['session_count'].min())
-    processed_data['num']['max'] = int(pageviews['session_count'].max())
-    processed_data['num']['avg'] = int(pageviews['session_count'].mean())
-
-    return processed_data
+    # approx=true: host 단위 조회를 날짜별 HyperLogLog 스케치로 추정 (total_pageviews, num, error_bound만 응답)
+    if approx and host and not path and not url:
+        start_date, end_date = get_date_range(date_start, date_end, interval)
+        return await aggregation_pool.load(approx_usercount, db, [host.lower()], start_date, end_date, interval)
+    return await pageview_analytics(db, "sessions", date_start, date_end, url, host, path, interval)
 
 @app.get("/analytics/pageviews/usercount/weniv") # 접속자수, 날짜 필터링
-def get_pageviews_usercount(
+@cached
+def get_pageviews_usercount_weniv(
         date_start: str,
         date_end: str,
         interval: str = "daily",
+        db: SessionLocal = Depends(get_db),
 ):
     start_date, end_date = get_date_range(date_start, date_end, interval)
 
-    service_list = [
-        'books.weniv',
-        'weniv.link',
-        'world.weniv',
-        'sql.weniv',
-        'notebook.weniv'
-    ]
-
-    service = {}
-    for name in service_list:
-        response = requests.get(f'https://analytics.weniv.co.kr/analytics/pageviews/usercount?url={name}&date_start={date_start}&date_end={date_end}&interval={interval}')
-
-        if response.status_code == 200:
-            # JSON 응답 데이터 파싱
-            data = response.json()
-            service[name] = {
-                'total_pageviews': data['total_pageviews'],
-                'daily_data': data['num']
-            }
-
-    return service
+    return service_usercounts(db, SERVICE_LIST, start_date, end_date, interval)
 
 @app.get('/analytics/pageviews/active_users') # 활성화 유저 수(dau, wau, mau)
-async def active_users(
-        url: str,
+@cached
+def active_users(
+        url: str = "",
+        host: Optional[str] = None,
+        path: Optional[str] = None,
+        approx: bool = False,
         db: SessionLocal = Depends(get_db),
 ):
     # 오늘 날짜 구하기
     today = datetime.today().replace(hour=0, minute=0, second=0, microsecond=0)
 
-    daily_pageviews = (
-        db.query(func.count(Pageview.session_id.distinct()))
-        .filter(
-            Pageview.url.like(f"%{url}%"),
-            Pageview.timestamp >= today,
-            Pageview.timestamp < today + timedelta(days=1),
-        )
-        .scalar()
-    )
-    weekly_pageviews = (
-        db.query(func.count(Pageview.session_id.distinct()))
-        .filter(
-            Pageview.url.like(f"%{url}%"),
-            Pageview.timestamp >= today - timedelta(days=6),
-            Pageview.timestamp < today + timedelta(days=1),
-        )
-        .scalar()
-    )
-    monthly_pageviews = (
-        db.query(func.count(Pageview.session_id.distinct()))
-        .filter(
-            Pageview.url.like(f"%{url}%"),
-            Pageview.timestamp >= today - timedelta(days=30),
-            Pageview.timestamp < today + timedelta(days=1),
+    # approx=true: host 단위 조회를 날짜별 HyperLogLog 스케치로 추정
+    error_bound = None
+    if approx and host and not path and not url:
+        daily_pageviews, weekly_pageviews, monthly_pageviews, error_bound = approx_active_users(db, [host.lower()], today)
+    else:
+        daily_pageviews, weekly_pageviews, monthly_pageviews = active_user_counts(
+            db, today, *url_filters(Pageview.url, Pageview.host, Pageview.path, url, host, path),
         )
-        .scalar()
-    )
 
     # 데이터 가공
     processed_data = {
@@ -456,34 +287,35 @@ async def active_users(
         processed_data["dau"]['월평균(일)'] = monthly_pageviews/30
         processed_data["wau"][f'{(today - timedelta(days=6)).strftime("%Y%m%d")} ~ {today_str}'] = weekly_pageviews
         processed_data["mau"][f'{(today - timedelta(days=29)).strftime("%Y%m%d")} ~ {today_str}'] = monthly_pageviews
+    if error_bound is not None:
+        processed_data["error_bound"] = error_bound
 
     return processed_data
 
+@app.get('/analytics/pageviews/active_users/series') # 날짜별 dau, wau, mau, stickiness(dau/mau)
+@cached
+def active_users_series(
+        host: str,
+        date_start: str,
+        date_end: str,
+        db: SessionLocal = Depends(get_db),
+):
+    start_date, end_date = get_date_range(date_start, date_end, "daily")
+    return active_user_series(db, [host.lower()], start_date, end_date)
+
 @app.get('/analytics/pageviews/top5') # mau 기준 서비스 top5
+@cached
 def pageview_top5(        
     interval: str = "daily",
+    db: SessionLocal = Depends(get_db),
 ):
-    service_list = [
-        'books.weniv',
-        'weniv.link',
-        'world.weniv',
-        'sql.weniv',
-        'notebook.weniv'
-    ]
+    # 오늘 날짜 구하기
+    today = datetime.today().replace(hour=0, minute=0, second=0, microsecond=0)
 
+    key = {'daily': 'dau', 'weekly': 'wau', 'monthly': 'mau'}.get(interval)
     service = {}
-    for name in service_list:
-        response = requests.get(f'https://analytics.weniv.co.kr/analytics/pageviews/active_users?url={name}')
-
-        if response.status_code == 200:
-            # JSON 응답 데이터 파싱
-            data = response.json()
-            if interval=='daily' and 'dau' in data and data['dau']:
-                service[name]=next(iter(data['dau'].values()))
-            elif interval=='weekly' and 'wau' in data and data['wau']:
-                service[name]=next(iter(data['wau'].values()))
-            elif interval=='monthly' and 'mau' in data and data['mau']:
-                service[name]=next(iter(data['mau'].values()))
+    if key:
+        service = {name: counts[key] for name, counts in service_active_users(db, SERVICE_LIST, today).items()}
 
     # 값 기준으로 정렬
     service_sort = sorted(service.items(), key=lambda x: x[1], reverse=True)
@@ -495,23 +327,17 @@ def pageview_top5(
 
 @app.post("/collect/anchor-click")
 async def collect_anchor_click(
-        request: Request, data: AnchorClickData, db: SessionLocal = Depends(get_db)
+        request: Request, data: AnchorClickData
         ,user_agent: str = Header(None),session_id: str = Header(None,alias="Session-Id")
 ):
+    # 봇, 테스트 요청은 User-Agent 파싱 전에 제외
     user_agent_string = request.headers.get("User-Agent")
-    user_agent = parse(user_agent_string)
+    if bot_filter.check(user_agent_string, data.source_url):
+        return {"status": "success", "message": "Anchor click data collected successfully"}
+    user_agent = parse_user_agent(user_agent_string)
 
     # IP 주소로 지역 정보 파싱
-    client_ip = request.headers.get("X-Forwarded-For")
-    if client_ip:
-        client_ip = client_ip.split(",")[0].strip()
-    else:
-        client_ip = request.client.host if request.client else None
-    try:
-        response = reader.city(client_ip)
-        user_location = f"{response.city.name}, {response.country.name}"
-    except:
-        user_location = "Unknown"
+    client_ip = get_client_ip(request)
 
     session_id = request.headers.get('Session-Id')
     
@@ -519,8 +345,12 @@ async def collect_anchor_click(
     if session_id is None:
         session_id = generate_session_id()  
 
+    source_host, source_path, _ = split_url(data.source_url)
     anchor_click = AnchorClick(
+        timestamp=datetime.now(KST),
         source_url=data.source_url,
+        source_host=source_host,
+        source_path=source_path,
         target_url=data.target_url,
         ip_address = client_ip,
         session_id = session_id,
@@ -530,149 +360,53 @@ async def collect_anchor_click(
         type = data.type
     )
 
-    excluded_sources = ['127.0.0.1', 'localhost']
-    excluded_agents = ['bot', 'yeti','headlesschrome']
-
-    if all(source not in data.source_url for source in excluded_sources) and \
-    all(agent not in user_agent_string.lower() for agent in excluded_agents) and ('webpagetest' not in user_agent.browser[0]):
-        db.add(anchor_click)
-        db.commit()
+    await ingest_buffer.put(anchor_click)
 
     return {"status": "success", "message": "Anchor click data collected successfully"}
 
 @app.get("/analytics/anchor-clicks") # 다른 컨텐츠 이동 횟수
+@cached
 async def get_anchor_clicks(
-        source_url: str,
+        source_url: str = "",
+        source_host: Optional[str] = None,
+        source_path: Optional[str] = None,
         target_url: Optional[str] = None,
         date_start: str = "",
         date_end: str = "",
         interval: str = "daily",
         db: SessionLocal = Depends(get_db),
 ):
-    query = db.query(AnchorClick).filter(AnchorClick.source_url.like(f"%{source_url}%"))
+    filters = url_filters(AnchorClick.source_url, AnchorClick.source_host, AnchorClick.source_path, source_url, source_host, source_path)
 
     if target_url:
-        query = query.filter(AnchorClick.target_url.like(f"%{target_url}%"))
+        filters.append(AnchorClick.target_url.like(f"%{target_url}%"))
 
+    period = None
     if date_start and date_end:
         start_date, end_date = get_date_range(date_start, date_end, interval)
-        query = query.filter(
+        filters += [
             AnchorClick.timestamp >= start_date, AnchorClick.timestamp <= end_date.replace(hour=23, minute=59, second=59),
-        )
-
-    anchor_clicks = query.all()
-
-    # 데이터 가공
-    processed_data = {
-        "total_clicks": len(anchor_clicks),
-        "data": {},
-    }
-
-    # 일일, 주간, 월간별 데이터 계산
-    current_date = start_date
-    while current_date <= end_date:
-        if interval == "daily":
-            next_date = current_date + timedelta(days=1)
-        elif interval == "weekly":
-            next_date = current_date + timedelta(days=7)
-        elif interval == "monthly":
-            next_date = current_date.replace(day=28) + timedelta(days=4)
-            next_date = next_date.replace(day=1)
-
-        filtered_clicks = [
-            c for c in anchor_clicks if current_date <= c.timestamp < next_date
         ]
+        period = (start_date, end_date)
 
-        if interval == "daily":
-            date_key = current_date.strftime("%Y%m%d")
-        elif interval == "weekly":
-            date_key = f"{current_date.strftime('%Y%m%d')}-{(next_date - timedelta(days=1)).strftime('%Y%m%d')}"
-        elif interval == "monthly":
-            date_key = current_date.strftime("%Y%m")
-
-        # 기본 구조 생성
-        processed_data["data"][date_key] = {
-            "clicks_by_target_url": {},
-            "clicks_by_device": {
-                "mobile": 0,
-                "pc": 0,
-            },
-            "clicks_by_os": {},
-            "clicks_by_browser": {},
-        }
-
-        # 데이터가 있는 경우에만 처리
-        if filtered_clicks:
-            processed_data["data"][date_key] = {
-                "clicks_by_target_url": {},
-                "clicks_by_device": {
-                    "mobile": sum(c.is_mobile for c in filtered_clicks),
-                    "pc": sum(c.is_pc for c in filtered_clicks),
-                },
-                "clicks_by_os": {},
-                "clicks_by_browser": {},
-            }
-
-            # 도착 URL별 클릭 수 계산
-            for click in filtered_clicks:
-                if (
-                        click.target_url
-                        not in processed_data["data"][date_key]["clicks_by_target_url"]
-                ):
-                    processed_data["data"][date_key]["clicks_by_target_url"][
-                        click.target_url
-                    ] = 0
-                processed_data["data"][date_key]["clicks_by_target_url"][
-                    click.target_url
-                ] += 1
-
-            # OS별 클릭 수 계산
-            for click in filtered_clicks:
-                user_agent = parse(click.user_agent)
-                os_family = user_agent.os.family
-                if os_family not in processed_data["data"][date_key]["clicks_by_os"]:
-                    processed_data["data"][date_key]["clicks_by_os"][os_family] = 0
-                processed_data["data"][date_key]["clicks_by_os"][os_family] += 1
-
-            # 브라우저별 클릭 수 계산
-            for click in filtered_clicks:
-                user_agent = parse(click.user_agent)
-                browser_family = user_agent.browser.family
-                if (
-                        browser_family
-                        not in processed_data["data"][date_key]["clicks_by_browser"]
-                ):
-                    processed_data["data"][date_key]["clicks_by_browser"][
-                        browser_family
-                    ] = 0
-                processed_data["data"][date_key]["clicks_by_browser"][
-                    browser_family
-                ] += 1
-
-        current_date = next_date
-
-    return processed_data
+    # (날짜, 도착 URL, OS, 브라우저)별 클릭 수를 한 번에 집계한 뒤 구간별로 나눕니다.
+    counts = await aggregation_pool.load(load_anchor_click_counts, db, *filters, period=period)
+    return await aggregation_pool.aggregate(anchor_click_report, counts, start_date, end_date, interval)
 
 @app.post("/collect/sql")
 async def collect_sql(
-        request: Request, data: WenivSqlData, db: SessionLocal = Depends(get_db)
+        request: Request, data: WenivSqlData
         ,user_agent: str = Header(None),session_id: str = Header(None,alias="Session-Id")
 ):
     try:
+        # 봇, 테스트 요청은 User-Agent 파싱 전에 제외
         user_agent_string = request.headers.get("User-Agent")
-        user_agent = parse(user_agent_string)
+        if bot_filter.check(user_agent_string):
+            return {"status": "success", "message": "sql data collected successfully"}
+        user_agent = parse_user_agent(user_agent_string)
 
         # IP 주소로 지역 정보 파싱
-        client_ip = request.headers.get("X-Forwarded-For")
-        if client_ip:
-            client_ip = client_ip.split(",")[0].strip()
-        else:
-            client_ip = request.client.host if request.client else None
-        try:
-            response = reader.city(client_ip)
-            user_location = f"{response.city.name}, {response.country.name}"
-        except:
-            user_location = "Unknown"
+        client_ip = get_client_ip(request)
 
         session_id = request.headers.get('Session-Id')
         
@@ -681,6 +415,7 @@ async def collect_sql(
             session_id = generate_session_id()  
 
         sql_data = WenivSql(
+            timestamp=datetime.now(KST),
             contents=data.contents,
             ip_address = client_ip,
             session_id = session_id,
@@ -689,16 +424,99 @@ async def collect_sql(
             is_pc=int(user_agent.is_pc),
         )
 
-        db.add(sql_data)
-        db.commit()
+        await ingest_buffer.put(sql_data)
         
     except Exception as e:
         logger.log(logging.DEBUG, f"Error: {e}")
 
     return {"status": "success", "message": "sql data collected successfully"}
 
+@app.post("/collect/batch")
+async def collect_batch(request: Request, referer: str = Header(None)):
+    # 한 세션의 pageview, anchor-click 이벤트 묶음 (navigator.sendBeacon용: Content-Type과 관계없이 본문을 JSON으로 읽습니다)
+    # User-Agent 파싱, GeoIP 조회는 요청마다 한 번만 하고 모든 이벤트에 적용합니다.
+    body = await request.body()
+    if len(body) > COLLECT_BATCH_MAX_BYTES:
+        raise HTTPException(status_code=413, detail="Batch too large")
+    try:
+        batch = BatchData.model_validate_json(body)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if len(batch.events) > COLLECT_BATCH_MAX_EVENTS:
+        raise HTTPException(status_code=413, detail="Too many events")
+
+    # 세션 ID가 없는 경우 새로 생성
+    session_id = batch.session_id or request.headers.get('Session-Id') or generate_session_id()
+    user_agent_string = request.headers.get("User-Agent")
+    accepted = 0
+
+    try:
+        # 봇, 테스트 요청은 User-Agent 파싱, GeoIP 조회 전에 제외 (URL 패턴은 이벤트별로 확인)
+        events = [event for event in batch.events if not bot_filter.check(user_agent_string, event.url or event.source_url)]
+        if not events:
+            return {"status": "success", "accepted": 0, "session_id": session_id}
+
+        user_agent = parse_user_agent(user_agent_string)
+        client_ip = get_client_ip(request)
+        location = lookup_location(client_ip)
+        now = datetime.now(KST)
+        today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+
+        for event in events:
+            # 클라이언트 시계와 관계없이 전송 시각과의 차이만큼 서버 시각에서 뺍니다.
+            # 집계가 끝난 어제 이전으로는 옮기지 않습니다. (오늘 0시까지만)
+            timestamp = now
+            if batch.sent_at is not None and event.ts is not None:
+                delay = min(max(timedelta(milliseconds=batch.sent_at - event.ts), timedelta(0)), COLLECT_BATCH_MAX_DELAY)
+                timestamp = max(now - delay, today)
+
+            if event.event == "pageview" and event.url:
+                host, path, query = split_url(event.url)
+                row = Pageview(
+                    timestamp=timestamp,
+                    url=event.url,
+                    host=host,
+                    path=path,
+                    query=query,
+                    referer_url=event.referer or referer,
+                    ip_address=client_ip,
+                    session_id=session_id,
+                    user_location=location.user_location,
+                    country=location.country,
+                    city=location.city,
+                    region=location.region,
+                    user_agent=user_agent_string,
+                    is_mobile=int(user_agent.is_mobile),
+                    is_pc=int(user_agent.is_pc),
+                )
+            elif event.event == "anchor-click" and event.source_url and event.target_url:
+                source_host, source_path, _ = split_url(event.source_url)
+                row = AnchorClick(
+                    timestamp=timestamp,
+                    source_url=event.source_url,
+                    source_host=source_host,
+                    source_path=source_path,
+                    target_url=event.target_url,
+                    ip_address=client_ip,
+                    session_id=session_id,
+                    user_agent=user_agent_string,
+                    is_mobile=int(user_agent.is_mobile),
+                    is_pc=int(user_agent.is_pc),
+                    type=event.type,
+                )
+            else:
+                continue
+            await ingest_buffer.put(row)
+            accepted += 1
+
+    except Exception as e:
+        logger.log(logging.DEBUG, f"Error: {e}")
+
+    return {"status": "success", "accepted": accepted, "session_id": session_id}
+
 @app.get("/analytics/wenivbooks/url") # 조회 수 높은 페이지
-async def get_urlcount(
+@cached
+def get_urlcount(
         date_start: str,
         date_end: str,
         interval: str = "daily",
@@ -707,36 +525,44 @@ async def get_urlcount(
 ):
     start_date, end_date = get_date_range(date_start, date_end, interval)
 
-    wenivbooks_pageviews = (
-        db.query(Pageview.url, func.count(Pageview.url))
-        .filter(
-            Pageview.url.like(f"%books.weniv%"),
-            Pageview.url.like(f"%{book}%"),
-            ~Pageview.url.like(f"%keyword%"),
-            Pageview.timestamp >= start_date,
-            Pageview.timestamp <= end_date.replace(hour=23, minute=59, second=59),
-        )
-        .group_by(Pageview.url)
-        .all()
-    )
+    # 조회 기간과 겹치는 월 파일까지 읽습니다.
+    with range_sources(db, start_date, end_date) as sources, stage("fetch"):
+        wenivbooks_pageviews = [
+            row for source in sources for row in (
+                source.query(Pageview.url, func.count(Pageview.url))
+                .filter(
+                    service_filter(Pageview.url, Pageview.host, ['books.weniv']),
+                    Pageview.url.like(f"%{book}%"),
+                    ~Pageview.url.like(f"%keyword%"),
+                    Pageview.timestamp >= start_date,
+                    Pageview.timestamp <= end_date.replace(hour=23, minute=59, second=59),
+                )
+                .group_by(Pageview.url)
+                .all()
+            )
+        ]
 
     book_list=['sql','github','html-css','basecamp-html-css','basecamp-javascript',
     'basecamp-network','javascript','python','wenivworld','wenivworld-teacher', 'basecamp-sql', 'figma-serenade']
         
-    df = pd.DataFrame(wenivbooks_pageviews, columns=['url', 'count'])
-    try:
-        df['url_split'] = df['url'].apply(lambda x: x.split('/')[3] if len(x.split('/')) > 3 else None)
-    except IndexError:
-        pass    
-    df = df[df['url_split'].isin(book_list)]
-    df.drop(columns=['url_split'], inplace=True)
-    df = df.sort_values(by='count', ascending=False)
-    result = df[:20].to_dict('records')
+    with aggregation_pool.measure("aggregate"):
+        df = pd.DataFrame(wenivbooks_pageviews, columns=['url', 'count'])
+        if len(sources) > 1:
+            df = df.groupby('url', as_index=False)['count'].sum()
+        try:
+            df['url_split'] = df['url'].apply(lambda x: x.split('/')[3] if len(x.split('/')) > 3 else None)
+        except IndexError:
+            pass    
+        df = df[df['url_split'].isin(book_list)]
+        df.drop(columns=['url_split'], inplace=True)
+        df = df.sort_values(by='count', ascending=False)
+        result = df[:20].to_dict('records')
 
     return result
 
 @app.get("/analytics/wenivbooks/tech") # 조회 수 높은 교안
-async def get_techcount(
+@cached
+def get_techcount(
         date_start: str,
         date_end: str,
         interval: str = "daily",
@@ -744,36 +570,42 @@ async def get_techcount(
 ):
     start_date, end_date = get_date_range(date_start, date_end, interval)
 
-    wenivbooks_pageviews = (
-        db.query(Pageview.url, func.count(Pageview.url))
-        .filter(
-            Pageview.url.like(f"%books.weniv%"),
-            ~Pageview.url.like(f"%keyword%"),
-            Pageview.timestamp >= start_date,
-            Pageview.timestamp <= end_date.replace(hour=23, minute=59, second=59),
-        )
-        .group_by(Pageview.url)
-        .all()
-    )
+    # 조회 기간과 겹치는 월 파일까지 읽습니다.
+    with range_sources(db, start_date, end_date) as sources, stage("fetch"):
+        wenivbooks_pageviews = [
+            row for source in sources for row in (
+                source.query(Pageview.url, func.count(Pageview.url))
+                .filter(
+                    service_filter(Pageview.url, Pageview.host, ['books.weniv']),
+                    ~Pageview.url.like(f"%keyword%"),
+                    Pageview.timestamp >= start_date,
+                    Pageview.timestamp <= end_date.replace(hour=23, minute=59, second=59),
+                )
+                .group_by(Pageview.url)
+                .all()
+            )
+        ]
 
     book_list=['sql','github','html-css','basecamp-html-css','basecamp-javascript',
     'basecamp-network','javascript','python','wenivworld','wenivworld-teacher', 'basecamp-sql', 'figma-serenade']
         
-    df = pd.DataFrame(wenivbooks_pageviews, columns=['url', 'count'])
-    try:
-        df['url_split'] = df['url'].apply(lambda x: x.split('/')[3] if len(x.split('/')) > 3 else None)
-    except IndexError:
-        pass    
+    with aggregation_pool.measure("aggregate"):
+        df = pd.DataFrame(wenivbooks_pageviews, columns=['url', 'count'])
+        try:
+            df['url_split'] = df['url'].apply(lambda x: x.split('/')[3] if len(x.split('/')) > 3 else None)
+        except IndexError:
+            pass    
 
-    df = df[df['url_split'].isin(book_list)]
-    df['url'] = df['url'].apply(lambda x: unquote(x, 'utf-8') if '%' in x else x)
-    grouped_df = df.groupby('url_split')['count'].sum().reset_index()
-    result = grouped_df.set_index('url_split').T.to_dict('records')
+        df = df[df['url_split'].isin(book_list)]
+        df['url'] = df['url'].apply(lambda x: unquote(x, 'utf-8') if '%' in x else x)
+        grouped_df = df.groupby('url_split')['count'].sum().reset_index()
+        result = grouped_df.set_index('url_split').T.to_dict('records')
 
     return result
 
 @app.get("/analytics/wenivbooks/keyword") # 검색 키워드
-async def get_keyword(
+@cached
+def get_keyword(
         date_start: str,
         date_end: str,
         interval: str = "daily",
@@ -781,36 +613,41 @@ async def get_keyword(
 ):
     start_date, end_date = get_date_range(date_start, date_end, interval)
 
-    keyword_pageviews = (
-        db.query(Pageview.url, func.count(Pageview.url))
-        .filter(
-            Pageview.url.like(f"%books.weniv%"),
-            Pageview.url.like(f"%search?keyword%"),
-            Pageview.timestamp >= start_date,
-            Pageview.timestamp <= end_date.replace(hour=23, minute=59, second=59),
-        )
-        .group_by(Pageview.url)
-        .all()
-    )
+    # 조회 기간과 겹치는 월 파일까지 읽습니다.
+    with range_sources(db, start_date, end_date) as sources, stage("fetch"):
+        keyword_pageviews = [
+            row for source in sources for row in (
+                source.query(Pageview.url, func.count(Pageview.url))
+                .filter(
+                    service_filter(Pageview.url, Pageview.host, ['books.weniv']),
+                    Pageview.url.like(f"%search?keyword%"),
+                    Pageview.timestamp >= start_date,
+                    Pageview.timestamp <= end_date.replace(hour=23, minute=59, second=59),
+                )
+                .group_by(Pageview.url)
+                .all()
+            )
+        ]
 
     keyword_dict={}
 
-    for url, count in keyword_pageviews:
-        keyword = url.split('=')[1]
-        if '%' in keyword:
-            keyword = unquote(keyword, 'utf-8')
-        if keyword in keyword_dict:
-            keyword_dict[keyword] += count
-        else:
-            keyword_dict[keyword] = count
+    with aggregation_pool.measure("aggregate"):
+        for url, count in keyword_pageviews:
+            keyword = url.split('=')[1]
+            if '%' in keyword:
+                keyword = unquote(keyword, 'utf-8')
+            if keyword in keyword_dict:
+                keyword_dict[keyword] += count
+            else:
+                keyword_dict[keyword] = count
     
-    result = {keyword: count for keyword, count in keyword_dict.items()}
+        result = {keyword: count for keyword, count in keyword_dict.items()}
 
     return result
 
 @app.post("/analytics/ai")
 async def analytics_ai(
-        request: Request, db: SessionLocal = Depends(get_db)
+        request: Request
 ):
     try:
         body = await request.json()
@@ -819,25 +656,23 @@ async def analytics_ai(
         # .env 파일의 환경 변수를 로드합니다.
         load_dotenv()
 
-        OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-        client = OpenAI(api_key=OPENAI_API_KEY)
+        client = get_openai_client()
 
-        completion = client.chat.completions.create(
-            model = 'gpt-3.5-turbo',
-            messages = [
-                {"role":"user","content":question}
-            ]
-        )
+        async with remote_slot():
+            completion = await cancel_on_disconnect(request, client.chat.completions.create(
+                model = 'gpt-3.5-turbo',
+                messages = [
+                    {"role":"user","content":question}
+                ]
+            ))
 
         pattern = r'```sql(.*?)```'
         match = re.search(pattern, completion.choices[0].message.content, re.DOTALL)
 
         if match:
             sql_text = match.group(1).strip()
-            query=text(sql_text)
-            result = db.execute(query)
-            users = result.mappings().all()
-            return {'gpt':completion.choices[0].message.content,'sql': sql_text,'result':users}
+            result = sql_results.page(await run_query(sql_text, request))
+            return {'gpt':completion.choices[0].message.content,'sql': sql_text, **result}
         else:
             return {"result":"다시 요청 부탁드립니다.",'gpt':completion.choices[0].message.content}
     except Exception as e:
@@ -845,31 +680,73 @@ async def analytics_ai(
 
 @app.post("/analytics/sql")
 async def analytics_sql(
-        request: Request, db: SessionLocal = Depends(get_db)
+        request: Request, limit: int = SQL_PAGE_SIZE
 ):
+    # 쿼리는 읽기 전용 연결로 워커 스레드에서 실행합니다. (SQL_TIMEOUT초 제한, 연결이 끊기면 취소)
+    # 결과는 result_id별 파일에 저장하고 첫 페이지만 응답합니다. (다음 페이지: /analytics/sql/result)
     try:
         body = await request.json()
         question = body.get("question")
 
-        query=text(question)
-        result = db.execute(query)
-        users = result.mappings().all()
-        file = pd.DataFrame(users)
-        file.to_csv('sql_result.csv', index=False)
-        
-        return {'result':users}
+        meta = await run_query(question, request)
+
+        return sql_results.page(meta, 0, limit)
 
     except Exception as e:
         return {"error": str(e)}
 
+@app.get("/analytics/sql/result")
+async def sql_result_page(result_id: str, offset: int = 0, limit: int = SQL_PAGE_SIZE):
+    meta = sql_results.meta(result_id)
+    if meta is None:
+        raise HTTPException(status_code=404, detail="Result not found")
+    return sql_results.page(meta, offset, limit)
+
 @app.get("/analytics/sql/download")
-async def download_csv():
-    csv_file_path = 'sql_result.csv'
-    if not os.path.exists(csv_file_path):
+async def download_csv(result_id: str, format: str = "csv"):
+    meta = sql_results.meta(result_id)
+    if meta is None:
         raise HTTPException(status_code=404, detail="File not found")
-    return FileResponse(csv_file_path, filename='sql_result.csv')
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format: {', '.join(EXPORT_FORMATS)}")
+    return StreamingResponse(
+        sql_results.export(meta, format),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="sql_result.{format}"'},
+    )
 
 # health check
 @app.get("/health")
 def health_check():
-    return {"status": "ok"}
\ No newline at end of file
+    return {"status": "ok", "ingest": ingest_buffer.stats(), "ua_cache": ua_cache_stats(), "geoip_cache": lru_stats(lookup_location), "response_cache": response_cache.stats(), "aggregation": aggregation_pool.stats(), "bot_filter": bot_filter.stats()}
+
+# Prometheus 지표: 다른 모듈의 카운터는 수집 시점에 읽습니다.
+@registry.collector
+def collect_app_metrics():
+    ingest = ingest_buffer.stats()
+    yield "analytics_collect_accepted_total", "counter", "저장 대기열에 추가한 collect 이벤트 수", [
+        ({"table": table}, count) for table, count in sorted(ingest["enqueued_by_table"].items())
+    ]
+    yield "analytics_collect_rejected_total", "counter", "수집 제외한 collect 이벤트 수", [
+        ({"reason": reason}, count) for reason, count in sorted(bot_filter.stats()["rejected_by_reason"].items())
+    ]
+    yield "analytics_ingest_events_total", "counter", "배치 저장 결과별 이벤트 수", [
+        ({"result": "flushed"}, ingest["flushed_events"]), ({"result": "failed"}, ingest["failed_events"]),
+    ]
+    yield "analytics_ingest_queue_depth", "gauge", "저장 대기 중인 이벤트 수", [({}, ingest["queue_depth"])]
+
+    caches = {
+        "ua_parse": ua_cache_stats(),
+        "geoip": lru_stats(lookup_location),
+        "response": response_cache.stats(),
+        "bot_filter": bot_filter.stats()["cache"],
+    }
+    yield "analytics_ua_parse_calls_total", "counter", "User-Agent 파싱 호출 수 (캐시 포함)", [({}, caches["ua_parse"]["hits"] + caches["ua_parse"]["misses"])]
+    yield "analytics_geoip_lookup_calls_total", "counter", "GeoIP 조회 호출 수 (캐시 포함)", [({}, caches["geoip"]["hits"] + caches["geoip"]["misses"])]
+    yield "analytics_cache_hits_total", "counter", "캐시 적중 수", [({"cache": name}, stats["hits"]) for name, stats in caches.items()]
+    yield "analytics_cache_misses_total", "counter", "캐시 미스 수", [({"cache": name}, stats["misses"]) for name, stats in caches.items()]
+    yield "analytics_cache_hit_ratio", "gauge", "캐시 적중률", [({"cache": name}, stats["hit_ratio"]) for name, stats in caches.items()]
+
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
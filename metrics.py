@@ -0,0 +1,200 @@
+"""Prometheus 텍스트 형식 지표 (/metrics)
+
+요청 처리 경로에서는 카운터 증가와 histogram 구간 찾기만 하고, 다른 모듈의 통계(ingest, 캐시 등)는 수집 시점에 읽습니다.
+"""
+import bisect
+import threading
+import time
+from contextvars import ContextVar
+
+# 초 단위 histogram 구간
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+FAST_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.1)
+
+_scope = ContextVar("metrics_scope", default=None)
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *labels, value=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            values = sorted(self.values.items())
+        for labels, value in values:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.values = {}  # labels -> [구간별 개수..., +Inf 개수, 합계]
+        self.lock = threading.Lock()
+
+    def observe(self, seconds, *labels):
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self.lock:
+            counts = self.values.get(labels)
+            if counts is None:
+                counts = self.values[labels] = [0] * (len(self.buckets) + 2)
+            counts[index] += 1
+            counts[-1] += seconds
+
+    def time(self, *labels):
+        return _Timer(self, labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        names = self.labelnames + ("le",)
+        with self.lock:
+            values = sorted((labels, list(counts)) for labels, counts in self.values.items())
+        for labels, counts in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(names, labels + (_format_value(bound),))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(counts[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram, labels):
+        self.histogram, self.labels = histogram, labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []  # 수집 시점에 (이름, 종류, 설명, [(라벨 dict, 값)])를 돌려주는 함수
+
+    def counter(self, name, help, labelnames=()):
+        metric = Counter(name, help, labelnames)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        metric = Histogram(name, help, labelnames, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def collector(self, func):
+        self.collectors.append(func)
+        return func
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        for collect in self.collectors:
+            for name, kind, help, samples in collect():
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(tuple(labels), tuple(labels.values()))} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_request_seconds = registry.histogram(
+    "analytics_http_request_duration_seconds", "HTTP 요청 처리 시간", ["method", "route", "status"],
+)
+db_query_seconds = registry.histogram(
+    "analytics_db_query_duration_seconds", "SQL 실행 시간 (커서 execute 기준)", ["pool"],
+)
+db_commit_seconds = registry.histogram(
+    "analytics_db_commit_duration_seconds", "collect 배치 저장(훅 + commit) 시간",
+)
+ua_parse_seconds = registry.histogram(
+    "analytics_ua_parse_duration_seconds", "User-Agent 파싱 시간 (캐시 미스)", buckets=FAST_BUCKETS,
+)
+geoip_lookup_seconds = registry.histogram(
+    "analytics_geoip_lookup_duration_seconds", "GeoIP 조회 시간 (캐시 미스)", buckets=FAST_BUCKETS,
+)
+aggregation_seconds = registry.histogram(
+    "analytics_aggregation_duration_seconds", "analytics 엔드포인트 단계별(load, queue, transfer, aggregate) 시간", ["route", "stage"],
+)
+
+
+def current_route():
+    # 처리 중인 요청의 라우트 경로 (라우팅 전이거나 요청 밖이면 "-")
+    scope = _scope.get()
+    route = scope.get("route") if scope else None
+    return getattr(route, "path", "-")
+
+
+def timed(histogram, func):
+    """func 실행 시간을 histogram에 기록하는 함수 (lru_cache 안쪽에 두면 캐시 미스만 기록합니다)"""
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            histogram.observe(time.perf_counter() - started)
+    wrapper.__wrapped__ = func
+    return wrapper
+
+
+class MetricsMiddleware:
+    """라우트별 요청 처리 시간을 기록하는 ASGI 미들웨어"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = 500
+        started = time.perf_counter()
+        token = _scope.set(scope)
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _scope.reset(token)
+            route = scope.get("route")
+            http_request_seconds.observe(
+                time.perf_counter() - started, scope["method"], getattr(route, "path", "unmatched"), status,
+            )
@@ -0,0 +1,268 @@
+"""스키마 변경 및 기존 데이터 이관
+
+    python migrate.py user_agents [--keep-strings] [--vacuum]
+    python migrate.py locations
+    python migrate.py urls
+    python migrate.py sketches
+    python migrate.py bitmaps
+    python migrate.py sessions [--keep-strings] [--vacuum]
+"""
+import argparse
+from datetime import datetime
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import sessionmaker
+from models import Base
+from useragent import ua_dimension
+import korea
+from utils import split_url
+from storage import writer_engine
+from hll import HyperLogLog, session_sketches
+from bitmap import RoaringBitmap, session_bitmaps
+
+EVENT_TABLES = ["pageviews", "anchor_clicks", "wenivsql_data"]
+
+
+def add_missing_columns(engine):
+    # create_all은 기존 테이블에 컬럼을 추가하지 않으므로 모델에 새로 생긴 컬럼과 인덱스를 추가합니다.
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    conn.execute(text(
+                        f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(engine.dialect)}'
+                    ))
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+
+
+def backfill_user_agents(engine, keep_strings=False, batch_size=5000, **options):
+    # 기존 행의 User-Agent 문자열을 user_agents 테이블의 id로 바꿉니다.
+    # id 범위로 나눠서 배치마다 commit 하므로 서버 실행 중에도 collect 저장이 오래 기다리지 않습니다.
+    pending = "user_agent IS NOT NULL" if not keep_strings else "user_agent_id IS NULL AND user_agent IS NOT NULL"
+    for table in EVENT_TABLES:
+        total = 0
+        last_id = 0
+        while True:
+            with engine.begin() as conn:
+                last = conn.execute(text(
+                    f"SELECT max(id) FROM (SELECT id FROM {table} WHERE id > :last_id AND {pending} ORDER BY id LIMIT :limit)"
+                ), {"last_id": last_id, "limit": batch_size}).scalar()
+                if last is None:
+                    break
+                params = {"last_id": last_id, "last": last}
+                batch = "id > :last_id AND id <= :last AND user_agent_id IS NULL AND user_agent IS NOT NULL"
+                strings = [row[0] for row in conn.execute(text(f"SELECT DISTINCT user_agent FROM {table} WHERE {batch}"), params)]
+                ua_dimension.resolve(conn, strings)
+                total += conn.execute(text(
+                    f"UPDATE {table} SET user_agent_id = "
+                    f"(SELECT id FROM user_agents WHERE user_agents.user_agent = {table}.user_agent) "
+                    f"WHERE {batch}"
+                ), params).rowcount
+                if not keep_strings:
+                    conn.execute(text(
+                        f"UPDATE {table} SET user_agent = NULL WHERE id > :last_id AND id <= :last AND user_agent_id IS NOT NULL"
+                    ), params)
+            last_id = last
+        print(f"{table}: {total} rows")
+
+
+def backfill_locations(engine, **options):
+    # user_location("city, country") 문자열을 country, city, region 컬럼으로 나눕니다.
+    with engine.begin() as conn:
+        conn.execute(text(
+            "UPDATE pageviews SET "
+            "city = substr(user_location, 1, instr(user_location, ', ') - 1), "
+            "country = substr(user_location, instr(user_location, ', ') + 2) "
+            "WHERE country IS NULL AND instr(user_location, ', ') > 0"
+        ))
+        cities = [row[0] for row in conn.execute(text(
+            "SELECT DISTINCT city FROM pageviews WHERE country = 'South Korea' AND region IS NULL"
+        ))]
+        if cities:
+            conn.execute(
+                text("UPDATE pageviews SET region = :region WHERE country = 'South Korea' AND city = :city AND region IS NULL"),
+                [{"city": city, "region": korea.find_region(city)} for city in cities],
+            )
+    print(f"pageviews: {len(cities)} korean cities")
+
+
+def backfill_urls(engine, batch_size=50000, **options):
+    # 기존 행의 URL을 host, path, query 컬럼으로 나눕니다.
+    targets = [
+        ("pageviews", "url", ["host", "path", "query"]),
+        ("anchor_clicks", "source_url", ["source_host", "source_path"]),
+    ]
+    for table, url_column, columns in targets:
+        total = 0
+        last_id = 0
+        while True:
+            with engine.begin() as conn:
+                rows = conn.execute(text(
+                    f"SELECT id, {url_column} FROM {table} "
+                    f"WHERE id > :last_id AND {columns[0]} IS NULL AND {url_column} IS NOT NULL "
+                    f"ORDER BY id LIMIT :limit"
+                ), {"last_id": last_id, "limit": batch_size}).all()
+                if not rows:
+                    break
+                params = []
+                for id_, url in rows:
+                    values = dict(zip(columns, split_url(url)))
+                    values["id"] = id_
+                    params.append(values)
+                conn.execute(
+                    text(f"UPDATE {table} SET " + ", ".join(f"{c} = :{c}" for c in columns) + " WHERE id = :id"),
+                    params,
+                )
+            last_id = rows[-1][0]
+            total += len(rows)
+        print(f"{table}: {total} rows")
+
+
+def backfill_sketches(engine, batch_size=50000, **options):
+    # 기존 pageview 세션으로 host, 날짜별 HyperLogLog 스케치를 만듭니다. (urls 이관 후 실행)
+    # 스케치 합치기는 같은 값을 여러 번 넣어도 결과가 같으므로 서버 실행 중에도 다시 실행할 수 있습니다.
+    sketches = {}
+    with engine.connect() as conn:
+        result = conn.execution_options(yield_per=batch_size).execute(text(
+            "SELECT pageviews.host, date(pageviews.timestamp), coalesce(pageviews.session_id, sessions.session_id) "
+            "FROM pageviews LEFT JOIN sessions ON sessions.id = pageviews.session_pk WHERE pageviews.host IS NOT NULL"
+        ))
+        for host, day, session_id in result:
+            if session_id is None:
+                continue
+            key = (host, datetime.strptime(day, "%Y-%m-%d"))
+            if key not in sketches:
+                sketches[key] = HyperLogLog(session_sketches.precision)
+            sketches[key].add(session_id)
+
+    SessionLocal = sessionmaker(bind=engine)
+    db = SessionLocal()
+    try:
+        session_sketches.merge(db, sketches)
+        db.commit()
+    finally:
+        db.close()
+    print(f"session_sketches: {len(sketches)} host-days")
+
+
+def backfill_bitmaps(engine, batch_size=50000, **options):
+    # 기존 session_id를 sessions 테이블에 등록하고, host, 날짜별 세션 비트맵을 만듭니다. (urls 이관 후 실행)
+    SessionLocal = sessionmaker(bind=engine)
+    db = SessionLocal()
+    try:
+        for table in EVENT_TABLES:
+            db.execute(text(
+                f"INSERT OR IGNORE INTO sessions (session_id) "
+                f"SELECT DISTINCT session_id FROM {table} WHERE session_id IS NOT NULL"
+            ))
+        db.commit()
+
+        values = {}
+        result = db.execute(text(
+            "SELECT pageviews.host, date(pageviews.timestamp), coalesce(pageviews.session_pk, sessions.id) FROM pageviews "
+            "LEFT JOIN sessions ON pageviews.session_pk IS NULL AND sessions.session_id = pageviews.session_id "
+            "WHERE pageviews.host IS NOT NULL"
+        ).execution_options(yield_per=batch_size))
+        for host, day, id_ in result:
+            if id_ is None:
+                continue
+            values.setdefault((host, datetime.strptime(day, "%Y-%m-%d")), []).append(id_)
+
+        session_bitmaps.merge(db, {key: RoaringBitmap.from_values(ids) for key, ids in values.items()})
+        db.commit()
+    finally:
+        db.close()
+    print(f"session_bitmaps: {len(values)} host-days")
+
+
+def backfill_sessions(engine, keep_strings=False, batch_size=50000, **options):
+    # 기존 session_id 문자열을 sessions 테이블에 등록하고(처음/마지막 수집 시각, 첫 pageview URL) session_pk로 바꿉니다.
+    # id 범위로 나눠서 배치마다 commit 하므로 서버 실행 중에도 collect 저장이 오래 기다리지 않습니다.
+    for table in EVENT_TABLES:
+        total = 0
+        last_id = 0
+        while True:
+            with engine.begin() as conn:
+                last = conn.execute(text(
+                    f"SELECT max(id) FROM (SELECT id FROM {table} "
+                    f"WHERE id > :last_id AND session_pk IS NULL AND session_id IS NOT NULL ORDER BY id LIMIT :limit)"
+                ), {"last_id": last_id, "limit": batch_size}).scalar()
+                if last is None:
+                    break
+                params = {"last_id": last_id, "last": last}
+                batch = "id > :last_id AND id <= :last AND session_pk IS NULL AND session_id IS NOT NULL"
+                # 처음/마지막 수집 시각은 배치마다 기존 값과 합칩니다.
+                conn.execute(text(
+                    f"INSERT INTO sessions (session_id, first_seen, last_seen) "
+                    f"SELECT session_id, min(timestamp), max(timestamp) FROM {table} "
+                    f"WHERE {batch} GROUP BY session_id "
+                    f"ON CONFLICT (session_id) DO UPDATE SET "
+                    f"first_seen = coalesce(min(first_seen, excluded.first_seen), first_seen, excluded.first_seen), "
+                    f"last_seen = coalesce(max(last_seen, excluded.last_seen), last_seen, excluded.last_seen)"
+                ), params)
+                total += conn.execute(text(
+                    f"UPDATE {table} SET session_pk = "
+                    f"(SELECT id FROM sessions WHERE sessions.session_id = {table}.session_id) "
+                    f"WHERE {batch}"
+                ), params).rowcount
+                if not keep_strings:
+                    conn.execute(text(
+                        f"UPDATE {table} SET session_id = NULL WHERE id > :last_id AND id <= :last AND session_pk IS NOT NULL"
+                    ), params)
+            last_id = last
+        print(f"{table}: {total} rows")
+
+    # 세션별 가장 이른 pageview의 URL (session_pk 인덱스로 찾습니다)
+    last_id = 0
+    while True:
+        with engine.begin() as conn:
+            last = conn.execute(text(
+                "SELECT max(id) FROM (SELECT id FROM sessions WHERE id > :last_id AND landing_url IS NULL ORDER BY id LIMIT :limit)"
+            ), {"last_id": last_id, "limit": batch_size}).scalar()
+            if last is None:
+                break
+            conn.execute(text(
+                "UPDATE sessions SET landing_url = "
+                "(SELECT url FROM pageviews WHERE pageviews.session_pk = sessions.id ORDER BY timestamp, id LIMIT 1) "
+                "WHERE id > :last_id AND id <= :last AND landing_url IS NULL"
+            ), {"last_id": last_id, "last": last})
+        last_id = last
+
+    with engine.connect() as conn:
+        count = conn.execute(text("SELECT count(*) FROM sessions")).scalar()
+    print(f"sessions: {count} sessions")
+
+
+MIGRATIONS = {
+    "user_agents": backfill_user_agents,
+    "locations": backfill_locations,
+    "urls": backfill_urls,
+    "sketches": backfill_sketches,
+    "bitmaps": backfill_bitmaps,
+    "sessions": backfill_sessions,
+}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="analytics.db 이관")
+    parser.add_argument("migration", choices=MIGRATIONS)
+    parser.add_argument("--keep-strings", action="store_true", help="기존 User-Agent, session_id 문자열 컬럼을 비우지 않음")
+    parser.add_argument("--vacuum", action="store_true", help="이관 후 VACUUM 실행")
+    args = parser.parse_args()
+
+    engine = writer_engine
+    Base.metadata.create_all(bind=engine)
+    add_missing_columns(engine)
+    MIGRATIONS[args.migration](engine, keep_strings=args.keep_strings)
+
+    # 원본 데이터가 바뀌었으므로 pageview 집계는 처음부터 다시 만들도록 초기화
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM pageview_rollups"))
+        conn.execute(text("DELETE FROM rollup_state"))
+
+    if args.vacuum:
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text("VACUUM"))
@@ -1,21 +1,50 @@
-from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index, LargeBinary
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
 from utils import KST
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from typing import List, Optional
 
 Base = declarative_base()
 
 # 모델 정의
+class UserAgent(Base):
+    __tablename__ = "user_agents"
+    id = Column(Integer, primary_key=True, index=True)
+    user_agent = Column(String, unique=True)  # User-Agent 원본 문자열
+    os_family = Column(String)  # OS 이름
+    browser_family = Column(String)  # 브라우저 이름
+    device_class = Column(String)  # mobile, tablet, pc, other
+    is_bot = Column(Integer)  # 봇 여부
+
+class Session(Base):
+    __tablename__ = "sessions"
+    id = Column(Integer, primary_key=True, index=True)
+    session_id = Column(String, unique=True)  # session ID 원본 문자열
+    first_seen = Column(DateTime)  # 처음 수집된 시각
+    last_seen = Column(DateTime)  # 마지막으로 수집된 시각
+    landing_url = Column(String)  # 첫 pageview URL
+
 class Pageview(Base):
     __tablename__ = "pageviews"
+    __table_args__ = (
+        Index("ix_pageviews_host_timestamp", "host", "timestamp"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     timestamp = Column(DateTime, default=lambda: datetime.now(KST))
     url = Column(String)  # 사용자가 접속한 URL
+    host = Column(String)  # URL의 host (소문자)
+    path = Column(String)  # URL의 path
+    query = Column(String)  # URL의 query string
     ip_address = Column(String) # 사용자 IP
-    session_id = Column(String) # 사용자 session ID
+    session_id = Column(String) # 사용자 session ID (session_pk 이관 전 데이터)
+    session_pk = Column(Integer, ForeignKey("sessions.id"), index=True)  # sessions 테이블 참조
     user_location = Column(String)  # 사용자의 지역 정보
-    user_agent = Column(String)  # 사용자의 User-Agent 정보
+    country = Column(String)  # 국가
+    city = Column(String)  # 도시
+    region = Column(String)  # 국내 지역 (korea.location_dict 기준)
+    user_agent = Column(String)  # 사용자의 User-Agent 정보 (user_agent_id 이관 전 데이터)
+    user_agent_id = Column(Integer, ForeignKey("user_agents.id"), index=True)  # user_agents 테이블 참조
     is_mobile = Column(Integer)  # 모바일 기기 여부
     is_pc = Column(Integer)  # PC 기기 여부
     referer_url = Column(String) # 이전 url 추가
@@ -23,13 +52,20 @@ class Pageview(Base):
 
 class AnchorClick(Base):
     __tablename__ = "anchor_clicks"
+    __table_args__ = (
+        Index("ix_anchor_clicks_source_host_timestamp", "source_host", "timestamp"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     timestamp = Column(DateTime, default=lambda: datetime.now(KST))
     source_url = Column(String)  # 사용자가 클릭한 링크의 출발 URL
+    source_host = Column(String)  # 출발 URL의 host (소문자)
+    source_path = Column(String)  # 출발 URL의 path
     target_url = Column(String)  # 사용자가 클릭한 링크의 도착 URL
     ip_address = Column(String) # 사용자 IP
-    session_id = Column(String) # 사용자 session ID
-    user_agent = Column(String)  # 사용자의 User-Agent 정보
+    session_id = Column(String) # 사용자 session ID (session_pk 이관 전 데이터)
+    session_pk = Column(Integer, ForeignKey("sessions.id"), index=True)  # sessions 테이블 참조
+    user_agent = Column(String)  # 사용자의 User-Agent 정보 (user_agent_id 이관 전 데이터)
+    user_agent_id = Column(Integer, ForeignKey("user_agents.id"), index=True)  # user_agents 테이블 참조
     is_mobile = Column(Integer)  # 모바일 기기 여부
     is_pc = Column(Integer)  # PC 기기 여부
     type = Column(String)
@@ -40,11 +76,60 @@ class WenivSql(Base):
     timestamp = Column(DateTime, default=lambda: datetime.now(KST))
     contents = Column(String)  # run sql 한 내용
     ip_address = Column(String) # 사용자 IP
-    session_id = Column(String) # 사용자 session ID
-    user_agent = Column(String)  # 사용자의 User-Agent 정보
+    session_id = Column(String) # 사용자 session ID (session_pk 이관 전 데이터)
+    session_pk = Column(Integer, ForeignKey("sessions.id"), index=True)  # sessions 테이블 참조
+    user_agent = Column(String)  # 사용자의 User-Agent 정보 (user_agent_id 이관 전 데이터)
+    user_agent_id = Column(Integer, ForeignKey("user_agents.id"), index=True)  # user_agents 테이블 참조
     is_mobile = Column(Integer)  # 모바일 기기 여부
     is_pc = Column(Integer)  # PC 기기 여부
 
+class PageviewRollup(Base):
+    __tablename__ = "pageview_rollups"
+    __table_args__ = (
+        Index("ix_pageview_rollups_host_metric_bucket", "host", "metric", "bucket"),
+    )
+    id = Column(Integer, primary_key=True, index=True)
+    bucket = Column(DateTime)  # 집계 구간 시작 (total은 시간 단위, 그 외 차원은 일 단위)
+    host = Column(String)  # 집계 대상 host
+    metric = Column(String)  # 집계 지표: pageviews(접속횟수)만 저장
+    dimension = Column(String)  # total, device, os, browser, country, city
+    value = Column(String)  # 차원 값 (total은 빈 문자열)
+    count = Column(Integer)
+
+class RollupState(Base):
+    __tablename__ = "rollup_state"
+    name = Column(String, primary_key=True)
+    watermark = Column(DateTime)  # 이 날짜 이전까지 집계 완료
+
+class SessionSketch(Base):
+    __tablename__ = "session_sketches"
+    __table_args__ = (
+        Index("ix_session_sketches_host_day", "host", "day", unique=True),
+    )
+    id = Column(Integer, primary_key=True, index=True)
+    host = Column(String)  # pageview host
+    day = Column(DateTime)  # 날짜 (KST)
+    registers = Column(LargeBinary)  # session_id HyperLogLog 레지스터 (zlib 압축)
+
+class SessionBitmap(Base):
+    __tablename__ = "session_bitmaps"
+    __table_args__ = (
+        Index("ix_session_bitmaps_host_day", "host", "day", unique=True),
+    )
+    id = Column(Integer, primary_key=True, index=True)
+    host = Column(String)  # pageview host
+    day = Column(DateTime)  # 날짜 (KST)
+    bitmap = Column(LargeBinary)  # 접속한 세션(sessions.id) 비트맵
+
+class EventPartition(Base):
+    __tablename__ = "event_partitions"
+    month = Column(String, primary_key=True)  # YYYYMM
+    status = Column(String)  # detached: 월 파일로 분리됨, archived: 압축 보관됨 (조회 제외)
+    path = Column(String)  # 월 파일 경로
+    rows = Column(Integer)  # 분리된 이벤트 행 수
+    detached_at = Column(DateTime)
+    parquet = Column(String)  # Parquet로 내보낸 디렉터리 (coldstore.py, 없으면 월 파일만 사용)
+
 # 수집할 데이터의 모델 정의
 class PageviewData(BaseModel):
     url: str
@@ -57,3 +142,17 @@ class AnchorClickData(BaseModel):
 
 class WenivSqlData(BaseModel):
     contents:str
+
+class BatchEventData(BaseModel):
+    event: str  # pageview, anchor-click
+    url: Optional[str] = None  # pageview
+    referer: Optional[str] = None  # pageview 이전 url (없으면 Referer 헤더)
+    source_url: Optional[str] = None  # anchor-click
+    target_url: Optional[str] = None  # anchor-click
+    type: Optional[str] = None  # anchor-click
+    ts: Optional[int] = None  # 이벤트 발생 시각 (클라이언트 epoch ms)
+
+class BatchData(BaseModel):
+    session_id: Optional[str] = None
+    sent_at: Optional[int] = None  # 전송 시각 (클라이언트 epoch ms, ts와의 차이로 서버 시각을 계산)
+    events: List[BatchEventData] = Field(default_factory=list)
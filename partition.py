@@ -0,0 +1,246 @@
+"""월 단위 이벤트 파티션 관리
+
+지난 달의 이벤트(pageviews, anchor_clicks, wenivsql_data)를 라이브 DB에서 월별 SQLite 파일로 분리합니다.
+분리된 달은 조회 기간과 겹칠 때만 읽습니다.
+
+    python partition.py list
+    python partition.py detach YYYYMM [--vacuum]   # 라이브 DB -> partitions/analytics-YYYYMM.db
+    python partition.py detach --before YYYYMM     # YYYYMM 이전 달 모두 분리
+    python partition.py archive YYYYMM             # 월 파일을 archive/에 압축 보관 (조회 제외)
+    python partition.py restore YYYYMM             # 압축 보관된 월 파일을 다시 조회 대상으로
+"""
+import argparse
+import gzip
+import os
+import shutil
+from contextlib import contextmanager
+from datetime import datetime
+import pandas as pd
+import polars as pl
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from models import Base, Pageview, AnchorClick, WenivSql, UserAgent, Session, EventPartition
+from columnar import fetch_frame
+from storage import writer_engine, WriteSession, create_reader_engine
+from utils import KST
+from profiling import stage
+
+PARTITION_DIR = os.getenv("PARTITION_DIR", "./partitions")  # 분리된 월 파일 위치
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "./archive")  # 압축 보관 위치
+PARTITION_POOL_SIZE = int(os.getenv("PARTITION_POOL_SIZE", "2"))  # 월 파일별 읽기 연결 수
+
+EVENT_TABLES = [Pageview.__table__, AnchorClick.__table__, WenivSql.__table__]
+DIMENSION_TABLES = [UserAgent.__table__, Session.__table__]
+
+_engines = {}
+
+
+def month_key(date):
+    return date.strftime("%Y%m")
+
+
+def month_bounds(month):
+    # [월 시작, 다음 달 시작)
+    start = datetime.strptime(month, "%Y%m")
+    end = (start.replace(day=28) + pd.Timedelta(days=4)).replace(day=1)
+    return start, end
+
+
+def months_between(start_date, end_date):
+    return [month_key(date) for date in pd.date_range(start_date.replace(day=1), end_date, freq='MS')]
+
+
+def partition_path(month):
+    return os.path.join(PARTITION_DIR, f"analytics-{month}.db")
+
+
+def partition_engine(path):
+    if path not in _engines:
+        _engines[path] = create_reader_engine(f"sqlite:///{path}", wal=False, pool_size=PARTITION_POOL_SIZE)
+    return _engines[path]
+
+
+def detached_partitions(db, start_date, end_date):
+    # 조회 기간과 겹치는 분리된 달 {YYYYMM: 파일 경로}
+    months = months_between(start_date, end_date)
+    rows = db.query(EventPartition.month, EventPartition.path).filter(
+        EventPartition.status == "detached", EventPartition.month.in_(months),
+    ).all()
+    return dict(rows)
+
+
+@contextmanager
+def range_sources(db, start_date, end_date):
+    """조회 기간과 겹치는 데이터 소스 세션 목록: 분리된 월 파일(오래된 순) + 라이브 DB
+    분리된 달이라도 분리 후 늦게 저장된 이벤트는 라이브 DB에 있으므로 라이브 DB는 항상 읽습니다."""
+    partitions = detached_partitions(db, start_date, end_date)
+    sessions = [sessionmaker(bind=partition_engine(path))() for _, path in sorted(partitions.items())]
+    try:
+        yield sessions + [db]
+    finally:
+        for session in sessions:
+            session.close()
+
+
+def fetch_partitioned(db, stmt, start_date, end_date, engine: str = "pandas", cold=None, **options):
+    """fetch_frame과 같지만 조회 기간과 겹치는 월 파일까지 읽어서 합칩니다. (오래된 달부터, 라이브 DB는 마지막)
+    cold(month)가 frame을 돌려주는 달은 월 파일 대신 그 frame을 사용합니다. (coldstore.py의 Parquet)"""
+    partitions = detached_partitions(db, start_date, end_date)
+    frames = []
+    for month, path in sorted(partitions.items()):
+        with stage("parquet"):
+            frame = cold(month) if cold else None
+        if frame is None:
+            session = sessionmaker(bind=partition_engine(path))()
+            try:
+                frame = fetch_frame(session, stmt, engine=engine, **options)
+            finally:
+                session.close()
+        frames.append(frame)
+    # 라이브 DB는 항상 읽습니다. (분리된 달에 늦게 저장된 이벤트 포함)
+    frames.append(fetch_frame(db, stmt, engine=engine, **options))
+
+    # 빈 frame은 합치지 않습니다. (컬럼 타입이 빈 frame의 object 타입으로 바뀌지 않도록)
+    frames = [frame for frame in frames if len(frame)] or frames[-1:]
+    if len(frames) == 1:
+        return frames[0]
+    if engine == "polars":
+        return pl.concat(frames, how="vertical_relaxed")
+    return pd.concat(frames, ignore_index=True)
+
+
+def _columns(table):
+    return ", ".join(column.name for column in table.columns)
+
+
+def detach_month(month, engine=writer_engine):
+    """한 달치 이벤트를 월 파일로 옮기고 라이브 DB에서 지웁니다. (참조하는 user_agents, sessions 행은 복사)"""
+    if month >= month_key(datetime.now(KST)):
+        raise ValueError(f"{month}: 지난 달만 분리할 수 있습니다.")
+    start, end = [date.strftime("%Y-%m-%d %H:%M:%S") for date in month_bounds(month)]
+    path = partition_path(month)
+
+    db = WriteSession(bind=engine)
+    try:
+        if db.get(EventPartition, month) is not None:
+            raise ValueError(f"{month}: 이미 분리된 달입니다.")
+    finally:
+        db.close()
+
+    # 이전에 중단된 분리 작업의 파일은 새로 만듭니다.
+    os.makedirs(PARTITION_DIR, exist_ok=True)
+    if os.path.exists(path):
+        os.remove(path)
+    partition = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=partition, tables=EVENT_TABLES + DIMENSION_TABLES)
+    partition.dispose()
+
+    rows = 0
+    with engine.connect() as conn:
+        conn.exec_driver_sql("ATTACH DATABASE ? AS part", (path,))
+        try:
+            params = {"start": start, "end": end}
+            for table in EVENT_TABLES:
+                columns = _columns(table)
+                rows += conn.execute(text(
+                    f"INSERT INTO part.{table.name} ({columns}) SELECT {columns} FROM main.{table.name} "
+                    f"WHERE timestamp >= :start AND timestamp < :end"
+                ), params).rowcount
+            conn.execute(text(
+                f"INSERT INTO part.user_agents ({_columns(UserAgent.__table__)}) "
+                f"SELECT {_columns(UserAgent.__table__)} FROM main.user_agents WHERE id IN ("
+                + " UNION ".join(f"SELECT user_agent_id FROM part.{table.name}" for table in EVENT_TABLES) + ")"
+            ))
+            conn.execute(text(
+                f"INSERT INTO part.sessions ({_columns(Session.__table__)}) "
+                f"SELECT {_columns(Session.__table__)} FROM main.sessions WHERE id IN ("
+                + " UNION ".join(f"SELECT session_pk FROM part.{table.name}" for table in EVENT_TABLES) + ") OR session_id IN ("
+                + " UNION ".join(f"SELECT session_id FROM part.{table.name} WHERE session_pk IS NULL" for table in EVENT_TABLES) + ")"
+            ))
+            conn.commit()
+
+            for table in EVENT_TABLES:
+                conn.execute(text(f"DELETE FROM main.{table.name} WHERE timestamp >= :start AND timestamp < :end"), params)
+            conn.execute(
+                text("INSERT INTO event_partitions (month, status, path, rows, detached_at) VALUES (:month, 'detached', :path, :rows, :now)"),
+                {"month": month, "path": path, "rows": rows, "now": datetime.now(KST).replace(tzinfo=None)},
+            )
+            conn.commit()
+        finally:
+            conn.rollback()
+            conn.exec_driver_sql("DETACH DATABASE part")
+    return rows
+
+
+def archive_month(month):
+    # 월 파일을 압축해서 보관하고 조회 대상에서 제외합니다.
+    db = WriteSession()
+    try:
+        partition = db.get(EventPartition, month)
+        if partition is None or partition.status != "detached":
+            raise ValueError(f"{month}: 분리된 달이 아닙니다.")
+        os.makedirs(ARCHIVE_DIR, exist_ok=True)
+        archive = os.path.join(ARCHIVE_DIR, os.path.basename(partition.path) + ".gz")
+        with open(partition.path, "rb") as source, gzip.open(archive, "wb") as target:
+            shutil.copyfileobj(source, target)
+        partition.status = "archived"
+        db.commit()
+        _engines.pop(partition.path, None)
+        os.remove(partition.path)
+        return archive
+    finally:
+        db.close()
+
+
+def restore_month(month):
+    db = WriteSession()
+    try:
+        partition = db.get(EventPartition, month)
+        if partition is None or partition.status != "archived":
+            raise ValueError(f"{month}: 압축 보관된 달이 아닙니다.")
+        archive = os.path.join(ARCHIVE_DIR, os.path.basename(partition.path) + ".gz")
+        os.makedirs(os.path.dirname(partition.path) or ".", exist_ok=True)
+        with gzip.open(archive, "rb") as source, open(partition.path, "wb") as target:
+            shutil.copyfileobj(source, target)
+        partition.status = "detached"
+        db.commit()
+        return partition.path
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="월 단위 이벤트 파티션 관리")
+    parser.add_argument("command", choices=["list", "detach", "archive", "restore"])
+    parser.add_argument("month", nargs="?", help="YYYYMM")
+    parser.add_argument("--before", help="detach: 이 달(YYYYMM) 이전의 달을 모두 분리")
+    parser.add_argument("--vacuum", action="store_true", help="detach 후 라이브 DB VACUUM 실행")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=writer_engine)
+
+    if args.command == "list":
+        db = WriteSession()
+        for partition in db.query(EventPartition).order_by(EventPartition.month):
+            print(partition.month, partition.status, partition.rows, partition.path)
+        db.close()
+    elif args.command == "detach":
+        if args.before:
+            with writer_engine.connect() as conn:
+                first = conn.execute(text(
+                    "SELECT min(first) FROM (" + " UNION ALL ".join(f"SELECT min(timestamp) AS first FROM {table.name}" for table in EVENT_TABLES) + ")"
+                )).scalar()
+                detached = {row[0] for row in conn.execute(text("SELECT month FROM event_partitions"))}
+            months = months_between(datetime.fromisoformat(first), month_bounds(args.before)[0]) if first else []
+            months = [month for month in months if month < args.before and month not in detached]
+        else:
+            months = [args.month]
+        for month in months:
+            print(month, detach_month(month), "rows")
+        if args.vacuum:
+            with writer_engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                conn.execute(text("VACUUM"))
+    elif args.command == "archive":
+        print(archive_month(args.month))
+    else:
+        print(restore_month(args.month))
@@ -0,0 +1,198 @@
+"""요청 단계별 처리 시간 (Server-Timing 헤더, ?profile=1)
+
+핸들러와 조회 함수는 stage(이름)으로 구간을 표시하고, ServerTimingMiddleware가 응답 헤더로 내보냅니다.
+구간이 겹치면 안쪽 구간 시간은 바깥 구간에서 빼므로 단계별 시간의 합은 전체 시간을 넘지 않습니다.
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+from contextvars import ContextVar
+from urllib.parse import parse_qs
+
+# 요청 프로파일링 설정 (환경 변수로 조정 가능)
+SERVER_TIMING = os.getenv("SERVER_TIMING", "1") == "1"  # Server-Timing 헤더 응답 여부
+REQUEST_PROFILING = os.getenv("REQUEST_PROFILING", "0") == "1"  # ?profile=1 허용 여부 (기본: 허용하지 않음)
+PROFILE_TOP_N = int(os.getenv("PROFILE_TOP_N", "30"))  # 프로파일 요약에 포함할 함수 수 (누적 시간 순)
+
+_timing = ContextVar("request_timing", default=None)
+_profile_lock = threading.Lock()  # cProfile은 한 번에 한 요청만
+
+
+class RequestTiming:
+    """한 요청의 단계별 시간 (스레드별 구간 스택으로 안쪽 구간 시간을 바깥 구간에서 뺍니다)"""
+
+    def __init__(self, profile: bool = False):
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.handler_done = None
+        self.cache = None
+        self.profiler = cProfile.Profile() if profile else None
+        self.lock = threading.Lock()
+        self._local = threading.local()
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def add(self, name, seconds):
+        # 바깥 구간(같은 스레드)이 있으면 그 구간 시간에서 뺍니다.
+        stack = self._stack()
+        if stack:
+            stack[-1][1] += seconds
+        with self.lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def header(self, now):
+        entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.stages.items()]
+        if self.cache:
+            entries.append(f"cache;desc={self.cache}")
+        entries.append(f"total;dur={(now - self.started) * 1000:.1f}")
+        return ", ".join(entries)
+
+    def summary(self, now):
+        return {
+            "server_timing": {name: round(seconds * 1000, 2) for name, seconds in self.stages.items()},
+            "total_ms": round((now - self.started) * 1000, 2),
+            "cache": self.cache,
+        }
+
+    def profile_text(self):
+        # 프로파일로 실행한 함수가 없는 요청(/metrics, collect 등)은 빈 요약
+        if not self.profiler.getstats():
+            return ""
+        out = io.StringIO()
+        stats = pstats.Stats(self.profiler, stream=out)
+        stats.sort_stats("cumulative").print_stats(PROFILE_TOP_N)
+        return out.getvalue()
+
+
+class _Stage:
+    __slots__ = ("timing", "name", "started")
+
+    def __init__(self, timing, name):
+        self.timing, self.name = timing, name
+
+    def __enter__(self):
+        if self.timing is not None:
+            self.timing._stack().append([self.name, 0.0])
+            self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self.timing is not None:
+            elapsed = time.perf_counter() - self.started
+            _, inner = self.timing._stack().pop()
+            self.timing.add(self.name, elapsed - inner)
+
+
+def stage(name):
+    """with stage("fetch"): ... 처리 중인 요청이 없으면 아무것도 기록하지 않습니다."""
+    return _Stage(_timing.get(), name)
+
+
+def add_stage(name, seconds):
+    # 따로 잰 시간을 기록합니다. (SQL 실행 시간, 집계 프로세스의 집계 시간 등)
+    timing = _timing.get()
+    if timing is not None:
+        timing.add(name, seconds)
+
+
+def handler_done(cache=None):
+    # 핸들러 반환 시점 (이후 응답 헤더까지는 json 단계), cache: hit, miss
+    timing = _timing.get()
+    if timing is not None:
+        timing.handler_done = time.perf_counter()
+        timing.cache = cache
+
+
+def profiling():
+    timing = _timing.get()
+    return timing is not None and timing.profiler is not None
+
+
+def profiled_call(func, *args, **kwargs):
+    """?profile=1 요청이면 현재 스레드에서 cProfile로 func를 실행합니다."""
+    timing = _timing.get()
+    if timing is None or timing.profiler is None:
+        return func(*args, **kwargs)
+    return timing.profiler.runcall(func, *args, **kwargs)
+
+
+def _wants_profile(scope):
+    if not REQUEST_PROFILING or b"profile=" not in scope.get("query_string", b""):
+        return False
+    return parse_qs(scope["query_string"].decode("latin-1")).get("profile", [""])[0] in ("1", "true")
+
+
+class ServerTimingMiddleware:
+    """요청마다 RequestTiming을 만들고 응답에 Server-Timing 헤더를 붙이는 ASGI 미들웨어
+    ?profile=1이면 JSON 응답을 {"response", "server_timing", "total_ms", "cache", "profile"}로 감싸서 돌려줍니다."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not SERVER_TIMING:
+            return await self.app(scope, receive, send)
+
+        profile = _wants_profile(scope) and _profile_lock.acquire(blocking=False)
+        timing = RequestTiming(profile=profile)
+        token = _timing.set(timing)
+        try:
+            if profile:
+                await self._profiled(scope, receive, send, timing)
+            else:
+                await self.app(scope, receive, self._timed_send(send, timing))
+        finally:
+            _timing.reset(token)
+            if profile:
+                _profile_lock.release()
+
+    @staticmethod
+    def _finish(timing, headers):
+        now = time.perf_counter()
+        if timing.handler_done is not None:
+            timing.add("json", now - timing.handler_done)
+        headers.append((b"server-timing", timing.header(now).encode("latin-1")))
+        return now
+
+    def _timed_send(self, send, timing):
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message = dict(message)
+                message["headers"] = list(message.get("headers", []))
+                self._finish(timing, message["headers"])
+            await send(message)
+        return send_wrapper
+
+    async def _profiled(self, scope, receive, send, timing):
+        # 응답 본문을 모아서 프로파일 요약과 함께 다시 만듭니다.
+        start, chunks = None, []
+
+        async def send_wrapper(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        await self.app(scope, receive, send_wrapper)
+
+        headers = [(k, v) for k, v in start.get("headers", []) if k.lower() not in (b"content-length", b"content-type")]
+        now = self._finish(timing, headers)
+        body = b"".join(chunks)
+        try:
+            response = json.loads(body) if body else None
+        except ValueError:
+            response = body.decode("utf-8", "replace")
+        payload = {"response": response, **timing.summary(now), "profile": timing.profile_text()}
+        body = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+        headers += [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+        await send({"type": "http.response.start", "status": start["status"], "headers": headers})
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,46 @@
+import asyncio
+import os
+import httpx
+from openai import AsyncOpenAI
+
+# 외부 API 호출 설정 (환경 변수로 조정 가능)
+REMOTE_TIMEOUT = float(os.getenv("REMOTE_TIMEOUT", "60"))  # 요청 타임아웃(초)
+REMOTE_CONCURRENCY = int(os.getenv("REMOTE_CONCURRENCY", "8"))  # 동시 요청 수
+
+_http_client = None
+_openai_client = None
+_semaphore = None
+
+
+def get_http_client():
+    # 커넥션 풀을 공유하는 비동기 HTTP 클라이언트
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(REMOTE_TIMEOUT, connect=10.0),
+            limits=httpx.Limits(max_connections=REMOTE_CONCURRENCY, max_keepalive_connections=REMOTE_CONCURRENCY),
+        )
+    return _http_client
+
+
+def get_openai_client():
+    global _openai_client
+    if _openai_client is None:
+        _openai_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), http_client=get_http_client())
+    return _openai_client
+
+
+def remote_slot():
+    # 동시 외부 호출 수 제한: async with remote_slot(): ...
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(REMOTE_CONCURRENCY)
+    return _semaphore
+
+
+async def close_http_client():
+    global _http_client, _openai_client
+    if _http_client is not None:
+        await _http_client.aclose()
+    _http_client = None
+    _openai_client = None
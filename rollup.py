@@ -0,0 +1,168 @@
+"""시간 단위 pageview 집계(pageview_rollups) 관리
+
+    python rollup.py rebuild [--start YYYYMMDD] [--end YYYYMMDD]
+"""
+import argparse
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+import pandas as pd
+from sqlalchemy import delete, func, insert
+from models import Base, Pageview, PageviewRollup, RollupState
+from analytics import load_pageviews, aggregate_events
+from utils import KST, logger
+from storage import writer_engine, WriteSession, ReadSession
+
+ROLLUP_INTERVAL = float(os.getenv("ROLLUP_INTERVAL", "300"))  # 집계 주기(초)
+ROLLUP_GRACE = timedelta(minutes=10)  # 하루가 끝난 뒤 늦게 저장되는 이벤트를 기다리는 시간
+
+
+def get_watermark(db):
+    state = db.get(RollupState, "pageviews")
+    return state.watermark if state else None
+
+
+def _set_watermark(db, watermark):
+    state = db.get(RollupState, "pageviews")
+    if state is None:
+        db.add(RollupState(name="pageviews", watermark=watermark))
+    else:
+        state.watermark = watermark
+
+
+def rollup_day(db, day, read_db=None):
+    # 하루치 집계를 다시 계산해서 저장 (호출한 쪽에서 commit)
+    # read_db를 주면 원본은 읽기 전용 연결에서 읽고, 쓰기 연결은 저장할 때만 사용합니다.
+    next_day = day + timedelta(days=1)
+    events = load_pageviews(
+        read_db or db, Pageview.host.isnot(None), Pageview.timestamp >= day, Pageview.timestamp < next_day, period=(day, day),
+    )
+    rows = aggregate_events(events)
+
+    db.execute(delete(PageviewRollup).where(PageviewRollup.bucket >= day, PageviewRollup.bucket < next_day))
+    if not rows.empty:
+        db.execute(insert(PageviewRollup), rows.to_dict('records'))
+    return len(rows)
+
+
+def compact(session_factory, now=None, read_session_factory=ReadSession):
+    """집계가 끝나지 않은 지난 날짜들을 하루씩 집계하고 watermark를 옮깁니다.
+    쓰기 연결은 하루치를 저장할 때만 잡으므로 그 사이에 collect 저장이 끼어들 수 있습니다.
+    읽기 트랜잭션도 하루마다 새로 열어서 WAL checkpoint가 전체 집계 동안 막히지 않게 합니다."""
+    now = now or datetime.now(KST).replace(tzinfo=None)
+    last_day = (now - ROLLUP_GRACE).replace(hour=0, minute=0, second=0, microsecond=0)
+
+    read_db = read_session_factory()
+    try:
+        day = get_watermark(read_db)
+        if day is None:
+            first = read_db.query(func.min(Pageview.timestamp)).scalar()
+            if first is None:
+                return 0
+            day = first.replace(hour=0, minute=0, second=0, microsecond=0)
+    finally:
+        read_db.close()
+
+    compacted = 0
+    while day < last_day:
+        read_db = read_session_factory()
+        db = session_factory()
+        try:
+            rollup_day(db, day, read_db)
+            read_db.close()
+            day += timedelta(days=1)
+            _set_watermark(db, day)
+            db.commit()
+        finally:
+            db.close()
+            read_db.close()
+        compacted += 1
+    return compacted
+
+
+def rebuild_rollups(session_factory, start=None, end=None):
+    """원본 데이터로 집계를 다시 만듭니다. 범위를 주지 않으면 전체를 다시 만듭니다."""
+    db = session_factory()
+    try:
+        if start is None:
+            db.execute(delete(PageviewRollup))
+            db.execute(delete(RollupState))
+            db.commit()
+        else:
+            watermark = get_watermark(db)
+            end = min(end, watermark - timedelta(days=1)) if watermark else start - timedelta(days=1)
+            day = start
+            while day <= end:
+                rollup_day(db, day)
+                db.commit()
+                day += timedelta(days=1)
+    finally:
+        db.close()
+    return compact(session_factory)
+
+
+def current_watermark(session_factory=ReadSession):
+    db = session_factory()
+    try:
+        return get_watermark(db)
+    finally:
+        db.close()
+
+
+async def run_compactor(session_factory, interval: float = ROLLUP_INTERVAL, on_watermark=None):
+    # on_watermark(watermark): 집계 후 watermark를 알려줍니다. (응답 캐시 TTL 기준)
+    while True:
+        try:
+            await asyncio.to_thread(compact, session_factory)
+            if on_watermark is not None:
+                on_watermark(await asyncio.to_thread(current_watermark))
+        except Exception as e:
+            logger.log(logging.DEBUG, f"Error: {e}")
+        await asyncio.sleep(interval)
+
+
+def load_rollups(db, hosts, start_date, end_date):
+    """기간 내 접속횟수 집계를 읽습니다. watermark 이후(아직 집계되지 않은 날짜)는 원본을 바로 집계해서 합칩니다."""
+    end = end_date.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+    watermark = get_watermark(db) or start_date
+    split = min(max(watermark, start_date), end)
+
+    rows = (
+        db.query(PageviewRollup.bucket, PageviewRollup.dimension, PageviewRollup.value, PageviewRollup.count)
+        .filter(
+            PageviewRollup.host.in_(hosts),
+            PageviewRollup.metric == "pageviews",
+            PageviewRollup.bucket >= start_date,
+            PageviewRollup.bucket < split,
+        )
+        .all()
+    )
+    frame = pd.DataFrame(rows, columns=['bucket', 'dimension', 'value', 'count'])
+
+    if split < end:
+        events = load_pageviews(db, Pageview.host.in_(hosts), Pageview.timestamp >= split, Pageview.timestamp < end)
+        recent = aggregate_events(events)[['bucket', 'dimension', 'value', 'count']]
+        frame = pd.concat([frame, recent], ignore_index=True) if not frame.empty else recent
+
+    frame['bucket'] = pd.to_datetime(frame['bucket'])
+    return frame
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="pageview 집계 관리")
+    parser.add_argument("command", choices=["rebuild", "compact"])
+    parser.add_argument("--start", help="YYYYMMDD")
+    parser.add_argument("--end", help="YYYYMMDD")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=writer_engine)
+    SessionLocal = WriteSession
+
+    if args.command == "rebuild":
+        start = datetime.strptime(args.start, "%Y%m%d") if args.start else None
+        end = datetime.strptime(args.end, "%Y%m%d") if args.end else datetime.now(KST).replace(tzinfo=None)
+        days = rebuild_rollups(SessionLocal, start, end)
+    else:
+        days = compact(SessionLocal)
+    print(f"{days} days compacted")
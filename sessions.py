@@ -0,0 +1,82 @@
+from sqlalchemy import and_, func, select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import aliased
+from models import Session, Pageview
+
+# 이관 전 행(session_pk가 없는 행)의 session_id 문자열로 찾는 sessions 테이블
+LegacySession = aliased(Session)
+
+
+def session_key(model):
+    """이벤트 행의 세션 키: session_pk (이관 전 행은 sessions 테이블의 id, 등록되지 않은 세션은 원본 문자열)
+    쿼리에 outerjoin(*legacy_session_join(model))을 함께 붙여야 합니다."""
+    return func.coalesce(model.session_pk, LegacySession.id, model.session_id)
+
+
+def legacy_session_join(model):
+    return LegacySession, and_(model.session_pk.is_(None), LegacySession.session_id == model.session_id)
+
+
+class SessionDimension:
+    """session_id 문자열을 sessions 테이블의 정수 id로 바꿔주는 매핑 캐시"""
+
+    def __init__(self, max_entries: int = 200000):
+        self.max_entries = max_entries
+        self._ids = {}
+
+    def clear(self):
+        # 저장이 실패하면 그 트랜잭션에서 추가한 id가 없어지므로 캐시를 비웁니다.
+        self._ids.clear()
+
+    def resolve(self, db, session_ids, seen=None):
+        # 처음 보는 session_id는 sessions 테이블에 추가합니다.
+        # seen: {session_id: (first_seen, last_seen, landing_url)} 배치에서 본 시각과 첫 pageview URL
+        if len(self._ids) > self.max_entries:
+            self._ids.clear()
+
+        seen = seen or {}
+        targets = list({s for s in session_ids if s is not None and (s not in self._ids or s in seen)})
+        for i in range(0, len(targets), 500):
+            chunk = targets[i:i + 500]
+            values = []
+            for s in chunk:
+                first_seen, last_seen, landing_url = seen.get(s, (None, None, None))
+                values.append({"session_id": s, "first_seen": first_seen, "last_seen": last_seen, "landing_url": landing_url})
+            stmt = insert(Session).values(values)
+            db.execute(stmt.on_conflict_do_update(
+                index_elements=["session_id"],
+                set_={
+                    "first_seen": func.coalesce(func.min(Session.first_seen, stmt.excluded.first_seen), Session.first_seen, stmt.excluded.first_seen),
+                    "last_seen": func.coalesce(func.max(Session.last_seen, stmt.excluded.last_seen), Session.last_seen, stmt.excluded.last_seen),
+                    "landing_url": func.coalesce(Session.landing_url, stmt.excluded.landing_url),
+                },
+            ))
+            missing = [s for s in chunk if s not in self._ids]
+            if missing:
+                for id_, s in db.execute(select(Session.id, Session.session_id).where(Session.session_id.in_(missing))):
+                    self._ids[s] = id_
+
+        return {s: self._ids.get(s) for s in session_ids}
+
+    def assign(self, db, batch):
+        # ingest 훅: 이벤트 행의 session_id 문자열을 session_pk로 바꿔 저장하고, 세션의 접속 시각을 갱신합니다.
+        seen = {}
+        for row in batch:
+            if row.session_id is None or row.session_pk is not None:
+                continue
+            timestamp = row.timestamp.replace(tzinfo=None)
+            landing_url = row.url if isinstance(row, Pageview) else None
+            if row.session_id not in seen:
+                seen[row.session_id] = (timestamp, timestamp, landing_url)
+            else:
+                first_seen, last_seen, first_url = seen[row.session_id]
+                seen[row.session_id] = (min(first_seen, timestamp), max(last_seen, timestamp), first_url or landing_url)
+
+        ids = self.resolve(db, seen, seen)
+        for row in batch:
+            if row.session_id in ids:
+                row.session_pk = ids[row.session_id]
+                row.session_id = None
+
+
+session_dimension = SessionDimension()
@@ -0,0 +1,93 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import text
+from storage import QuerySession
+from sqlresults import sql_results
+
+# /analytics/sql, /analytics/ai 쿼리 실행 설정 (환경 변수로 조정 가능)
+SQL_WORKERS = int(os.getenv("SQL_WORKERS", "2"))  # 동시에 실행하는 쿼리 수 (나머지는 대기)
+SQL_TIMEOUT = float(os.getenv("SQL_TIMEOUT", "30"))  # 쿼리별 실행 시간 제한(초)
+SQL_PROGRESS_STEPS = int(os.getenv("SQL_PROGRESS_STEPS", "10000"))  # 진행 확인 간격 (SQLite VM 명령 수)
+SQL_DISCONNECT_POLL = float(os.getenv("SQL_DISCONNECT_POLL", "0.5"))  # 클라이언트 연결 확인 간격(초)
+
+_executor = ThreadPoolExecutor(max_workers=SQL_WORKERS, thread_name_prefix="sql")
+
+
+class QueryInterrupted(Exception):
+    pass
+
+
+class _Deadline:
+    """쿼리 중단 조건: 시간 초과 또는 취소(클라이언트 연결 끊김)"""
+
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self.cancelled = threading.Event()
+        self.expires = None
+
+    def start(self):
+        self.expires = time.monotonic() + self.timeout
+
+    def expired(self):
+        return self.expires is not None and time.monotonic() > self.expires
+
+    def __call__(self):
+        # SQLite progress handler: 0이 아닌 값을 돌려주면 실행 중인 쿼리를 중단합니다.
+        return 1 if self.cancelled.is_set() or self.expired() else 0
+
+
+def _execute(sql, deadline):
+    if deadline.cancelled.is_set():
+        raise QueryInterrupted("클라이언트 연결이 끊겨 쿼리를 취소했습니다.")
+    db = QuerySession()
+    try:
+        connection = db.connection().connection.dbapi_connection
+        connection.set_progress_handler(deadline, SQL_PROGRESS_STEPS)
+        deadline.start()
+        try:
+            # 커서를 읽어 결과 파일로 저장하는 동안에도 중단 조건을 확인합니다.
+            return sql_results.save(db.execute(text(sql)))
+        except Exception:
+            if deadline.expired():
+                raise QueryInterrupted(f"쿼리 실행 시간이 {deadline.timeout:g}초를 넘어 중단했습니다.")
+            if deadline.cancelled.is_set():
+                raise QueryInterrupted("클라이언트 연결이 끊겨 쿼리를 취소했습니다.")
+            raise
+        finally:
+            connection.set_progress_handler(None, 0)
+    finally:
+        db.close()
+
+
+async def run_query(sql, request=None, timeout: float = SQL_TIMEOUT):
+    """읽기 전용 연결로 쿼리를 워커 스레드에서 실행하고 결과를 sql_results에 저장합니다. (sql_results.save의 메타 정보 반환)
+    시간 제한을 넘거나 요청한 클라이언트의 연결이 끊기면 QueryInterrupted"""
+    deadline = _Deadline(timeout)
+    future = asyncio.get_running_loop().run_in_executor(_executor, _execute, sql, deadline)
+    try:
+        while True:
+            done, _ = await asyncio.wait({future}, timeout=SQL_DISCONNECT_POLL)
+            if done:
+                return future.result()
+            if request is not None and not deadline.cancelled.is_set() and await request.is_disconnected():
+                deadline.cancelled.set()
+    except asyncio.CancelledError:
+        deadline.cancelled.set()
+        raise
+
+
+async def cancel_on_disconnect(request, awaitable):
+    """요청한 클라이언트의 연결이 끊기면 awaitable(외부 API 호출 등)을 취소하고 QueryInterrupted"""
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=SQL_DISCONNECT_POLL)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                raise QueryInterrupted("클라이언트 연결이 끊겨 요청을 취소했습니다.")
+    finally:
+        task.cancel()
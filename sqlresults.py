@@ -0,0 +1,225 @@
+import asyncio
+import csv
+import io
+import itertools
+import json
+import logging
+import os
+import re
+import time
+import uuid
+import polars as pl
+from utils import logger
+
+# /analytics/sql 결과 보관 설정 (환경 변수로 조정 가능)
+SQL_RESULT_DIR = os.getenv("SQL_RESULT_DIR", "./sql_results")  # 결과 파일 위치
+SQL_RESULT_TTL = float(os.getenv("SQL_RESULT_TTL", str(60 * 60)))  # 결과 보관 시간(초)
+SQL_RESULT_MAX_ROWS = int(os.getenv("SQL_RESULT_MAX_ROWS", "1000000"))  # 결과당 최대 저장 행 수
+SQL_PAGE_SIZE = int(os.getenv("SQL_PAGE_SIZE", "1000"))  # JSON 응답 기본 행 수
+SQL_MAX_PAGE_SIZE = int(os.getenv("SQL_MAX_PAGE_SIZE", "10000"))  # JSON 응답 최대 행 수
+SQL_CHUNK_ROWS = int(os.getenv("SQL_CHUNK_ROWS", "5000"))  # 커서에서 읽고 내보낼 때의 묶음 행 수
+
+EXPORT_FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+_POLARS_TYPES = {"int": pl.Int64, "float": pl.Float64, "str": pl.String}
+_RESULT_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+def _kind(value):
+    if isinstance(value, bool) or isinstance(value, int):
+        return "int"
+    if isinstance(value, float):
+        return "float"
+    return "str"
+
+
+def _merge_kind(kind, value):
+    # 컬럼 타입: 값이 섞이면 int+float는 float, 그 밖에는 str (SQLite는 행마다 타입이 다를 수 있습니다)
+    if value is None:
+        return kind
+    new = _kind(value)
+    if kind is None or kind == new:
+        return new
+    return "float" if {kind, new} == {"int", "float"} else "str"
+
+
+def _encode(value):
+    # JSON으로 바로 쓸 수 없는 값 (bytes는 16진수 문자열)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return bytes(value).hex()
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+
+def _typed(value, kind):
+    if value is None or kind is None:
+        return None
+    if kind == "str" and not isinstance(value, str):
+        return str(value)
+    if kind == "float":
+        return float(value)
+    if kind == "int" and isinstance(value, bool):
+        return int(value)
+    return value
+
+
+class SqlResultStore:
+    """/analytics/sql 결과를 요청별 파일(result_id)에 나눠 저장하고 페이지 조회와 CSV/NDJSON/Parquet 내보내기를 제공합니다.
+    커서에서 묶음 단위로 읽고 쓰므로 결과 크기와 관계없이 메모리 사용량이 일정합니다."""
+
+    def __init__(self, directory: str = SQL_RESULT_DIR, max_rows: int = SQL_RESULT_MAX_ROWS, chunk_rows: int = SQL_CHUNK_ROWS):
+        self.directory = directory
+        self.max_rows = max_rows
+        self.chunk_rows = chunk_rows
+
+    def _path(self, result_id, suffix):
+        return os.path.join(self.directory, f"{result_id}.{suffix}")
+
+    def save(self, result):
+        """실행 결과(CursorResult)를 파일에 저장하고 메타 정보(result_id, columns, rows, truncated)를 반환합니다."""
+        os.makedirs(self.directory, exist_ok=True)
+        result_id = uuid.uuid4().hex
+        columns = list(result.keys()) if result.returns_rows else []
+        kinds = [None] * len(columns)
+        rows, truncated = 0, False
+
+        # 행마다 값 배열 한 줄 (JSON)
+        with open(self._path(result_id, "rows"), "w", encoding="utf-8") as file:
+            if columns:
+                for chunk in result.partitions(self.chunk_rows):
+                    if rows + len(chunk) > self.max_rows:
+                        chunk, truncated = chunk[:self.max_rows - rows], True
+                    lines = []
+                    for row in chunk:
+                        kinds = [_merge_kind(kind, value) for kind, value in zip(kinds, row)]
+                        lines.append(json.dumps(list(row), ensure_ascii=False, default=_encode))
+                    file.write("\n".join(lines) + "\n" if lines else "")
+                    rows += len(chunk)
+                    if truncated:
+                        break
+        result.close()
+
+        meta = {"result_id": result_id, "columns": columns, "kinds": kinds, "rows": rows, "truncated": truncated}
+        with open(self._path(result_id, "json"), "w", encoding="utf-8") as file:
+            json.dump(meta, file)
+        return meta
+
+    def meta(self, result_id):
+        # 없거나 만료된 결과는 None
+        if not result_id or not _RESULT_ID.match(result_id):
+            return None
+        try:
+            with open(self._path(result_id, "json"), encoding="utf-8") as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return None
+
+    def _rows(self, result_id, offset=0, limit=None):
+        with open(self._path(result_id, "rows"), encoding="utf-8") as file:
+            for line in itertools.islice(file, offset, None if limit is None else offset + limit):
+                yield json.loads(line)
+
+    def page(self, meta, offset: int = 0, limit: int = SQL_PAGE_SIZE):
+        """JSON 응답용 한 페이지: {'result_id', 'columns', 'rows', 'truncated', 'offset', 'next_offset', 'result'}"""
+        offset = max(offset, 0)
+        limit = min(max(limit, 1), SQL_MAX_PAGE_SIZE)
+        columns = meta["columns"]
+        rows = [dict(zip(columns, values)) for values in self._rows(meta["result_id"], offset, limit)]
+        next_offset = offset + len(rows)
+        return {
+            "result_id": meta["result_id"],
+            "columns": columns,
+            "rows": meta["rows"],
+            "truncated": meta["truncated"],
+            "offset": offset,
+            "next_offset": next_offset if next_offset < meta["rows"] else None,
+            "result": rows,
+        }
+
+    def export(self, meta, format: str):
+        """내보내기 응답 본문(bytes 묶음 생성기)"""
+        columns = meta["columns"]
+        if format == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(columns)
+            for chunk in self._chunks(meta):
+                writer.writerows(["" if value is None else value for value in values] for values in chunk)
+                yield buffer.getvalue().encode("utf-8")
+                buffer.seek(0)
+                buffer.truncate()
+            if buffer.tell():
+                yield buffer.getvalue().encode("utf-8")
+        elif format == "ndjson":
+            for chunk in self._chunks(meta):
+                yield "".join(json.dumps(dict(zip(columns, values)), ensure_ascii=False) + "\n" for values in chunk).encode("utf-8")
+        else:
+            with open(self._parquet(meta), "rb") as file:
+                while data := file.read(1024 * 1024):
+                    yield data
+
+    def _chunks(self, meta):
+        rows = self._rows(meta["result_id"])
+        while chunk := list(itertools.islice(rows, self.chunk_rows)):
+            yield chunk
+
+    def _parquet(self, meta):
+        # 컬럼 타입을 맞춘 NDJSON을 polars 스트리밍으로 Parquet로 바꿉니다. (결과별 1회 생성)
+        # 같은 결과를 동시에 내보내도 서로의 임시 파일을 지우지 않도록 호출마다 임시 파일 이름을 따로 씁니다.
+        path = self._path(meta["result_id"], "parquet")
+        if os.path.exists(path):
+            return path
+        columns, kinds = meta["columns"], meta["kinds"]
+        suffix = uuid.uuid4().hex
+        typed = self._path(meta["result_id"], f"{suffix}.typed.ndjson")
+        tmp = self._path(meta["result_id"], f"{suffix}.parquet.tmp")
+        try:
+            with open(typed, "w", encoding="utf-8") as file:
+                for chunk in self._chunks(meta):
+                    file.write("".join(
+                        json.dumps({name: _typed(value, kind) for name, kind, value in zip(columns, kinds, values)}, ensure_ascii=False) + "\n"
+                        for values in chunk
+                    ))
+            schema = {name: _POLARS_TYPES.get(kind, pl.String) for name, kind in zip(columns, kinds)}
+            if meta["rows"]:
+                pl.scan_ndjson(typed, schema=schema).sink_parquet(tmp, compression="zstd")
+            else:
+                pl.DataFrame(schema=schema).write_parquet(tmp, compression="zstd")
+            os.replace(tmp, path)
+        finally:
+            for name in (typed, tmp):
+                if os.path.exists(name):
+                    os.remove(name)
+        return path
+
+    def cleanup(self, max_age: float = SQL_RESULT_TTL):
+        # 보관 시간이 지난 결과 파일 삭제
+        if not os.path.isdir(self.directory):
+            return 0
+        removed = 0
+        expires = time.time() - max_age
+        for entry in os.scandir(self.directory):
+            try:
+                if entry.is_file() and entry.stat().st_mtime < expires:
+                    os.remove(entry.path)
+                    removed += 1
+            except FileNotFoundError:
+                pass
+        return removed
+
+
+sql_results = SqlResultStore()
+
+
+async def run_result_cleaner(interval: float = 600):
+    while True:
+        try:
+            await asyncio.to_thread(sql_results.cleanup)
+        except Exception as e:
+            logger.log(logging.DEBUG, f"Error: {e}")
+        await asyncio.sleep(interval)
@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+from urllib.parse import quote
+from sqlalchemy import create_engine, event, make_url, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+from utils import logger
+from metrics import db_query_seconds
+from profiling import add_stage
+
+# SQLite 저장소 설정 (환경 변수로 조정 가능)
+DATABASE_PATH = os.getenv("ANALYTICS_DB", "./analytics.db")
+SQLALCHEMY_DATABASE_URL = f"sqlite:///{DATABASE_PATH}"
+
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", str(64 * 1024)))  # 연결별 페이지 캐시(KB)
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))  # 메모리 매핑 크기(바이트)
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))  # 잠금 대기 시간(ms)
+READ_POOL_SIZE = int(os.getenv("READ_POOL_SIZE", "8"))  # 읽기 전용 연결 수
+CHECKPOINT_INTERVAL = float(os.getenv("CHECKPOINT_INTERVAL", "60"))  # WAL 체크포인트 주기(초)
+
+
+def _pragmas(read_only: bool, wal: bool):
+    pragmas = [
+        f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}",
+        f"PRAGMA cache_size = -{SQLITE_CACHE_SIZE_KB}",
+        f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE}",
+        "PRAGMA temp_store = MEMORY",
+    ]
+    if wal:
+        pragmas.append("PRAGMA synchronous = NORMAL")  # WAL에서는 NORMAL로도 커밋된 데이터가 손상되지 않습니다.
+    if read_only:
+        pragmas.append("PRAGMA query_only = ON")
+    return pragmas
+
+
+def _read_only_connect(database_url: str):
+    # SQLite 수준의 읽기 전용 연결(mode=ro): PRAGMA query_only와 달리 연결에서 다시 끌 수 없습니다.
+    uri = f"file:{quote(os.path.abspath(make_url(database_url).database))}?mode=ro"
+    return lambda: sqlite3.connect(uri, uri=True, check_same_thread=False)
+
+
+# 사용자 SQL에 허용하는 동작 (그 밖의 PRAGMA, ATTACH/DETACH, 쓰기, DDL은 모두 거부)
+_QUERY_ACTIONS = {sqlite3.SQLITE_SELECT, sqlite3.SQLITE_READ, sqlite3.SQLITE_FUNCTION, sqlite3.SQLITE_RECURSIVE}
+
+
+def _authorize_query(action, arg1, arg2, database, trigger):
+    return sqlite3.SQLITE_OK if action in _QUERY_ACTIONS else sqlite3.SQLITE_DENY
+
+
+def _instrument(engine, pool: str):
+    # SQL 실행 시간 기록 (pool: writer, reader, sql)
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info["query_started"] = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.pop("query_started", None)
+        if started is not None:
+            elapsed = time.perf_counter() - started
+            db_query_seconds.observe(elapsed, pool)
+            add_stage("db", elapsed)
+
+
+def create_engines(database_url: str = SQLALCHEMY_DATABASE_URL, wal: bool = True, read_pool_size: int = READ_POOL_SIZE):
+    """쓰기 전용 연결 1개(writer)와 읽기 전용 연결 풀(reader)을 만듭니다.
+    WAL 모드에서는 읽기와 쓰기가 서로를 막지 않습니다."""
+    writer = create_engine(
+        database_url,
+        connect_args={"check_same_thread": False},
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=60,
+    )
+
+    @event.listens_for(writer, "connect")
+    def _configure_writer(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        if wal:
+            cursor.execute("PRAGMA journal_mode = WAL")
+        for pragma in _pragmas(read_only=False, wal=wal):
+            cursor.execute(pragma)
+        cursor.close()
+
+    _instrument(writer, "writer")
+    return writer, create_reader_engine(database_url, wal, read_pool_size)
+
+
+def create_reader_engine(database_url: str, wal: bool = True, pool_size: int = READ_POOL_SIZE):
+    # 읽기 전용(mode=ro) 연결 풀
+    reader = create_engine(
+        database_url,
+        creator=_read_only_connect(database_url),
+        pool_size=pool_size,
+        max_overflow=0,
+    )
+
+    @event.listens_for(reader, "connect")
+    def _configure_reader(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in _pragmas(read_only=True, wal=wal):
+            cursor.execute(pragma)
+        cursor.close()
+
+    _instrument(reader, "reader")
+    return reader
+
+
+def create_query_engine(database_url: str = SQLALCHEMY_DATABASE_URL, wal: bool = True):
+    """/analytics/sql 사용자 쿼리 전용 엔진: 풀 없이 쿼리마다 읽기 전용 연결을 새로 열고 닫습니다.
+    authorizer가 SELECT 외의 동작을 거부하고, 연결 상태가 분석용 읽기 풀(reader)과 섞이지 않습니다."""
+    engine = create_engine(database_url, creator=_read_only_connect(database_url), poolclass=NullPool)
+
+    @event.listens_for(engine, "connect")
+    def _configure_query(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in _pragmas(read_only=True, wal=wal):
+            cursor.execute(pragma)
+        cursor.close()
+        dbapi_connection.set_authorizer(_authorize_query)
+
+    _instrument(engine, "sql")
+    return engine
+
+
+writer_engine, reader_engine = create_engines()
+query_engine = create_query_engine()
+WriteSession = sessionmaker(autocommit=False, autoflush=False, bind=writer_engine)
+ReadSession = sessionmaker(autocommit=False, autoflush=False, bind=reader_engine)
+QuerySession = sessionmaker(autocommit=False, autoflush=False, bind=query_engine)
+
+
+def checkpoint(engine=writer_engine, mode: str = "PASSIVE"):
+    # WAL 내용을 데이터베이스 파일로 옮깁니다. PASSIVE는 읽기/쓰기를 기다리지 않습니다.
+    with engine.connect() as conn:
+        return conn.execute(text(f"PRAGMA wal_checkpoint({mode})")).one()
+
+
+async def run_checkpointer(interval: float = CHECKPOINT_INTERVAL):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(checkpoint)
+        except Exception as e:
+            logger.log(logging.DEBUG, f"Error: {e}")
@@ -0,0 +1,9 @@
+import os
+import sys
+import tempfile
+
+# 저장소 모듈은 import 시점에 DB 경로를 읽으므로 먼저 임시 디렉터리로 정합니다.
+_directory = tempfile.mkdtemp(prefix="analytics-test-")
+os.environ.setdefault("ANALYTICS_DB", os.path.join(_directory, "analytics.db"))
+os.environ.setdefault("SQL_RESULT_DIR", os.path.join(_directory, "sql_results"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,70 @@
+from sqlalchemy.exc import IntegrityError, OperationalError
+from ingest import IngestBuffer
+from models import Pageview
+
+
+class FakeSession:
+    """commit 할 때 fail(rows)가 돌려주는 오류를 일으키는 세션"""
+
+    def __init__(self, fail, stored, attempts):
+        self.fail = fail
+        self.stored = stored
+        self.attempts = attempts
+        self.rows = []
+
+    def add_all(self, rows):
+        self.rows.extend(rows)
+
+    def commit(self):
+        self.attempts.append(len(self.rows))
+        error = self.fail(self.rows)
+        if error is not None:
+            raise error
+        self.stored.extend(self.rows)
+
+    def rollback(self):
+        pass
+
+    def expunge_all(self):
+        self.rows = []
+
+    def close(self):
+        pass
+
+
+def make_buffer(fail, retries=3):
+    stored, attempts = [], []
+    buffer = IngestBuffer(lambda: FakeSession(fail, stored, attempts), retries=retries, retry_delay=0)
+    return buffer, stored, attempts
+
+
+def make_batch(size):
+    return [Pageview(url=f"https://books.weniv.co.kr/{i}") for i in range(size)]
+
+
+def test_persistent_operational_error_is_retried_a_bounded_number_of_times():
+    locked = OperationalError("INSERT", {}, Exception("database is locked"))
+    buffer, stored, attempts = make_buffer(lambda rows: locked, retries=3)
+    written, dropped, error = buffer._write_all(make_batch(500))
+    assert (written, dropped, error) == (0, 500, locked)
+    # 배치를 나누지 않고 전체 배치를 retries + 1번만 저장 시도합니다.
+    assert attempts == [500] * 4
+    assert stored == []
+
+
+def test_transient_error_then_success_keeps_the_whole_batch():
+    results = [OperationalError("INSERT", {}, Exception("disk I/O error")), None]
+    buffer, stored, attempts = make_buffer(lambda rows: results.pop(0))
+    assert buffer._write_all(make_batch(10))[:2] == (10, 0)
+    assert attempts == [10, 10]
+    assert len(stored) == 10
+
+
+def test_row_error_drops_only_the_bad_event():
+    batch = make_batch(8)
+    bad = batch[5]
+    duplicate = IntegrityError("INSERT", {}, Exception("UNIQUE constraint failed"))
+    buffer, stored, attempts = make_buffer(lambda rows: duplicate if bad in rows else None)
+    written, dropped, error = buffer._write_all(batch)
+    assert (written, dropped, error) == (7, 1, duplicate)
+    assert bad not in stored and len(stored) == 7
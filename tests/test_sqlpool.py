@@ -0,0 +1,43 @@
+import asyncio
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import DatabaseError
+from storage import writer_engine, reader_engine
+from sqlpool import run_query
+
+
+@pytest.fixture(scope="module", autouse=True)
+def table():
+    with writer_engine.begin() as conn:
+        conn.execute(text("CREATE TABLE IF NOT EXISTS items (id INTEGER PRIMARY KEY)"))
+        conn.execute(text("INSERT INTO items (id) VALUES (1), (2)"))
+
+
+def test_select_runs():
+    assert asyncio.run(run_query("SELECT count(*) AS n FROM items"))["rows"] == 1
+
+
+@pytest.mark.parametrize("sql", [
+    "PRAGMA query_only = OFF",
+    "ATTACH DATABASE ':memory:' AS other",
+    "CREATE TABLE pwned (x)",
+    "INSERT INTO items (id) VALUES (3)",
+    "DELETE FROM items",
+])
+def test_rejects_non_select(sql):
+    with pytest.raises(DatabaseError):
+        asyncio.run(run_query(sql))
+
+
+def test_reader_pool_stays_read_only():
+    asyncio.run(run_query("SELECT 1"))
+    with pytest.raises(DatabaseError):
+        asyncio.run(run_query("PRAGMA query_only = OFF"))
+    # 사용자 쿼리 뒤에도 분석용 읽기 연결은 쓰기 불가능해야 합니다.
+    for _ in range(reader_engine.pool.size() + 1):
+        with reader_engine.connect() as conn:
+            conn.exec_driver_sql("PRAGMA query_only = OFF")
+            with pytest.raises(DatabaseError):
+                conn.exec_driver_sql("CREATE TABLE pwned (x)")
+    with writer_engine.connect() as conn:
+        assert conn.execute(text("SELECT count(*) FROM sqlite_master WHERE name = 'pwned'")).scalar() == 0
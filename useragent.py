@@ -0,0 +1,91 @@
+from functools import lru_cache
+import os
+from user_agents import parse
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert
+from models import UserAgent
+from utils import lru_stats
+from metrics import ua_parse_seconds, timed
+
+# User-Agent 파싱 결과 캐시 크기 (환경 변수로 조정 가능)
+UA_CACHE_SIZE = int(os.getenv("UA_CACHE_SIZE", "4096"))
+
+
+def _build_cache(maxsize):
+    # 파싱 시간은 캐시 미스일 때만 기록됩니다.
+    return lru_cache(maxsize=maxsize)(timed(ua_parse_seconds, parse))
+
+_cached_parse = _build_cache(UA_CACHE_SIZE)
+
+
+def parse_user_agent(user_agent_string):
+    """User-Agent 문자열을 파싱합니다. 같은 문자열은 캐시된 결과를 재사용합니다."""
+    return _cached_parse(user_agent_string)
+
+
+def resize_ua_cache(maxsize: int):
+    # 캐시 크기를 바꾸면 기존 캐시는 비워집니다.
+    global _cached_parse
+    _cached_parse = _build_cache(maxsize)
+
+
+def ua_cache_stats():
+    return lru_stats(_cached_parse)
+
+
+def device_class(user_agent):
+    if user_agent.is_mobile:
+        return "mobile"
+    if user_agent.is_tablet:
+        return "tablet"
+    if user_agent.is_pc:
+        return "pc"
+    return "other"
+
+
+class UserAgentDimension:
+    """User-Agent 문자열을 user_agents 테이블의 id로 바꿔주는 매핑 캐시"""
+
+    def __init__(self, max_entries: int = 100000):
+        self.max_entries = max_entries
+        self._ids = {}
+
+    def clear(self):
+        # 저장이 실패하면 그 트랜잭션에서 추가한 id가 없어지므로 캐시를 비웁니다.
+        self._ids.clear()
+
+    def resolve(self, db, user_agent_strings):
+        # 처음 보는 문자열은 파싱해서 user_agents 테이블에 추가합니다.
+        if len(self._ids) > self.max_entries:
+            self._ids.clear()
+
+        missing = {s for s in user_agent_strings if s is not None and s not in self._ids}
+        if missing:
+            rows = []
+            for s in missing:
+                user_agent = parse_user_agent(s)
+                rows.append({
+                    "user_agent": s,
+                    "os_family": user_agent.os.family,
+                    "browser_family": user_agent.browser.family,
+                    "device_class": device_class(user_agent),
+                    "is_bot": int(user_agent.is_bot),
+                })
+            missing = list(missing)
+            for i in range(0, len(rows), 500):
+                db.execute(insert(UserAgent).values(rows[i:i + 500]).on_conflict_do_nothing(index_elements=["user_agent"]))
+                chunk = missing[i:i + 500]
+                for id_, s in db.execute(select(UserAgent.id, UserAgent.user_agent).where(UserAgent.user_agent.in_(chunk))):
+                    self._ids[s] = id_
+
+        return {s: self._ids.get(s) for s in user_agent_strings}
+
+    def assign(self, db, batch):
+        # ingest 훅: 이벤트 행의 User-Agent 문자열을 id로 바꿔 저장합니다.
+        pending = [row for row in batch if getattr(row, "user_agent", None) is not None and row.user_agent_id is None]
+        ids = self.resolve(db, {row.user_agent for row in pending})
+        for row in pending:
+            row.user_agent_id = ids[row.user_agent]
+            row.user_agent = None
+
+ua_dimension = UserAgentDimension()
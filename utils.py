@@ -1,16 +1,64 @@
 import secrets
 from datetime import datetime, timedelta
+from functools import lru_cache
+from collections import namedtuple
+import os
+from urllib.parse import urlsplit
 import pytz
+from sqlalchemy import or_
 from geoip2.database import Reader
 import logging
+import time
+import korea
+from metrics import geoip_lookup_seconds
 
 KST = pytz.timezone("Asia/Seoul")
 
-# GeoIP 데이터베이스 로드
-reader = Reader("GeoLite2-City.mmdb")
+# GeoIP 데이터베이스 (처음 사용할 때 로드, 경로는 환경 변수로 변경 가능)
+GEOIP_DB_PATH = os.getenv("GEOIP_DB_PATH", "GeoLite2-City.mmdb")
+reader = None
+
+def get_reader():
+    global reader
+    if reader is None:
+        reader = Reader(GEOIP_DB_PATH)
+    return reader
 
 logger = logging.getLogger(__name__)
 
+# IP -> 지역 정보 캐시 크기 (환경 변수로 조정 가능)
+GEOIP_CACHE_SIZE = int(os.getenv("GEOIP_CACHE_SIZE", "65536"))
+
+Location = namedtuple("Location", ["user_location", "country", "city", "region"])
+UNKNOWN_LOCATION = Location("Unknown", None, None, None)
+
+@lru_cache(maxsize=GEOIP_CACHE_SIZE)
+def lookup_location(client_ip):
+    # country, city는 기존 user_location("city, country") 표기와 같은 값을 저장합니다.
+    started = time.perf_counter()
+    try:
+        response = get_reader().city(client_ip)
+    except Exception:
+        return UNKNOWN_LOCATION
+    finally:
+        geoip_lookup_seconds.observe(time.perf_counter() - started)
+    city = f"{response.city.name}"
+    country = f"{response.country.name}"
+    region = korea.find_region(city) if country == "South Korea" else None
+    return Location(f"{city}, {country}", country, city, region)
+
+def lru_stats(cached_function):
+    # functools.lru_cache 통계
+    info = cached_function.cache_info()
+    total = info.hits + info.misses
+    return {
+        "hits": info.hits,
+        "misses": info.misses,
+        "hit_ratio": round(info.hits / total, 4) if total else 0,
+        "size": info.currsize,
+        "maxsize": info.maxsize,
+    }
+
 def get_date_range(date_start: str, date_end: str, interval: str):
     start_date = datetime.strptime(date_start, "%Y%m%d")
     end_date = datetime.strptime(date_end, "%Y%m%d")
@@ -30,3 +78,49 @@ def get_date_range(date_start: str, date_end: str, interval: str):
 # 세션 ID 생성 함수
 def generate_session_id():
     return secrets.token_urlsafe(16)  # 16바이트 길이의 무작위 문자열 생성
+
+# 요청한 클라이언트 IP (프록시 뒤에서는 X-Forwarded-For의 첫 번째 값)
+def get_client_ip(request):
+    client_ip = request.headers.get("X-Forwarded-For")
+    if client_ip:
+        return client_ip.split(",")[0].strip()
+    return request.client.host if request.client else None
+
+# URL을 host, path, query로 분리
+def split_url(url: str):
+    try:
+        parts = urlsplit(url)
+    except ValueError:
+        return None, None, None
+    return (parts.hostname or None), (parts.path or "/"), (parts.query or None)
+
+# 위니브 서비스 이름(URL에 포함된 이름)별 host: url=서비스 이름 조회를 host 인덱스로 처리합니다.
+# 여기에 없는 이름은 URL 포함 검색(LIKE)으로 찾습니다.
+SERVICE_HOSTS = {
+    'books.weniv': ['books.weniv.co.kr'],
+    'weniv.link': ['weniv.link'],
+    'world.weniv': ['world.weniv.co.kr'],
+    'sql.weniv': ['sql.weniv.co.kr'],
+    'notebook.weniv': ['notebook.weniv.co.kr'],
+}
+
+# 서비스 이름 목록 중 하나에 해당하는 행 (host가 알려진 서비스는 host IN 조건으로 묶습니다)
+def service_filter(url_column, host_column, names):
+    hosts = [host for name in names for host in SERVICE_HOSTS.get(name, [])]
+    conditions = [host_column.in_(hosts)] if hosts else []
+    conditions += [url_column.like(f"%{name}%") for name in names if name not in SERVICE_HOSTS]
+    return or_(*conditions)
+
+# host 정확히 일치 / path 접두사 필터 (인덱스를 사용할 수 있는 조건으로 변환)
+def url_filters(url_column, host_column, path_column, url: str = "", host: str = None, path: str = None):
+    filters = []
+    if host:
+        filters.append(host_column == host.lower())
+    if path:
+        filters.append(path_column >= path)
+        filters.append(path_column < path + "\U0010ffff")
+    if url in SERVICE_HOSTS:
+        filters.append(service_filter(url_column, host_column, [url]))
+    elif url or not filters:
+        filters.append(url_column.like(f"%{url}%"))
+    return filters